@@ -1,14 +1,6 @@
 from datetime import datetime
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from dotenv import load_dotenv
-from credentials import decrypt_secret
 import os
 
-# Load the .env file
-load_dotenv()
-
 # ------------------ Alerting Config ------------------
 SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 587
@@ -16,6 +8,17 @@ SMTP_PORT = 587
 # ------------------ Helper for sending email alerts ------------------
 def send_alert(subject: str, message: str):
     try:
+        # Imported on first alert: keeps cryptography/dotenv/smtplib off the import path
+        # of modules that only need send_alert as a dependency.
+        import smtplib
+        from email.mime.text import MIMEText
+        from email.mime.multipart import MIMEMultipart
+        from dotenv import load_dotenv
+        from credentials import decrypt_secret
+
+        # Load the .env file
+        load_dotenv()
+
         # --- Load encrypted values ---
         alert_email_enc = os.getenv("ALERT_EMAIL_ENC")
         alert_email_password_enc = os.getenv("ALERT_EMAIL_PASSWORD_ENC")
@@ -0,0 +1,245 @@
+# analytics.py
+import io
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+from config import SYMBOLS
+from logger import get_symbol_log_paths
+
+# ------------------ Journal Schema ------------------ #
+# Column dtypes for the CSV journals written by logger.py.
+# Anything not listed here is kept as text.
+JOURNAL_DTYPES = {
+    "ticket": "int64",
+    "deal": "int64",
+    "retcode": "int64",
+    "volume": "float64",
+    "price": "float64",
+    "sl": "float64",
+    "tp": "float64",
+    "open_price": "float64",
+    "current_price": "float64",
+    "floating_pl": "float64",
+    "profit": "float64",
+    "requested_price": "float64",
+    "fill_price": "float64",
+    "slippage_points": "float64",
+    "latency_ms": "float64",
+    "attempts": "int64",
+    "requotes": "int64",
+    "rejects": "int64",
+}
+TIME_COLUMNS = ("timestamp",)
+
+READ_BLOCK_BYTES = 64 * 1024 * 1024  # bytes read per block on large (initial) loads
+CHUNK_ROWS = 250_000                 # rows parsed per pandas chunk
+CACHE_DIR_NAME = ".cache"
+
+
+# ------------------ Columnar Cache ------------------ #
+def _cache_path(journal_path: Path) -> Path:
+    cache_dir = journal_path.parent / CACHE_DIR_NAME
+    cache_dir.mkdir(exist_ok=True)
+    return cache_dir / f"{journal_path.stem}.npz"
+
+
+def _load_cache(cache_path: Path):
+    """Return (columns dict, header, byte offset) or (None, None, 0) if no usable cache."""
+    if not cache_path.exists():
+        return None, None, 0
+    try:
+        with np.load(cache_path, allow_pickle=False) as npz:
+            header = [str(h) for h in npz["__header__"]]
+            offset = int(npz["__offset__"])
+            columns = {name: npz[name] for name in header}
+        return columns, header, offset
+    except Exception as e:
+        print(f"{datetime.now()} → Ignoring unreadable analytics cache {cache_path}: {e}")
+        return None, None, 0
+
+
+def _save_cache(cache_path: Path, columns: dict, header: list, offset: int):
+    """Atomically write the columnar cache (plain arrays, no pickling)."""
+    tmp_path = cache_path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(f, __header__=np.array(header), __offset__=np.int64(offset), **columns)
+    os.replace(tmp_path, cache_path)
+
+
+def _to_columns(df: pd.DataFrame, header: list) -> dict:
+    """Convert a parsed chunk to plain NumPy arrays (datetime64 / numeric / fixed-width text)."""
+    columns = {}
+    for name in header:
+        col = df[name]
+        if name in TIME_COLUMNS:
+            columns[name] = pd.to_datetime(col, format="ISO8601").to_numpy(dtype="datetime64[ns]")
+        elif JOURNAL_DTYPES.get(name) == "float64":
+            columns[name] = pd.to_numeric(col, errors="coerce").to_numpy(dtype="float64")
+        elif name in JOURNAL_DTYPES:
+            columns[name] = pd.to_numeric(col, errors="coerce").fillna(0).to_numpy(dtype=JOURNAL_DTYPES[name])
+        else:
+            columns[name] = col.fillna("").astype(str).to_numpy(dtype=str)
+    return columns
+
+
+def _concat_columns(parts: list, header: list) -> dict:
+    return {name: np.concatenate([p[name] for p in parts]) for name in header}
+
+
+def _parse_rows(raw: bytes, header: list) -> list:
+    """Parse complete CSV lines in chunks with explicit dtypes."""
+    dtypes = {name: ("float64" if name in JOURNAL_DTYPES else str) for name in header if name not in TIME_COLUMNS}
+    reader = pd.read_csv(io.BytesIO(raw), names=header, header=None, dtype=dtypes, chunksize=CHUNK_ROWS)
+    return [_to_columns(chunk, header) for chunk in reader]
+
+
+def load_journal(symbol: str, kind: str, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Load one journal ('trades', 'positions', 'closed' or 'executions') for a symbol.
+
+    Rows already parsed on a previous run are read from the columnar cache in
+    logs/<SYMBOL>/.cache/; only bytes appended since then are parsed.
+    A partially written last line is left for the next run.
+    """
+    journal_path = get_symbol_log_paths(symbol)[kind]
+    if not journal_path.exists():
+        return pd.DataFrame()
+
+    cache_path = _cache_path(journal_path)
+    columns, header, offset = _load_cache(cache_path) if use_cache else (None, None, 0)
+
+    with open(journal_path, "rb") as f:
+        first_line = f.readline()
+        file_header = first_line.decode().strip().split(",")
+        file_size = os.fstat(f.fileno()).st_size
+
+        # Journal rotated, truncated or re-created with other columns -> rebuild
+        if header != file_header or offset > file_size or offset < len(first_line):
+            columns, header, offset = None, file_header, len(first_line)
+
+        parts = [columns] if columns is not None else []
+        f.seek(offset)
+        carry = b""
+        while True:
+            block = f.read(READ_BLOCK_BYTES)
+            if not block:
+                break
+            block = carry + block
+            end = block.rfind(b"\n") + 1
+            carry = block[end:]
+            if end:
+                parts.extend(_parse_rows(block[:end], header))
+                offset += end
+
+    if not parts:
+        parts = [_to_columns(pd.DataFrame(columns=header), header)]
+    columns = parts[0] if len(parts) == 1 else _concat_columns(parts, header)
+
+    if use_cache:
+        _save_cache(cache_path, columns, header, offset)
+
+    return pd.DataFrame(columns, copy=False)
+
+
+# ------------------ Per-Trade Outcomes ------------------ #
+def trade_outcomes(symbol: str) -> pd.DataFrame:
+    """
+    One row per closed position: open/close time, direction, realized profit,
+    volume-weighted exit price, MAE/MFE (worst/best floating P/L seen in
+    position updates) and time in trade.
+    """
+    closed = load_journal(symbol, "closed")
+    if closed.empty:
+        return pd.DataFrame()
+
+    closed["price_volume"] = closed["price"] * closed["volume"]
+    out = closed.groupby("ticket").agg(
+        close_time=("timestamp", "max"),
+        profit=("profit", "sum"),
+        closed_volume=("volume", "sum"),
+        price_volume=("price_volume", "sum"),
+    )
+    out["exit_price"] = out.pop("price_volume") / out["closed_volume"]
+
+    opens = load_journal(symbol, "trades")
+    if not opens.empty:
+        opens = opens.drop_duplicates("ticket", keep="first").set_index("ticket")
+        out = out.join(opens[["timestamp", "type", "price", "sl"]].rename(
+            columns={"timestamp": "open_time", "type": "direction", "price": "entry_price"}))
+    else:
+        out["open_time"] = pd.NaT
+        out["direction"] = ""
+        out["entry_price"] = np.nan
+        out["sl"] = np.nan
+
+    updates = load_journal(symbol, "positions")
+    if not updates.empty:
+        excursions = updates.groupby("ticket")["floating_pl"].agg(["min", "max"])
+        out = out.join(excursions)
+        out["mae"] = out.pop("min").clip(upper=0).fillna(0)
+        out["mfe"] = out.pop("max").clip(lower=0).fillna(0)
+    else:
+        out["mae"] = 0.0
+        out["mfe"] = 0.0
+
+    out["time_in_trade"] = out["close_time"] - out["open_time"]
+
+    # Realized R-multiple: price move in the trade's favour per unit of initial stop distance
+    sign = np.where(out["direction"] == "SELL", -1.0, 1.0)
+    risk = (out["entry_price"] - out["sl"]).abs().replace(0, np.nan)
+    out["r_multiple"] = sign * (out["exit_price"] - out["entry_price"]) / risk
+    out.insert(0, "symbol", symbol.upper())
+    return out.sort_values("close_time").reset_index()
+
+
+# ------------------ Metrics ------------------ #
+def summarize(outcomes: pd.DataFrame) -> dict:
+    """Vectorized performance metrics over a set of trade outcomes (sorted by close time)."""
+    if outcomes.empty:
+        return {"trades": 0}
+
+    outcomes = outcomes.sort_values("close_time")
+    profit = outcomes["profit"].to_numpy(dtype=float)
+    wins = profit > 0
+    losses = profit < 0
+
+    gross_win = profit[wins].sum()
+    gross_loss = -profit[losses].sum()
+
+    equity = np.cumsum(profit)
+    peak = np.maximum.accumulate(np.concatenate(([0.0], equity)))[1:]
+    max_drawdown = float((peak - equity).max())
+
+    time_in_trade = outcomes["time_in_trade"].dropna()
+
+    return {
+        "trades": int(len(profit)),
+        "win_rate": float(wins.mean()),
+        "avg_win": float(profit[wins].mean()) if wins.any() else 0.0,
+        "avg_loss": float(profit[losses].mean()) if losses.any() else 0.0,
+        "expectancy": float(profit.mean()),
+        "profit_factor": float(gross_win / gross_loss) if gross_loss > 0 else float("inf"),
+        "net_profit": float(equity[-1]),
+        "max_drawdown": max_drawdown,
+        "avg_mae": float(outcomes["mae"].mean()),
+        "avg_mfe": float(outcomes["mfe"].mean()),
+        "avg_time_in_trade": time_in_trade.mean() if len(time_in_trade) else pd.NaT,
+        "median_time_in_trade": time_in_trade.median() if len(time_in_trade) else pd.NaT,
+    }
+
+
+def performance_report(symbols=SYMBOLS) -> pd.DataFrame:
+    """Metrics per symbol plus a PORTFOLIO row over all symbols combined."""
+    frames = [trade_outcomes(symbol) for symbol in symbols]
+    frames = [f for f in frames if not f.empty]
+
+    rows = {f["symbol"].iloc[0]: summarize(f) for f in frames}
+    rows["PORTFOLIO"] = summarize(pd.concat(frames, ignore_index=True)) if frames else {"trades": 0}
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+if __name__ == "__main__":
+    pd.set_option("display.width", 200)
+    print(performance_report())
@@ -1,26 +1,204 @@
+# backtest.py
+# Historical simulation of the live entry logic: the ICT model runs once over the whole history
+# (ict_model.run_batch) instead of re-slicing the DataFrame per bar.
+#
+# Stages: signals, regimes and ATR depend only on the candles and their own parameters; trades
+# and metrics depend on everything. With a BacktestCache each stage is stored separately, so
+# changing e.g. rr_ratio only recomputes the trade simulation.
+import numpy as np
 import pandas as pd
-from strategy_engine import generate_signal
-from market_engine import detect_market_regime
+from config import RISK_TO_REWARD_RATIO, RISK_PER_TRADE
+from ict_model import ICTModel, SIGNAL_WINDOW, TYPE_FVG, row_to_signal
+from market_engine import regime_series, DEFAULT_POINT
+from sessions import kill_zone_mask, session_config
+from backtest_cache import (hash_candles, hash_arrays, code_version, frame_to_arrays, arrays_to_frame,
+                            metrics_to_arrays, arrays_to_metrics)
+
+EXIT_SEARCH_CHUNK = 512  # bars scanned at a time when looking for a trade's exit
+
+# Modules whose source is part of each stage's cache key
+SIGNAL_CODE = ("ict_model", "market_structure")
+REGIME_CODE = ("market_engine", "sessions")
+TRADE_CODE = SIGNAL_CODE + REGIME_CODE + ("backtest",)
+
+
+def _atr_series(df: pd.DataFrame) -> np.ndarray:
+    import ta  # same ATR as atr_sl_tp
+    return ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], window=14).average_true_range().to_numpy()
+
+
+def _find_exit(highs, lows, start, direction, sl, tp):
+    """First bar >= start touching SL or TP -> (index, price). SL wins if both are touched in one bar."""
+    n = len(highs)
+    while start < n:
+        end = min(start + EXIT_SEARCH_CHUNK, n)
+        if direction == 1:
+            hit_sl = lows[start:end] <= sl
+            hit_tp = highs[start:end] >= tp
+        else:
+            hit_sl = highs[start:end] >= sl
+            hit_tp = lows[start:end] <= tp
+        hits = np.flatnonzero(hit_sl | hit_tp)
+        if len(hits):
+            i = start + hits[0]
+            return i, (sl if hit_sl[hits[0]] else tp)
+        start = end
+    return None, None
+
+
+# ------------------ Stages ------------------ #
+def _signal_stage(df, allow_momentum, window) -> dict:
+    signals = ICTModel(allow_momentum, window).run_batch(df)
+    return {name: signals[name].to_numpy() for name in signals.columns}
+
+
+def _regime_stage(df, point, allow_momentum, thresholds) -> dict:
+    return {"regime": regime_series(df, allow_momentum, point, thresholds).astype(str), "in_session": kill_zone_mask(df.index)}
+
+
+def _atr_stage(df) -> dict:
+    return {"atr": _atr_series(df)}
+
+
+def _trade_stage(df, signals: dict, regimes: dict, atr: np.ndarray, rr_ratio, risk_per_trade, balance, session_filter,
+                 slippage: float = 0.0) -> pd.DataFrame:
+    directions = signals['direction']
+    regime = regimes['regime']
+
+    tradable = directions != 0
+    tradable &= ~np.isin(regime, ["CONSOLIDATION", "RANGING"])
+    tradable &= (signals['type'] != TYPE_FVG) | signals['ifvg_ok']
+    tradable &= np.isfinite(atr) & (atr > 0)
+    if session_filter:
+        tradable &= regimes['in_session']
+
+    highs = df['high'].to_numpy(dtype=float)
+    lows = df['low'].to_numpy(dtype=float)
+    closes = df['close'].to_numpy(dtype=float)
 
-def backtest(df: pd.DataFrame, sl_points: float, tp_points: float):
-    """
-    Backtesting loop for historical data.
-    Returns DataFrame with trade signals and P/L.
-    """
-    balance = 1000
     results = []
+    free_from = 0
+    for i in np.flatnonzero(tradable):
+        if i < free_from:
+            continue  # a position is still open
+        direction = int(directions[i])
+        # SL/TP come from the signal bar's close (as atr_sl_tp); the fill is worse by the slippage
+        sl = closes[i] - direction * atr[i]
+        tp = closes[i] + direction * atr[i] * rr_ratio
+        entry = closes[i] + direction * slippage
 
-    for i in range(50, len(df)):
-        sub_df = df.iloc[:i+1]
-        signal = generate_signal(sub_df)
-        regime = detect_market_regime(sub_df)
+        exit_index, exit_price = _find_exit(highs, lows, i + 1, direction, sl, tp)
+        if exit_index is None:
+            exit_index, exit_price = len(df) - 1, closes[-1]  # still open at the end of the data
 
-        if signal and regime == "TRENDING":
-            open_price = df['close'].iloc[i]
-            sl = open_price - sl_points * df['close'].iloc[i] * 0.0001 if signal == 'BUY' else open_price + sl_points * df['close'].iloc[i] * 0.0001
-            tp = open_price + tp_points * df['close'].iloc[i] * 0.0001 if signal == 'BUY' else open_price - tp_points * df['close'].iloc[i] * 0.0001
-            pl = tp - open_price if signal == 'BUY' else open_price - tp
-            balance += pl
-            results.append({"index": i, "signal": signal, "pl": pl, "balance": balance})
+        r_multiple = direction * (exit_price - entry) / atr[i]
+        balance *= 1 + risk_per_trade * r_multiple
+        signal = row_to_signal({name: values[i] for name, values in signals.items()})
+        results.append({
+            "entry_time": df.index[i],
+            "exit_time": df.index[exit_index],
+            "direction": signal['direction'],
+            "entry_type": signal['entry_type'],
+            "type": signal['type'],
+            "regime": regime[i],
+            "entry_price": entry,
+            "sl": sl,
+            "tp": tp,
+            "exit_price": exit_price,
+            "bars_held": exit_index - i,
+            "r_multiple": r_multiple,
+            "balance": balance,
+        })
+        free_from = exit_index + 1
 
     return pd.DataFrame(results)
+
+
+def backtest_metrics(trades: pd.DataFrame, start_balance: float = 1000) -> dict:
+    """Summary of a backtest's trades in R and in compounded balance."""
+    if trades.empty:
+        return {"trades": 0}
+    r = trades["r_multiple"].to_numpy(dtype=float)
+    equity_r = np.cumsum(r)
+    peak_r = np.maximum.accumulate(np.concatenate(([0.0], equity_r)))[1:]
+    balance = trades["balance"].to_numpy(dtype=float)
+    peak_balance = np.maximum.accumulate(np.concatenate(([start_balance], balance)))[1:]
+    return {
+        "trades": float(len(r)),
+        "win_rate": float((r > 0).mean()),
+        "avg_r": float(r.mean()),
+        "total_r": float(equity_r[-1]),
+        "max_drawdown_r": float((peak_r - equity_r).max()),
+        "final_balance": float(balance[-1]),
+        "max_drawdown_pct": float(((peak_balance - balance) / peak_balance).max()),
+    }
+
+
+# ------------------ Driver ------------------ #
+def run_backtest(
+    df: pd.DataFrame,
+    allow_momentum: bool = True,
+    rr_ratio: float = RISK_TO_REWARD_RATIO,
+    risk_per_trade: float = RISK_PER_TRADE,
+    balance: float = 1000,
+    point: float = None,
+    session_filter: bool = True,
+    window: int = SIGNAL_WINDOW,
+    slippage_points: float = 0.0,
+    thresholds: dict = None,
+    cache=None,
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Backtest the bot's entry rules over a candles DataFrame (time index, open/high/low/close).
+
+    Entries follow bot.py: ICT signal, regime not CONSOLIDATION/RANGING, FVG entries only if
+    inverted, inside a kill zone (session_filter), one position at a time. The trade opens at the
+    signal bar's close with ATR SL/TP and is held until one is touched; the HTF bias filter is not
+    applied (it needs H4 data).
+
+    slippage_points: adverse fill slippage per entry, e.g. SlippageModel.load().expected(symbol).
+    thresholds: regime pip thresholds as live uses them with ADAPTIVE_REGIME, e.g.
+    REGIME_THRESHOLDS.series(symbol, df.index); None = market_engine's fixed thresholds.
+    cache: optional BacktestCache; each stage is looked up by data, parameters and code version.
+    Returns (one row per trade with its R-multiple and the compounded balance, metrics).
+    """
+    sessions = session_config()  # kill zones and timezones decide in_session
+    thresholds_hash = hash_arrays(thresholds) if thresholds else None
+    regime_params = dict(point=point, allow_momentum=allow_momentum, thresholds=thresholds_hash, sessions=sessions)
+    trade_params = dict(allow_momentum=allow_momentum, window=window, point=point, rr_ratio=rr_ratio,
+                        risk_per_trade=risk_per_trade, balance=balance, session_filter=session_filter,
+                        slippage_points=slippage_points, thresholds=thresholds_hash, sessions=sessions)
+
+    def compute_signals():
+        return _signal_stage(df, allow_momentum, window)
+
+    def compute_regimes():
+        return _regime_stage(df, point, allow_momentum, thresholds)
+
+    def compute_trades():
+        signals = stage("signals", dict(allow_momentum=allow_momentum, window=window), SIGNAL_CODE, compute_signals)
+        regimes = stage("regimes", regime_params, REGIME_CODE, compute_regimes)
+        atr = stage("atr", {}, ("backtest",), lambda: _atr_stage(df))["atr"]
+        slippage = slippage_points * (point or DEFAULT_POINT)
+        trades = _trade_stage(df, signals, regimes, atr, rr_ratio, risk_per_trade, balance, session_filter, slippage)
+        arrays = frame_to_arrays(trades)
+        arrays.update({f"__metric_{k}": v for k, v in metrics_to_arrays(backtest_metrics(trades, balance)).items()})
+        return arrays
+
+    if cache is None:
+        def stage(name, params, code, compute):
+            return compute()
+    else:
+        data_hash = hash_candles(df)
+
+        def stage(name, params, code, compute):
+            return cache.stage(name, data_hash, params, code_version(code), compute)
+
+    arrays = stage("trades", trade_params, TRADE_CODE, compute_trades)
+    metrics = arrays_to_metrics({k.removeprefix("__metric_"): v for k, v in arrays.items() if k.startswith("__metric_")})
+    return arrays_to_frame({k: v for k, v in arrays.items() if not k.startswith("__metric_")}), metrics
+
+
+def backtest(df: pd.DataFrame, **params) -> pd.DataFrame:
+    """Trades of run_backtest (same parameters)."""
+    return run_backtest(df, **params)[0]
@@ -0,0 +1,143 @@
+# backtest_cache.py
+# Content-addressed on-disk cache for backtest stages. An entry's key hashes the candle data,
+# the stage's parameters and the source of the modules that compute it, so a changed input or
+# a code edit can never return a stale result. Entries are plain .npz files (no pickling),
+# evicted least-recently-used once the directory exceeds its size budget.
+import hashlib
+import importlib.util
+import json
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from config import BACKTEST_CACHE_DIR, BACKTEST_CACHE_MAX_MB
+
+
+def hash_candles(df: pd.DataFrame) -> str:
+    """Digest of a candle slice: its timestamps and OHLC values."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(df.index.to_numpy(dtype="datetime64[ns]")).view(np.int64).tobytes())
+    for column in ("open", "high", "low", "close"):
+        h.update(np.ascontiguousarray(df[column].to_numpy(dtype=float)).tobytes())
+    return h.hexdigest()
+
+
+def hash_arrays(arrays: dict) -> str:
+    """Digest of a {name: scalar or array} dict, e.g. per-bar regime thresholds."""
+    h = hashlib.blake2b(digest_size=16)
+    for name in sorted(arrays):
+        h.update(name.encode())
+        h.update(np.ascontiguousarray(np.asarray(arrays[name], dtype=float)).tobytes())
+    return h.hexdigest()
+
+
+def code_version(modules: tuple) -> str:
+    """Digest of the source files of `modules`; changes whenever any of them is edited."""
+    paths = tuple(Path(importlib.util.find_spec(name).origin) for name in modules)
+    return _source_digest(tuple(modules), paths, tuple(path.stat().st_mtime_ns for path in paths))
+
+
+@lru_cache(maxsize=32)
+def _source_digest(modules: tuple, paths: tuple, mtimes: tuple) -> str:
+    """Keyed on the files' mtimes, so an edit in a running process is re-read."""
+    h = hashlib.blake2b(digest_size=16)
+    for name, path in zip(modules, paths):
+        h.update(name.encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+# ------------------ DataFrame / metrics <-> arrays ------------------ #
+def frame_to_arrays(df: pd.DataFrame) -> dict:
+    arrays = {"__columns__": np.array(list(df.columns), dtype=str)}
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            arrays[name] = col.to_numpy(dtype="datetime64[ns]")
+        elif pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col):
+            arrays[name] = col.to_numpy()
+        else:
+            arrays[name] = col.astype(str).to_numpy(dtype=str)
+    return arrays
+
+
+def arrays_to_frame(arrays: dict) -> pd.DataFrame:
+    columns = [str(c) for c in arrays["__columns__"]]
+    return pd.DataFrame({name: arrays[name] for name in columns}, columns=columns)
+
+
+def metrics_to_arrays(metrics: dict) -> dict:
+    return {"__names__": np.array(list(metrics), dtype=str), "__values__": np.array(list(metrics.values()), dtype=float)}
+
+
+def arrays_to_metrics(arrays: dict) -> dict:
+    return {str(k): float(v) for k, v in zip(arrays["__names__"], arrays["__values__"])}
+
+
+# ------------------ Cache ------------------ #
+class BacktestCache:
+    """Stage results keyed by content; `stage()` returns the cached arrays or computes and stores them."""
+
+    def __init__(self, directory=BACKTEST_CACHE_DIR, max_mb: float = BACKTEST_CACHE_MAX_MB):
+        self.directory = Path(directory)
+        self.max_bytes = int(max_mb * 2**20)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(stage: str, data_hash: str, params: dict, code: str) -> str:
+        payload = json.dumps({"stage": stage, "data": data_hash, "params": params, "code": code}, sort_keys=True, default=str)
+        return f"{stage}-{hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()}"
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.npz"
+
+    def load(self, key: str) -> dict | None:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+        except Exception as e:
+            print(f"{datetime.now()} → Ignoring unreadable backtest cache entry {path.name}: {e}")
+            return None
+        os.utime(path)  # mark as recently used
+        return arrays
+
+    def store(self, key: str, arrays: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the directory fits in max_bytes."""
+        entries = [(p.stat().st_mtime, p.stat().st_size, p) for p in self.directory.glob("*.npz")]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stage(self, stage: str, data_hash: str, params: dict, code: str, compute) -> dict:
+        """Cached result of `compute()` (a dict of arrays) for this stage, data, parameters and code."""
+        key = self.key(stage, data_hash, params, code)
+        arrays = self.load(key)
+        if arrays is not None:
+            self.hits += 1
+            return arrays
+        self.misses += 1
+        arrays = compute()
+        self.store(key, arrays)
+        return arrays
+
+    def clear(self):
+        for path in self.directory.glob("*.npz"):
+            path.unlink(missing_ok=True)
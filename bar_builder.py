@@ -0,0 +1,209 @@
+# bar_builder.py
+# Bars built from ticks instead of served by the broker: time bars of any length (S90, M2, H3),
+# tick-count (T500), volume (V1000) and range bars (R50, height in points). build_bars aggregates
+# a batch of ticks vectorized; BarBuilder does the same one tick at a time and produces identical
+# bars. Output uses the MT5 rates layout (market_bus.BAR_DTYPE): rates_to_candles turns it into
+# the get_candles DataFrame, and the market bus feeder publishes MARKET_BUS_CUSTOM_BARS so the
+# bot can read them with get_candles(bus, symbol, timeframe="T500").
+#
+#   Offline: df = candles_from_ticks("EURUSD", "T500", "2024-05-01", "2024-05-03")
+#   Live:    builder = BarBuilder("S90", point); builder.on_tick(tick); df = builder.candles(200)
+from collections import deque
+from functools import lru_cache
+from typing import NamedTuple
+import numpy as np
+from config import TICK_DATA_DIR, MARKET_BUS_BAR_CAPACITY
+from market_bus import BAR_DTYPE
+
+TIME_UNITS = {"S": 1, "M": 60, "H": 3600, "D": 86400}  # seconds per unit of a time-bar spec
+ACTIVITY_KINDS = {"T": "tick", "V": "volume", "R": "range"}
+RANGE_TOLERANCE = 1e-9  # relative; a bar reaching its height up to float rounding closes
+
+
+class BarSpec(NamedTuple):
+    kind: str   # time, tick, volume or range
+    size: int   # seconds, ticks, volume or points
+
+
+@lru_cache(maxsize=None)
+def parse_bar_spec(spec: str) -> BarSpec:
+    """'S90', 'M2', 'H1' -> time bars; 'T500' ticks, 'V1000' volume, 'R50' points of range per bar."""
+    unit, count = spec[:1].upper(), spec[1:]
+    if not count.isdigit() or int(count) <= 0 or (unit not in TIME_UNITS and unit not in ACTIVITY_KINDS):
+        raise ValueError(f"Unknown bar spec {spec!r}: use S/M/H/D<n> for time bars, T<n>, V<n> or R<n>")
+    if unit in TIME_UNITS:
+        return BarSpec("time", int(count) * TIME_UNITS[unit])
+    return BarSpec(ACTIVITY_KINDS[unit], int(count))
+
+
+def _as_spec(spec) -> BarSpec:
+    return parse_bar_spec(spec) if isinstance(spec, str) else spec
+
+
+# ------------------ Batch ------------------ #
+def _range_keys(price: np.ndarray, height: float) -> np.ndarray:
+    """
+    Range-bar number per tick. Path dependent, so one bar at a time, each found with a
+    vectorized running high/low over a window that grows until the bar's height is reached
+    (sized from the previous bar, so the cost stays proportional to the ticks).
+    """
+    n = len(price)
+    keys = np.empty(n, dtype=np.int64)
+    start, key, window = 0, 0, 64
+    while start < n:
+        while True:
+            stop = min(n, start + window)
+            segment = price[start:stop]
+            hit = np.flatnonzero(np.maximum.accumulate(segment) - np.minimum.accumulate(segment) >= height)
+            if len(hit):
+                end = start + hit[0] + 1
+                break
+            if stop == n:
+                end = n
+                break
+            window *= 4
+        keys[start:end] = key
+        key += 1
+        window = max(16, 2 * (end - start))  # next bar is likely of similar length
+        start = end
+    return keys
+
+
+def build_bars(ticks: np.ndarray, spec, point: float) -> np.ndarray:
+    """
+    Aggregate ticks (tick_recorder RAW_DTYPE records or MT5 copy_ticks arrays, time ordered) into
+    bars, the forming one last. Prices are bids like MT5's bars; tick_volume counts ticks, spread
+    is the bar's lowest spread in points, real_volume sums tick volume.
+    """
+    spec = _as_spec(spec)
+    n = len(ticks)
+    if n == 0:
+        return np.zeros(0, dtype=BAR_DTYPE)
+    time_msc = ticks['time_msc'].astype(np.int64)
+    bid = ticks['bid'].astype(float)
+    spread = np.rint((ticks['ask'] - bid) / point).astype(np.int64)
+    volume = ticks['volume'].astype(np.int64)
+
+    if spec.kind == "time":
+        keys = time_msc // (spec.size * 1000)
+    elif spec.kind == "tick":
+        keys = np.arange(n) // spec.size
+    elif spec.kind == "volume":
+        weight = np.where(volume > 0, volume, 1)  # quotes without volume (FX) count as one
+        keys = (np.cumsum(weight) - weight) // spec.size
+    else:
+        keys = _range_keys(bid, spec.size * point * (1 - RANGE_TOLERANCE))
+
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], n]
+    bars = np.zeros(len(starts), dtype=BAR_DTYPE)
+    if spec.kind == "time":
+        bars['time'] = keys[starts] * spec.size
+    else:
+        # Open time of the first tick; bars opening within one second get consecutive seconds
+        # so the time index stays unique (get_candles and the market bus key bars by time)
+        idx = np.arange(len(starts))
+        bars['time'] = np.maximum.accumulate(time_msc[starts] // 1000 - idx) + idx
+    bars['open'] = bid[starts]
+    bars['high'] = np.maximum.reduceat(bid, starts)
+    bars['low'] = np.minimum.reduceat(bid, starts)
+    bars['close'] = bid[ends - 1]
+    bars['tick_volume'] = ends - starts
+    bars['spread'] = np.minimum.reduceat(spread, starts)
+    bars['real_volume'] = np.add.reduceat(volume, starts)
+    return bars
+
+
+def candles_from_ticks(symbol: str, spec, start, end=None, point: float = None, directory=TICK_DATA_DIR):
+    """Recorded ticks of start..end (days, inclusive) as bars in the get_candles layout."""
+    from market_engine import symbol_point
+    from strategy_engine import rates_to_candles
+    from tick_recorder import load_ticks
+
+    return rates_to_candles(build_bars(load_ticks(symbol, start, end, directory), spec, point or symbol_point(symbol)))
+
+
+# ------------------ Incremental ------------------ #
+class BarBuilder:
+    """
+    One symbol's bars of one spec, fed one tick at a time (MT5 Tick or a RAW_DTYPE record).
+    Keeps the last `capacity` closed bars plus the forming one; same bars as build_bars.
+    """
+
+    def __init__(self, spec, point: float, capacity: int = MARKET_BUS_BAR_CAPACITY):
+        self.spec = _as_spec(spec)
+        self.point = point
+        self.height = self.spec.size * point * (1 - RANGE_TOLERANCE)
+        self.closed = deque(maxlen=capacity)
+        self.bar = None        # forming bar: [time, open, high, low, close, tick_volume, spread, real_volume]
+        self.key = None
+        self.ticks = 0         # ticks seen (tick bars)
+        self.cum_volume = 0    # volume weight seen (volume bars)
+        self.last_time = None  # open time of the newest bar
+
+    def _key(self, time_msc: int, volume: int) -> int:
+        kind = self.spec.kind
+        if kind == "time":
+            return time_msc // (self.spec.size * 1000)
+        if kind == "tick":
+            key = self.ticks // self.spec.size
+            self.ticks += 1
+            return key
+        if kind == "volume":
+            key = self.cum_volume // self.spec.size
+            self.cum_volume += volume if volume > 0 else 1
+            return key
+        return self.key if self.bar is not None else (self.key + 1 if self.key is not None else 0)
+
+    def _close(self):
+        bar = tuple(self.bar)
+        self.closed.append(bar)
+        self.bar = None
+        return bar
+
+    def on_tick(self, tick):
+        """Add one tick; returns the bar it closed (a BAR_DTYPE-ordered tuple) or None."""
+        if isinstance(tick, np.void):
+            time_msc, bid, ask, volume = int(tick['time_msc']), float(tick['bid']), float(tick['ask']), int(tick['volume'])
+        else:
+            time_msc, bid, ask, volume = tick.time_msc, tick.bid, tick.ask, tick.volume
+        spread = int(np.rint((ask - bid) / self.point))
+
+        completed = None
+        key = self._key(time_msc, volume)
+        if self.bar is not None and key != self.key:
+            completed = self._close()
+        self.key = key
+
+        if self.bar is None:
+            if self.spec.kind == "time":
+                bar_time = key * self.spec.size
+            else:
+                bar_time = time_msc // 1000 if self.last_time is None else max(time_msc // 1000, self.last_time + 1)
+            self.last_time = bar_time
+            self.bar = [bar_time, bid, bid, bid, bid, 1, spread, volume]
+        else:
+            bar = self.bar
+            bar[2] = max(bar[2], bid)
+            bar[3] = min(bar[3], bid)
+            bar[4] = bid
+            bar[5] += 1
+            bar[6] = min(bar[6], spread)
+            bar[7] += volume
+
+        if self.spec.kind == "range" and self.bar[2] - self.bar[3] >= self.height:
+            completed = self._close()  # a range bar closes on the tick that reaches its height
+        return completed
+
+    def rates(self, n: int) -> np.ndarray:
+        """The last n bars (forming bar last) as BAR_DTYPE records."""
+        k = n - (self.bar is not None)
+        bars = [self.closed[i] for i in range(max(0, len(self.closed) - k), len(self.closed))] if k > 0 else []
+        if self.bar is not None and n > 0:
+            bars.append(tuple(self.bar))
+        return np.array(bars, dtype=BAR_DTYPE)
+
+    def candles(self, n: int = 200):
+        """The last n bars in the get_candles layout."""
+        from strategy_engine import rates_to_candles
+        return rates_to_candles(self.rates(n))
@@ -1,131 +1,226 @@
-import MetaTrader5 as mt5
-import pandas as pd
-import time
 from datetime import datetime
-from config import SYMBOLS, CHECK_INTERVAL, RISK_PER_TRADE, MAX_SPREAD
-from strategy_engine import in_kill_zone, generate_signal, get_candles, trend_filter, htf_trend_check, liquidity_sweep, atr_sl_tp, is_inverted_fvg
-from market_engine import detect_market_regime
+from config import (SYMBOLS, RISK_PER_TRADE, LOTS_MIN, MEMORY_DIAGNOSTICS, DECISION_JOURNAL, WATCHDOG_ENABLED, WATCHDOG_FLATTEN,
+                    ADAPTIVE_REGIME)
+from sessions import SessionScheduler, next_kill_zone
+from strategy_engine import get_candles, atr_sl_tp
+from market_engine import scan_market_regimes, load_symbol_points
 from risk_manager import calc_lot_size, daily_drawdown_check
-from execution import place_order, manage_trade
+from execution import place_order, manage_trade, sync_trade_states
 from logger import log_position_update
 from mt5 import ResilientMT5
-
-# ------------------ Initialize MT5 ------------------ #
-bot_mt5 = ResilientMT5(path=None, retry_interval=10, max_retries=5)
-print("Bot started — running... (Ctrl+C to stop)")
-
-try:
-    while True:
-        if daily_drawdown_check(bot_mt5):
-            print(f"{datetime.now()} → Daily drawdown limit reached — stopping trading")
-            break
-
-        if not in_kill_zone():
-            print(f"{datetime.now()} → Outside kill zones — skipping all new trades")
-            time.sleep(CHECK_INTERVAL)
+from portfolio_risk import PORTFOLIO
+from state_store import restore_snapshot, maybe_save_snapshot, save_snapshot
+from tick_recorder import TICKS
+from gates import GateContext
+from strategies import load_strategies, DEFAULT_MOVE_PCT, DEFAULT_PARTIAL_PCT
+from memory_diagnostics import MemoryMonitor
+from profiler import LoopProfiler
+from decision_journal import DecisionJournal, ACTION_TRADED, ACTION_FAILED
+from equity_watchdog import EquityWatchdog
+from regime_thresholds import REGIME_THRESHOLDS
+
+def manage_open_positions(bot_mt5, symbol, portfolio=PORTFOLIO, strategies=()):
+    """
+    Manage and log open positions for a symbol; runs in and out of kill zones. Each position is
+    managed with the profile of the strategy owning its magic number (defaults for the rest).
+    """
+    positions = bot_mt5.safe_positions_get(symbol)
+    owners = {strategy.magic: strategy for strategy in strategies}
+    magics = set(owners) or None
+    if any(magics is None or pos.magic in magics for pos in positions or ()):
+        # Risk to SL of the bot's own positions, in money per lot and fraction of equity
+        portfolio.set_positions(symbol, positions, bot_mt5.safe_account_info().equity, bot_mt5.safe_symbol_info(symbol), magics)
+    else:
+        portfolio.set_positions(symbol, ())
+    sync_trade_states(symbol, positions)
+
+    # ----- Log open positions per symbol -----
+    if positions and len(positions) > 0:
+        total_pl = sum([pos.profit for pos in positions])
+        for pos in positions:
+            owner = owners.get(pos.magic)
+            manage_trade(
+                bot_mt5,
+                symbol=symbol,
+                ticket=pos.ticket,
+                entry_price=pos.price_open,
+                tp=pos.tp,
+                sl=pos.sl,
+                move_pct=owner.move_pct if owner else DEFAULT_MOVE_PCT,
+                partial_pct=owner.partial_pct if owner else DEFAULT_PARTIAL_PCT,
+                pos=pos,
+                magic=pos.magic,
+            )
+            print(f"{datetime.now()} [{symbol}] → Open{f' ({owner.name})' if owner else ''}: {'BUY' if pos.type == 0 else 'SELL'}, "
+                f"Volume: {pos.volume}, Open Price: {pos.price_open:.5f}, "
+                f"P/L: {pos.profit:.2f}")
+            log_position_update({
+                "timestamp": datetime.now(),
+                "symbol": symbol,
+                "ticket": pos.ticket,
+                "type": "BUY" if pos.type == 0 else "SELL",
+                "volume": pos.volume,
+                "open_price": pos.price_open,
+                "current_price": pos.price_current,
+                "floating_pl": pos.profit,
+            })
+        print(f"{datetime.now()} [{symbol}] → Total P/L: {total_pl:.2f}")
+    return positions
+
+
+def evaluate(bot_mt5, strategy, symbol, df, regime, positions, shared, tick=None, portfolio=PORTFOLIO, journal=None,
+             thresholds=None):
+    """
+    One strategy instance's pre-trade decision and order for a symbol; data in `shared` is reused.
+    `thresholds` are the regime thresholds `regime` was classified with (journaled for replay).
+    """
+    ctx = GateContext(symbol, strategy.providers, shared, df=df, regime=regime, positions=strategy.own(positions))
+
+    def record(**decision):
+        if journal:
+            journal.record(symbol, df, regime, ctx.get('features'), tick, magic=strategy.magic, thresholds=thresholds, **decision)
+
+    # ----- Pre-trade gates: cheapest first, data fetched only if a gate needs it -----
+    rejected = strategy.gates.run(ctx)
+    if rejected:
+        record(gate=rejected)
+        return
+    signal = ctx['signal']
+    signal_direction = signal['direction']
+
+    # Calculate ATR-based SL/TP
+    sl, tp = atr_sl_tp(df, signal_direction)
+    lot = calc_lot_size(bot_mt5, symbol, sl, risk_percent=RISK_PER_TRADE)  # max 1% risk
+
+    # Scale down if correlated open positions already use the portfolio risk budget
+    scale = portfolio.scale_factor(symbol, signal_direction)
+    if scale < 1:
+        lot = round(lot * scale, 2)
+        print(f"{datetime.now()} [{symbol}] → Correlated exposure — lot scaled by {scale:.2f} to {lot}")
+        if lot < LOTS_MIN:
+            print(f"{datetime.now()} [{symbol}] → Portfolio risk budget used — skipping trade")
+            record(gate="portfolio")
+            return
+
+    # Place order
+    placed = place_order(bot_mt5, symbol, signal_direction, lot, sl, tp, magic=strategy.magic, comment=f"Python Bot {strategy.name}"[:31])  # MT5 comments hold 31 chars
+    if placed:  # estimate until the next cycle's set_positions measures the position itself
+        portfolio.add_exposure(symbol, RISK_PER_TRADE * scale if signal_direction == 'BUY' else -RISK_PER_TRADE * scale)
+    record(action=ACTION_TRADED if placed else ACTION_FAILED)
+
+
+def run(bot_mt5, symbols=SYMBOLS, scheduler=None, strategies=None, portfolio=PORTFOLIO, memory=None, profiler=None, stop=None, journal=None):
+    """
+    Main loop: manage positions, scan regimes and place trades every scheduler interval.
+    Market data, regimes and model features are computed once per cycle and shared by all
+    `strategies` (default: the enabled config.STRATEGIES).
+    Returns when `stop()` returns True (checked once per cycle). After a daily drawdown breach
+    (found here or by the equity watchdog) only open positions are managed until the next day.
+    With a `journal`, every evaluated symbol's decision and inputs are recorded once per cycle.
+    With ADAPTIVE_REGIME, regimes use per-symbol, per-session thresholds updated on every closed bar.
+    """
+    scheduler = scheduler or SessionScheduler()
+    strategies = strategies or load_strategies(bot_mt5)
+
+    while not (stop and stop()):
+        maybe_save_snapshot()
+        if memory:
+            memory.on_cycle()
+        if profiler:
+            profiler.on_cycle()
+
+        halted = daily_drawdown_check(bot_mt5)
+        if halted or not scheduler.in_session():
+            if halted:
+                print(f"{datetime.now()} → Daily drawdown limit reached — no new trades today, managing open positions")
+            else:
+                name, start, _ = next_kill_zone(scheduler.clock())
+                print(f"{datetime.now()} → Outside kill zones — skipping all new trades (next: {name} at {start:%Y-%m-%d %H:%M} UTC)")
+            for symbol in symbols:
+                try:
+                    manage_open_positions(bot_mt5, symbol, portfolio, strategies)
+                except Exception as e:
+                    print(f"{datetime.now()} [{symbol}] → ERROR: {e}")
+            scheduler.wait()
             continue
 
-        for symbol in SYMBOLS:
+        # ----- Fetch entry timeframe candles and scan regimes in one batch -----
+        frames, ticks = {}, {}
+        for symbol in symbols:
             try:
-                df = get_candles(bot_mt5, symbol, n=200)
-                
-                df_htf_h1 = get_candles(bot_mt5, symbol, n=200, timeframe=mt5.TIMEFRAME_H1)
-                df_htf_h4 = get_candles(bot_mt5, symbol, n=200, timeframe=mt5.TIMEFRAME_H4)
-                
-                signal = generate_signal(df, symbol, allow_momentum=True)
-                regime = detect_market_regime(df, allow_momentum=True)
-                positions = bot_mt5.safe_positions_get(symbol)
-
-                # ----- Log open positions per symbol -----
-                if positions and len(positions) > 0:
-                    total_pl = sum([pos.profit for pos in positions])
-                    for pos in positions:
-                        manage_trade(
-                            bot_mt5,
-                            symbol=symbol,
-                            ticket=pos.ticket,
-                            entry_price=pos.price_open,
-                            tp=pos.tp,
-                            sl=pos.sl,
-                            move_pct=0.4, # breakeven at 40% win rate
-                            partial_pct=0.5  # close half at 80% TP
-                        )
-                        print(f"{datetime.now()} [{symbol}] → Open: {'BUY' if pos.type == 0 else 'SELL'}, "
-                            f"Volume: {pos.volume}, Open Price: {pos.price_open:.5f}, "
-                            f"P/L: {pos.profit:.2f}")
-                        log_position_update({
-                            "timestamp": datetime.now(),
-                            "symbol": symbol,
-                            "ticket": pos.ticket,
-                            "type": "BUY" if pos.type == 0 else "SELL",
-                            "volume": pos.volume,
-                            "open_price": pos.price_open,
-                            "current_price": pos.price_current,
-                            "floating_pl": pos.profit,
-                        })
-                    print(f"{datetime.now()} [{symbol}] → Total P/L: {total_pl:.2f}")
-
-                # --- Trade logic based on regime ---
-                if signal:
-                    signal_direction = signal['direction']
-                    
-                    # Skip trades in unsuitable regimes
-                    if regime in ["CONSOLIDATION", "RANGING"]:
-                        print(f"{datetime.now()} → Market regime unsuitable ({regime}) — skipping trade")
-                        continue
-
-                    # Skip if already holding positions
-                    if positions:
-                        print(f"{datetime.now()} [{symbol}] → Existing position detected — skipping {signal_direction}, Entry type: {signal['entry_type']}")
-                        continue
-
-                    # Filters before order
-                    # if not trend_filter(df, signal_direction):
-                    #     print(f"{datetime.now()} [{symbol}] → Trend filter failed — skipping trade")
-                    #     continue
-
-                    # if not htf_trend_check(df_htf_h1, signal_direction):
-                    #     print(f"{datetime.now()} [{symbol}] → HTF H1 bias mismatch — signal: {signal_direction} skipped")
-                    #     continue
-
-                    if not htf_trend_check(df_htf_h4, signal_direction):
-                        print(f"{datetime.now()} [{symbol}] → HTF H4 bias mismatch — signal: {signal_direction} skipped")
-                        continue
-
-                    # ls_sweep = liquidity_sweep(df, session_candles=20, lookback_candles=5)
-                    # if ls_sweep != signal_direction:
-                    #     print(f"{datetime.now()} [{symbol}] → Liquidity sweep failed — signal: {signal_direction} skipped")
-                    #     continue
-
-                    if signal['type'] == 'FVG' and not is_inverted_fvg(signal, df):
-                        print(f"{datetime.now()} [{symbol}] → Waiting for IFVG confirmation — skipping trade")
-                        continue
-
-                    # Calculate ATR-based SL/TP
-                    sl, tp = atr_sl_tp(df, signal_direction)
-                    lot = calc_lot_size(bot_mt5, symbol, sl, risk_percent=RISK_PER_TRADE)  # max 1% risk
-
-                    tick = bot_mt5.safe_tick(symbol)
-
-                    # Handle single MAX_SPREAD value or per-symbol dict
-                    current_spread = tick.ask - tick.bid
-                    max_spread = MAX_SPREAD[symbol] if isinstance(MAX_SPREAD, dict) else MAX_SPREAD
-
-                    if current_spread > max_spread:
-                        print(f"{datetime.now()} [{symbol}] → Spread too high ({current_spread:.5f}) — skipping trade")
-                        continue
-
-                    # Place order
-                    place_order(bot_mt5, symbol, signal_direction, lot, sl, tp)
-                                            
-                else:
-                    print(f"{datetime.now()} [{symbol}] → No signal")
-                    
+                frames[symbol] = get_candles(bot_mt5, symbol, n=200)
+                ticks[symbol] = bot_mt5.safe_tick(symbol)
+                TICKS.on_tick(symbol, ticks[symbol])  # feeds the session spread statistics
             except Exception as e:
                 print(f"{datetime.now()} [{symbol}] → ERROR: {e}")
-        time.sleep(CHECK_INTERVAL)
-
-except KeyboardInterrupt:
-    print("Bot stopped by user")
-
-bot_mt5.shutdown()
+        # One scan per signal variant: momentum promotion changes the regime classification
+        thresholds = REGIME_THRESHOLDS.on_frames(frames) if ADAPTIVE_REGIME else {}
+        regimes = {allow_momentum: scan_market_regimes(frames, allow_momentum=allow_momentum, thresholds=thresholds)
+                   for allow_momentum in {strategy.allow_momentum for strategy in strategies}}
+
+        # ----- Update return covariance for correlation-aware sizing -----
+        if portfolio.n_updates == 0:
+            portfolio.seed(frames)
+        else:
+            portfolio.on_bars(frames)
+
+        for symbol, df in frames.items():
+            try:
+                positions = manage_open_positions(bot_mt5, symbol, portfolio, strategies)
+            except Exception as e:
+                print(f"{datetime.now()} [{symbol}] → ERROR: {e}")
+                continue
+            # H1/H4 candles and ICT model run, fetched by the first strategy that needs them; the cycle's
+            # tick is reused, so the spread gate and the journal see the same quote
+            shared = {"tick": ticks[symbol]} if symbol in ticks else {}
+            for strategy in strategies:
+                try:
+                    evaluate(bot_mt5, strategy, symbol, df, regimes[strategy.allow_momentum][symbol], positions, shared,
+                             ticks.get(symbol), portfolio, journal, thresholds.get(symbol))
+                except Exception as e:
+                    print(f"{datetime.now()} [{symbol}] → ERROR ({strategy.name}): {e}")
+        if journal:
+            journal.flush()
+        scheduler.wait()
+
+
+def main():
+    # ------------------ Initialize MT5 ------------------ #
+    restore_snapshot()  # risk baseline, candle cache, deal watermark from the last run
+    bot_mt5 = ResilientMT5(path=None, retry_interval=10, max_retries=5)
+    load_symbol_points(bot_mt5, SYMBOLS)  # per-symbol point sizes for regime pip thresholds
+    if ADAPTIVE_REGIME:
+        REGIME_THRESHOLDS.seed_from_broker(bot_mt5, SYMBOLS)  # symbols the snapshot had no estimators for
+    strategies = load_strategies(bot_mt5)  # config.STRATEGIES, one magic number each
+    memory = MemoryMonitor() if MEMORY_DIAGNOSTICS else None
+    if memory:
+        memory.start()
+    profiler = LoopProfiler()  # on demand: touch PROFILE_CONTROL_FILE or send SIGUSR1
+    profiler.install_signal()
+    journal = DecisionJournal() if DECISION_JOURNAL else None
+    watchdog = EquityWatchdog(bot_mt5, flatten=WATCHDOG_FLATTEN, magics={s.magic for s in strategies}) if WATCHDOG_ENABLED else None
+    if watchdog:
+        watchdog.start()
+
+    print("Bot started — running... (Ctrl+C to stop)")
+    try:
+        run(bot_mt5, strategies=strategies, memory=memory, profiler=profiler, journal=journal)
+    except KeyboardInterrupt:
+        print("Bot stopped by user")
+
+    for strategy in strategies:
+        strategy.gates.print_stats()
+    if watchdog:
+        watchdog.stop()
+    profiler.stop()
+    if memory:
+        memory.stop()
+    TICKS.flush()
+    if journal:
+        journal.flush()
+    save_snapshot()
+    bot_mt5.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 # -------------------------------
 # CONFIGURATION
 # -------------------------------
-import MetaTrader5 as mt5
+# Pure Python: timeframes and filling modes are plain names that mt5.py maps to
+# MetaTrader5 constants at the broker boundary, so offline tools can import this.
 
 SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "XAUUSD"]
 
@@ -16,21 +17,137 @@ MAX_SPREAD = {
     "XAUUSD": 0.4      # ~40 cents, gold tends to have wider spreads
 }
 
-TIMEFRAME = mt5.TIMEFRAME_M5 # 5-minute candles
+TIMEFRAME = "M5" # 5-minute candles
 
 CHECK_INTERVAL = 30       # seconds between checks
+OFF_SESSION_INTERVAL = 300  # seconds between housekeeping passes outside kill zones
+
+# Shared-memory market data bus (market_bus.py)
+MARKET_BUS_PREFIX = "fxbus"
+MARKET_BUS_BAR_CAPACITY = 1000    # bars kept per symbol and timeframe
+MARKET_BUS_TICK_CAPACITY = 4096   # ticks kept per symbol
+MARKET_BUS_POLL_INTERVAL = 0.5    # seconds between feeder polls
+MARKET_BUS_CUSTOM_BARS = ()       # tick-built timeframes also published, e.g. ("S90", "T500", "R50") (bar_builder.py)
+
+# Tick recording and the dynamic spread gate (tick_recorder.py)
+TICK_DATA_DIR = "data/ticks"        # one binary file per symbol per day
+TICK_DELTA_COMPRESSION = True       # 24-byte delta records instead of 44-byte raw records
+TICK_FLUSH_EVERY = 256              # ticks buffered per symbol before appending to disk
+TICK_POLL_INTERVAL = 0.25           # seconds between polls of the standalone recorder
+SPREAD_WINDOW = 2000                # ticks per symbol and session in the rolling spread statistics
+SPREAD_MIN_SAMPLES = 200            # below this, the static MAX_SPREAD applies
+SPREAD_GATE_PERCENTILE = 90         # "typical" spread of the session
+SPREAD_GATE_MULTIPLIER = 1.5        # skip trades when spread > multiplier x typical (capped at MAX_SPREAD)
+
+# Historical data store and bulk CSV/ZIP ingestion (history_store.py)
+HISTORY_DATA_DIR = "data/history"   # <symbol>/<timeframe>/<year>/ one raw file per bar column
+HISTORY_BLOCK_MB = 16               # CSV bytes parsed per worker task
+HISTORY_WORKERS = 0                 # parser processes; 0 = one per CPU
+HISTORY_GAP_MINUTES = 30            # report gaps longer than this (weekend closes excluded)
+
+# Decision journal (decision_journal.py): every pre-trade decision with its inputs, for queries and replay
+DECISION_JOURNAL = True
+DECISION_JOURNAL_DIR = "data/decisions"   # one directory per symbol, one file per day
+
+# Pre-trade gates (gates.py): on/off per filter; enabled gates run cheapest first
+# (the "signal" gate is not listed: it always runs, before every gate that reads the signal)
+TRADE_GATES = {
+    "existing_position": True,
+    "regime": True,
+    "ifvg": True,
+    "spread": True,
+    "htf_h4": True,
+    "htf_h1": False,
+    "trend_filter": False,
+    "liquidity_sweep": False,
+}
+
+# Memory diagnostics (memory_diagnostics.py); tracemalloc slows the bot, keep off in production
+MEMORY_DIAGNOSTICS = False
+MEMORY_SNAPSHOT_EVERY = 20          # cycles between tracemalloc snapshot diffs
+MEMORY_BUDGET_MB = 512              # warn (and alert) when RSS exceeds this; 0 disables
+MEMORY_REPORT_PATH = "logs/memory_report.log"
+MEMORY_TOP_SITES = 15               # allocation sites listed per report
+MEMORY_TRACE_FRAMES = 10            # stack depth recorded per allocation
+
+# On-demand loop profiling (profiler.py): touch PROFILE_CONTROL_FILE or send SIGUSR1 to start
+PROFILE_CONTROL_FILE = "state/profile.request"  # may contain overrides, e.g. "cycles=20 mode=cprofile"
+PROFILE_OUTPUT_DIR = "logs/profiles"
+PROFILE_CYCLES = 10                 # cycles profiled per request, then profiling turns itself off
+PROFILE_MODE = "sample"             # "sample" (stack sampler, low overhead) or "cprofile" (deterministic)
+PROFILE_SAMPLE_INTERVAL = 0.005     # seconds between stack samples
+
+# Backtest result cache (backtest_cache.py)
+BACKTEST_CACHE_DIR = "cache/backtest"
+BACKTEST_CACHE_MAX_MB = 512         # least recently used entries are evicted above this
+
+# Load and soak tests (loadtest.py): bot.run() against a simulated MT5 on a virtual clock
+LOADTEST_SYMBOL_COUNTS = (4, 16, 64, 250, 500)  # points of the scaling curve
+LOADTEST_HOURS = 4                  # simulated hours per run
+LOADTEST_LATENCY_MS = 20            # median simulated broker round trip
+LOADTEST_ERROR_RATE = 0.01          # fraction of broker calls that fail (and are retried)
+LOADTEST_REPORT_PATH = "logs/loadtest.csv"
+
+# Warm restart: runtime state is snapshotted here and restored on startup
+STATE_SNAPSHOT_PATH = "state/bot_state.pkl"
+STATE_SNAPSHOT_INTERVAL = 60  # seconds between snapshots
+
+# Kill zones in New York time (start, end) — see sessions.py
+SESSION_TIMEZONE = "US/Eastern"
+KILL_ZONES = {
+    "LONDON_OPEN": ("02:00", "05:00"),
+    "NY_OPEN": ("07:00", "10:00"),
+    "LONDON_CLOSE": ("10:00", "12:00"),
+}
+# Timezone of the MT5 server clock that candle timestamps are expressed in.
+# Many brokers run on EET/EEST (e.g. "Europe/Athens"); check your terminal's Market Watch time.
+BROKER_TIMEZONE = "UTC"
 LOTS_MIN = 0.01
 LOTS_MAX = 5.0
 RISK_PER_TRADE = 0.01     # 1% of equity
 RISK_TO_REWARD_RATIO=1.5
 DAILY_DRAWDOWN_LIMIT = 0.05  # 5% of equity
 
+# Equity watchdog (equity_watchdog.py): polls equity on its own thread and halts new entries on a breach
+WATCHDOG_ENABLED = True
+WATCHDOG_INTERVAL = 0.1             # seconds between equity polls
+WATCHDOG_FLATTEN = False            # also close the bot's positions (all STRATEGIES magics) on a breach
+WATCHDOG_FLATTEN_DEVIATION = 50     # max slippage in points accepted when flattening
+
+# Correlation-aware sizing (portfolio_risk.py)
+PORTFOLIO_RISK_LIMIT = 0.02    # max correlated open risk, fraction of equity
+PORTFOLIO_EWMA_LAMBDA = 0.97   # decay per bar of the return covariance
+PORTFOLIO_MIN_BARS = 50        # bars before correlations are trusted (fully correlated until then)
+
+# Adaptive regime thresholds (regime_thresholds.py): streaming quantiles of ATR and EMA spread
+# (pips) per symbol and session replace market_engine's fixed pip thresholds
+ADAPTIVE_REGIME = True
+REGIME_QUANTILES = {                # threshold -> (series, quantile)
+    "trend": ("ema_spread", 0.50),
+    "momentum_trend": ("ema_spread", 0.30),
+    "momentum_atr": ("atr", 0.60),
+    "volatile": ("atr", 0.90),
+    "consolidation": ("atr", 0.10),
+}
+REGIME_MIN_SAMPLES = 200            # closed bars per symbol and session before its quantiles are used
+REGIME_SEED_BARS = 20000            # history fetched at startup for symbols without saved estimators
+
 SL_POINTS = 200           # Stop-loss in points
 TP_POINTS = 200           # Take-profit in points
 
-MT5_FILLING_MODE = mt5.ORDER_FILLING_FOK      # FOK
+MT5_FILLING_MODE = "FOK"      # FOK, IOC or RETURN
+MT5_FILLING_FALLBACK = ("IOC", "RETURN")  # tried in order when the broker rejects the filling mode
 MT5_DEVIATION = 10        # Max slippage
+SLIPPAGE_MODEL_PATH = "logs/slippage_model.json"  # fitted from the executions journals (execution_quality.py)
 MAGIC_NUMBER = 234000
 
+# Strategy instances (strategies.py) sharing one data feed. Each trades and manages its positions
+# under its own magic number; "gates" optionally overrides TRADE_GATES for that instance.
+STRATEGIES = {
+    "ict_momentum": {"magic": MAGIC_NUMBER, "allow_momentum": True, "move_pct": 0.4, "partial_pct": 0.5},
+    "ict_mitigation": {"magic": MAGIC_NUMBER + 1, "allow_momentum": False, "move_pct": 0.4, "partial_pct": 0.5, "enabled": False},
+    "ict_momentum_runner": {"magic": MAGIC_NUMBER + 2, "allow_momentum": True, "move_pct": 0.6, "partial_pct": 0.3, "enabled": False},
+}
+
 # risk to reward ration - 1:1.5 or 1:2
 # breakeven at 40% win rate
@@ -0,0 +1,317 @@
+# decision_journal.py
+# Append-only binary journal of every pre-trade decision: per symbol and evaluated bar, the input
+# bar, the ICT features, regime, ATR, spread and which gate stopped the trade (or that it traded).
+#
+#   Layout:  <DECISION_JOURNAL_DIR>/<SYMBOL>/<YYYYMMDD>.dec   fixed-size decision records
+#            <DECISION_JOURNAL_DIR>/<SYMBOL>/<TIMEFRAME>.bars  closed input bars, append-only
+#   The directory is the symbol index and the file the day index; records in a file are in time
+#   order, so a time range is two binary searches on a memory-mapped column.
+#
+#   Query:   load_decisions("XAUUSD", start, end, action="skipped", signal_only=True)
+#   Replay:  python decision_journal.py [SYMBOL ...]   (re-runs generate_signal/detect_market_regime)
+import io
+import os
+import numpy as np
+import pandas as pd
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+from config import SYMBOLS, TIMEFRAME, DECISION_JOURNAL_DIR, STRATEGIES
+
+# ------------------ File Format ------------------ #
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u2'), ('record_size', '<u2')])
+DECISION_DTYPE = np.dtype([
+    ('time_ms', '<i8'),                 # local wall time of the decision (naive ms, like the journals' timestamps)
+    ('bar_time', '<i8'),                # input bar id: open time (epoch seconds) of the last, forming bar
+    ('window', '<u2'),                  # candles evaluated (closed bars from the bar store + the forming bar)
+    ('magic', '<u4'),                   # strategy instance that decided
+    ('action', 'u1'),
+    ('has_features', 'u1'),             # ICT features are only computed when the signal gate ran
+    ('bos', 'i1'), ('disp', '<i4'), ('direction', 'i1'), ('entry_type', 'u1'), ('type', 'u1'), ('ifvg_ok', 'u1'),
+    ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),  # the forming bar as evaluated
+    ('ob_low', '<f8'), ('ob_high', '<f8'), ('fvg_low', '<f8'), ('fvg_high', '<f8'),
+    ('atr', '<f8'),                     # mean high-low range over ATR_WINDOW bars (the regime's ATR)
+    ('spread', '<f4'),                  # points, from the cycle's tick
+    ('point', '<f8'),
+    ('regime', 'S16'),
+    ('gate', 'S20'),                    # rejecting gate, empty if all passed
+    ('trend_pips', '<f8'), ('momentum_trend_pips', '<f8'), ('momentum_atr_pips', '<f8'),  # regime thresholds used
+    ('volatile_pips', '<f8'), ('consolidation_pips', '<f8'),
+])
+BAR_DTYPE = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'), ('tick_volume', '<f8')])
+DECISION_MAGIC = b"DECN"
+DECISION_FILE_VERSION = 3  # 2: magic number per record, 3: regime thresholds per record
+
+ACTION_SKIPPED, ACTION_TRADED, ACTION_FAILED = 0, 1, 2
+ACTION_NAMES = {ACTION_SKIPPED: "skipped", ACTION_TRADED: "traded", ACTION_FAILED: "failed"}
+FEATURES = ('bos', 'disp', 'direction', 'entry_type', 'type', 'ifvg_ok', 'ob_low', 'ob_high', 'fvg_low', 'fvg_high')
+
+
+def decision_file_path(symbol: str, day, directory=DECISION_JOURNAL_DIR) -> Path:
+    """
+    Day file of the current format. A day started by an older version keeps its file and
+    continues in <day>.v<version>.dec, so records of two layouts never share a file.
+    """
+    path = Path(directory) / symbol.upper() / f"{pd.Timestamp(day):%Y%m%d}.dec"
+    if path.exists() and not _current_header(_read_header(path)):
+        return path.with_suffix(f".v{DECISION_FILE_VERSION}.dec")
+    return path
+
+
+def _read_header(path: Path):
+    if path.stat().st_size < HEADER_DTYPE.itemsize:
+        return None
+    return np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+
+
+def _current_header(header) -> bool:
+    """True for a missing header (empty file) or one written by this version."""
+    return header is None or (header['magic'] == DECISION_MAGIC and header['version'] == DECISION_FILE_VERSION
+                              and header['record_size'] == DECISION_DTYPE.itemsize)
+
+
+def bar_file_path(symbol: str, timeframe=TIMEFRAME, directory=DECISION_JOURNAL_DIR) -> Path:
+    return Path(directory) / symbol.upper() / f"{timeframe}.bars"
+
+
+def _wall_ms(when) -> int:
+    """Naive local wall time in ms: decision times are stored and queried on the clock datetime.now() shows."""
+    return pd.Timestamp(when).tz_localize(None).value // 1_000_000
+
+
+def _epoch_seconds(index) -> np.ndarray:
+    return np.asarray(index, dtype="datetime64[s]").astype(np.int64)
+
+
+def read_decision_file(path) -> np.ndarray:
+    """All records of one day file (memory-mapped); a torn last record is dropped."""
+    path = Path(path)
+    header = _read_header(path)
+    if header is None:
+        return np.zeros(0, dtype=DECISION_DTYPE)
+    if not _current_header(header):
+        raise ValueError(f"{path} is not a version {DECISION_FILE_VERSION} decision file")
+    count = (path.stat().st_size - HEADER_DTYPE.itemsize) // DECISION_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=DECISION_DTYPE)
+    return np.memmap(path, dtype=DECISION_DTYPE, mode="r", offset=HEADER_DTYPE.itemsize, shape=(count,))
+
+
+def read_bars(symbol: str, timeframe=TIMEFRAME, directory=DECISION_JOURNAL_DIR) -> np.ndarray:
+    path = bar_file_path(symbol, timeframe, directory)
+    if not path.exists():
+        return np.zeros(0, dtype=BAR_DTYPE)
+    data = np.fromfile(path, dtype=np.uint8)
+    return data[:len(data) - len(data) % BAR_DTYPE.itemsize].view(BAR_DTYPE)
+
+
+def _truncate_torn_tail(path: Path, record_size: int, header_size: int = 0):
+    """
+    Cut a partial last record left by a crash (a partial header empties the file), so the next
+    append starts on a record boundary instead of shifting every record after it.
+    """
+    size = path.stat().st_size
+    whole = header_size + (size - header_size) // record_size * record_size if size >= header_size else 0
+    if whole != size:
+        os.truncate(path, whole)
+
+
+# ------------------ Writer ------------------ #
+class DecisionJournal:
+    """
+    record() once per symbol per cycle, flush() once per cycle. Closed input bars go to the bar
+    store the first time they are seen, so a decision only adds the forming bar to its record.
+    """
+
+    def __init__(self, directory=DECISION_JOURNAL_DIR, timeframe=TIMEFRAME):
+        self.directory = Path(directory)
+        self.timeframe = timeframe
+        self._pending = {}    # (symbol, day) -> list of records
+        self._bars = {}       # symbol -> list of bar arrays to append
+        self._last_bar = {}   # symbol -> open time of the last stored closed bar
+
+    def _store_bars(self, symbol: str, df: pd.DataFrame):
+        last = self._last_bar.get(symbol)
+        if last is None:
+            stored = read_bars(symbol, self.timeframe, self.directory)
+            last = int(stored['time'][-1]) if len(stored) else -1
+        closed = df.iloc[:-1]
+        times = _epoch_seconds(closed.index)
+        new = times > last
+        if new.any():
+            bars = np.zeros(int(new.sum()), dtype=BAR_DTYPE)
+            bars['time'] = times[new]
+            for field in ('open', 'high', 'low', 'close', 'tick_volume'):
+                bars[field] = closed[field].to_numpy(dtype=float)[new]
+            self._bars.setdefault(symbol, []).append(bars)
+            last = int(times[new][-1])
+        self._last_bar[symbol] = last
+
+    def record(self, symbol: str, df: pd.DataFrame, regime: str, features: dict = None, tick=None,
+               point: float = None, gate: str = None, action: int = ACTION_SKIPPED, magic: int = 0,
+               thresholds: dict = None):
+        """
+        Journal one evaluation of `df` (the candles the gates saw, last row = forming bar);
+        `thresholds` are the regime thresholds the regime was classified with (fixed by default).
+        """
+        from market_engine import ATR_WINDOW, FIXED_THRESHOLDS, symbol_point
+
+        self._store_bars(symbol, df)
+        point = point or symbol_point(symbol)
+        last = df.iloc[-1]
+        rec = np.zeros(1, dtype=DECISION_DTYPE)[0]
+        now = datetime.now()
+        rec['time_ms'] = _wall_ms(now)
+        rec['bar_time'] = _epoch_seconds(df.index[-1:])[0]
+        rec['window'] = len(df)
+        rec['magic'] = magic
+        rec['action'] = action
+        for field in ('open', 'high', 'low', 'close'):
+            rec[field] = last[field]
+        rec['atr'] = (df['high'].to_numpy()[-ATR_WINDOW:] - df['low'].to_numpy()[-ATR_WINDOW:]).mean()
+        rec['spread'] = (tick.ask - tick.bid) / point if tick is not None else np.nan
+        rec['point'] = point
+        rec['regime'] = (regime or "").encode()
+        rec['gate'] = (gate or "").encode()
+        for name, value in (thresholds or FIXED_THRESHOLDS).items():
+            rec[f"{name}_pips"] = value
+        if features:
+            rec['has_features'] = 1
+            for field in FEATURES:
+                rec[field] = features[field]
+        else:
+            for field in ('ob_low', 'ob_high', 'fvg_low', 'fvg_high'):
+                rec[field] = np.nan
+        self._pending.setdefault((symbol, now.date()), []).append(rec)
+
+    def flush(self):
+        for symbol, parts in self._bars.items():
+            path = bar_file_path(symbol, self.timeframe, self.directory)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists():
+                _truncate_torn_tail(path, BAR_DTYPE.itemsize)
+            with open(path, "ab") as f:
+                np.concatenate(parts).tofile(f)
+        self._bars = {}
+
+        for (symbol, day), records in self._pending.items():
+            path = decision_file_path(symbol, day, self.directory)  # checks an existing file's header
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if path.exists():
+                _truncate_torn_tail(path, DECISION_DTYPE.itemsize, HEADER_DTYPE.itemsize)
+            with open(path, "ab") as f:
+                if f.tell() == 0:
+                    np.array([(DECISION_MAGIC, DECISION_FILE_VERSION, DECISION_DTYPE.itemsize)], dtype=HEADER_DTYPE).tofile(f)
+                np.array(records, dtype=DECISION_DTYPE).tofile(f)
+        self._pending = {}
+
+
+# ------------------ Queries ------------------ #
+def load_records(symbol: str, start, end, directory=DECISION_JOURNAL_DIR) -> np.ndarray:
+    """Raw records of one symbol with start <= decision time < end (local time; current file version only)."""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    lo_ms, hi_ms = _wall_ms(start), _wall_ms(end)
+    parts = []
+    for day in pd.date_range(start.normalize(), end.normalize(), freq="D"):
+        path = decision_file_path(symbol, day, directory)
+        if not path.exists():
+            continue
+        records = read_decision_file(path)
+        times = records['time_ms']
+        parts.append(records[np.searchsorted(times, lo_ms):np.searchsorted(times, hi_ms)])
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=DECISION_DTYPE)
+
+
+def load_decisions(symbol: str, start=None, end=None, action: str = None, gate: str = None,
+                   signal_only: bool = False, magic: int = None, directory=DECISION_JOURNAL_DIR) -> pd.DataFrame:
+    """
+    Decisions of one symbol as a DataFrame, newest last. Defaults to the last 7 days.
+    action: 'skipped', 'traded' or 'failed'; gate: rejecting gate name; signal_only: only bars
+    where the ICT model produced a direction; magic: one strategy instance.
+    """
+    # end is exclusive: by default include a decision recorded in the current millisecond
+    end = pd.Timestamp(end) if end is not None else pd.Timestamp(datetime.now()) + timedelta(milliseconds=1)
+    start = pd.Timestamp(start) if start is not None else end - timedelta(days=7)
+    records = load_records(symbol, start, end, directory)
+
+    mask = np.ones(len(records), dtype=bool)
+    if action is not None:
+        mask &= records['action'] == {v: k for k, v in ACTION_NAMES.items()}[action]
+    if gate is not None:
+        mask &= records['gate'] == gate.encode()
+    if signal_only:
+        mask &= records['direction'] != 0
+    if magic is not None:
+        mask &= records['magic'] == magic
+    records = records[mask]
+
+    df = pd.DataFrame({name: records[name] for name in DECISION_DTYPE.names})
+    df['time'] = pd.to_datetime(df.pop('time_ms'), unit='ms')
+    df['bar_time'] = pd.to_datetime(df['bar_time'], unit='s')
+    df['action'] = df['action'].map(ACTION_NAMES)
+    for column in ('regime', 'gate'):
+        df[column] = df[column].str.decode("ascii")
+    df.insert(0, 'symbol', symbol)
+    return df.set_index('time')
+
+
+# ------------------ Replay ------------------ #
+def replay(symbol: str, start=None, end=None, allow_momentum: bool = None, directory=DECISION_JOURNAL_DIR) -> dict:
+    """
+    Re-run generate_signal and detect_market_regime on each journaled input (bars from the bar
+    store plus the journaled forming bar, journaled regime thresholds) and compare with what was recorded. allow_momentum
+    defaults to the setting of the strategy in STRATEGIES whose magic number made the decision.
+    Returns counts and the mismatching records.
+    """
+    from strategy_engine import generate_signal
+    from market_engine import detect_market_regime, FIXED_THRESHOLDS
+
+    # end is exclusive: by default include a decision recorded in the current millisecond
+    end = pd.Timestamp(end) if end is not None else pd.Timestamp(datetime.now()) + timedelta(milliseconds=1)
+    start = pd.Timestamp(start) if start is not None else end - timedelta(days=7)
+    records = load_records(symbol, start, end, directory)
+    bars = read_bars(symbol, directory=directory)
+    bar_index = pd.DatetimeIndex(pd.to_datetime(bars['time'], unit='s'), name='time')
+    bar_frame = pd.DataFrame({f: bars[f] for f in ('open', 'high', 'low', 'close', 'tick_volume')}, index=bar_index)
+
+    momentum_by_magic = {params['magic']: params.get('allow_momentum', True) for params in STRATEGIES.values()}
+    checked, incomplete, mismatches = 0, 0, []
+    for rec in records:
+        momentum = allow_momentum if allow_momentum is not None else momentum_by_magic.get(int(rec['magic']), True)
+        end_pos = np.searchsorted(bars['time'], rec['bar_time'])
+        closed = bar_frame.iloc[max(0, end_pos - (int(rec['window']) - 1)):end_pos]
+        if len(closed) != rec['window'] - 1:
+            incomplete += 1
+            continue
+        forming = pd.DataFrame({'open': [rec['open']], 'high': [rec['high']], 'low': [rec['low']], 'close': [rec['close']],
+                                'tick_volume': [np.nan]}, index=pd.DatetimeIndex([pd.to_datetime(rec['bar_time'], unit='s')], name='time'))
+        df = pd.concat([closed, forming])
+
+        diffs = []
+        thresholds = {name: float(rec[f"{name}_pips"]) for name in FIXED_THRESHOLDS}
+        regime = detect_market_regime(df, allow_momentum=momentum, point=float(rec['point']), thresholds=thresholds)
+        if regime != rec['regime'].decode():
+            diffs.append(f"regime {rec['regime'].decode()} -> {regime}")
+        if rec['has_features']:
+            features = {}
+            with redirect_stdout(io.StringIO()):
+                generate_signal(df, symbol, allow_momentum=momentum, features=features)
+            for field in FEATURES:
+                if not features or not np.array_equal(np.asarray(features[field], dtype=float), float(rec[field]), equal_nan=True):
+                    diffs.append(f"{field} {rec[field]} -> {features.get(field)}")
+        checked += 1
+        if diffs:
+            mismatches.append({"time": pd.to_datetime(int(rec['time_ms']), unit='ms'), "bar_time": pd.to_datetime(int(rec['bar_time']), unit='s'),
+                               "diffs": "; ".join(diffs)})
+    return {"symbol": symbol, "records": len(records), "checked": checked, "incomplete": incomplete,
+            "mismatches": pd.DataFrame(mismatches)}
+
+
+if __name__ == "__main__":
+    import sys
+    for symbol in sys.argv[1:] or SYMBOLS:
+        result = replay(symbol)
+        print(f"{symbol}: {result['checked']} of {result['records']} decisions replayed "
+              f"({result['incomplete']} without full input), {len(result['mismatches'])} mismatches")
+        if len(result['mismatches']):
+            print(result['mismatches'].to_string(index=False))
@@ -0,0 +1,72 @@
+# equity_watchdog.py
+# Equity watchdog: polls account equity every WATCHDOG_INTERVAL seconds on its own thread, so a
+# daily drawdown breach is caught within one poll instead of at the top of the next loop cycle.
+# On a breach TRADING_HALTED is set at once (place_order refuses new entries); optionally the
+# bot's positions are flattened, then the alert goes out.
+import threading
+import time
+from datetime import datetime
+from config import WATCHDOG_INTERVAL, WATCHDOG_FLATTEN
+from risk_manager import update_drawdown, drawdown_alert
+
+
+class EquityWatchdog:
+    """
+    start() / stop() around the main loop. Each poll is one account_info() call and a locked
+    update of the shared drawdown state; nothing else runs on this thread until a breach.
+    """
+
+    def __init__(self, bot_mt5, interval=WATCHDOG_INTERVAL, flatten=WATCHDOG_FLATTEN, magics=None):
+        self.bot_mt5 = bot_mt5
+        self.interval = interval
+        self.flatten = flatten
+        self.magics = magics  # positions flattened on a breach; None = all
+        self.polls = 0
+        self.failures = 0
+        self.last_poll = None     # datetime of the last successful poll
+        self.max_poll_ms = 0.0
+        self.breach = None        # {"time", "equity", "peak", "drawdown_pct", "halt_ms", "flattened"}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="equity-watchdog", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        print(f"{datetime.now()} → Equity watchdog on (every {self.interval * 1000:.0f} ms, flatten: {self.flatten})")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                self.failures += 1
+                print(f"{datetime.now()} → Equity watchdog ERROR: {e}")
+
+    def poll(self) -> bool:
+        """One equity check. Returns True if this poll detected today's breach."""
+        start = time.perf_counter()
+        info = self.bot_mt5.account_info_once()
+        if info is None:
+            self.failures += 1
+            return False
+        peak, drawdown_pct, first = update_drawdown(info.equity)
+        self.polls += 1
+        self.last_poll = datetime.now()
+        self.max_poll_ms = max(self.max_poll_ms, (time.perf_counter() - start) * 1000)
+        if not first:
+            return False
+
+        halt_ms = (time.perf_counter() - start) * 1000  # account_info() to TRADING_HALTED set
+        print(f"{datetime.now()} → Equity watchdog: drawdown {drawdown_pct:.2f}% (equity {info.equity:.2f}, "
+              f"peak {peak:.2f}) — new entries halted in {halt_ms:.1f} ms")
+        self.breach = {"time": self.last_poll, "equity": info.equity, "peak": peak, "drawdown_pct": drawdown_pct,
+                       "halt_ms": halt_ms, "flattened": 0}
+        if self.flatten:
+            from execution import flatten_positions  # broker order path, only needed on a breach
+            self.breach["flattened"] = flatten_positions(self.bot_mt5, self.magics)
+        drawdown_alert(info.equity, peak, drawdown_pct)
+        return True
@@ -1,10 +1,164 @@
 import MetaTrader5 as mt5
-from config import MT5_FILLING_MODE, MT5_DEVIATION, MAGIC_NUMBER
+from config import MT5_FILLING_MODE, MT5_DEVIATION, MAGIC_NUMBER, WATCHDOG_FLATTEN_DEVIATION
 from datetime import datetime, timedelta, timezone
-from logger import log_trade_open, print_trade, log_trade_close
+from logger import log_trade_open, print_trade, log_trade_close, log_execution
 from alerts import send_alert
+from state_store import register_state
+from mt5 import FILLING_MODES, OrderRejected
+from market_engine import symbol_point
+from sessions import current_kill_zone
+from risk_manager import TRADING_HALTED
 
-def place_order(bot_mt5, symbol, order_type: str, lot: float, sl: float, tp: float):
+LAST_PROCESSED_DEAL = 0  # highest deal ticket already written to the closed-trade journal
+
+
+def _set_last_processed_deal(ticket):
+    global LAST_PROCESSED_DEAL
+    LAST_PROCESSED_DEAL = ticket
+
+
+register_state("last_processed_deal", lambda: LAST_PROCESSED_DEAL, _set_last_processed_deal)
+
+# ------------------ Position Lifecycle ------------------ #
+# A ticket is OPENED until it leaves the positions list (CLOSED). Breakeven and the partial close
+# are independent actions, each sent at most once per ticket and flagged on its record once done
+# (or, for a breakeven the broker refuses outright, given up).
+OPENED, CLOSED = "OPENED", "CLOSED"
+MANAGEMENT_ACTIONS = ("breakeven", "partial")
+PARTIAL_TP_PCT = 0.8                  # partial close at 80% of the way to TP
+CLOSED_STATE_RETENTION = timedelta(days=7)
+
+TRADE_STATES = {}  # ticket -> {"state", "breakeven", "partial", "symbol", "entry_price", "initial_volume", "updated"}
+
+
+def _set_trade_states(states: dict):
+    """Restore snapshot records; records of the former staged lifecycle become flags."""
+    for ticket, record in states.items():
+        record = dict(record)
+        if "breakeven" not in record:
+            stage = record["state"]
+            record["breakeven"] = stage in ("BREAKEVEN_DONE", "PARTIAL_DONE")
+            record["partial"] = stage == "PARTIAL_DONE"
+            record["state"] = CLOSED if stage == CLOSED else OPENED
+        TRADE_STATES[ticket] = record
+
+
+register_state("trade_states", lambda: dict(TRADE_STATES), _set_trade_states)
+
+
+def _set_trade_state(ticket: int, state: str):
+    record = TRADE_STATES[ticket]
+    if record["state"] != state:
+        print(f"{datetime.now()} [{record['symbol']}] → Ticket {ticket}: {record['state']} → {state}")
+    record["state"] = state
+    record["updated"] = datetime.now()
+
+
+def _action_done(ticket: int, action: str, note: str = "done"):
+    record = TRADE_STATES[ticket]
+    print(f"{datetime.now()} [{record['symbol']}] → Ticket {ticket}: {action} {note}")
+    record[action] = True
+    record["updated"] = datetime.now()
+
+
+def _trade_state(pos, symbol: str) -> dict:
+    """
+    Lifecycle record of a position, created on first sight. A position first seen with its SL
+    already at breakeven (e.g. after a restart without a snapshot) has its breakeven done.
+    """
+    record = TRADE_STATES.get(pos.ticket)
+    if record is None:
+        record = TRADE_STATES[pos.ticket] = {
+            "state": OPENED,
+            "breakeven": _sl_at_breakeven(pos, symbol),
+            "partial": False,
+            "symbol": symbol,
+            "entry_price": pos.price_open,
+            "initial_volume": pos.volume,
+            "updated": datetime.now(),
+        }
+    return record
+
+
+def _sl_at_breakeven(pos, symbol: str) -> bool:
+    """SL at or beyond the entry price, within half a point (brokers round SL to the tick size)."""
+    if not pos.sl:
+        return False
+    tolerance = symbol_point(symbol) / 2
+    if pos.type == mt5.ORDER_TYPE_BUY:
+        return pos.sl >= pos.price_open - tolerance
+    return pos.sl <= pos.price_open + tolerance
+
+
+def sync_trade_states(symbol: str, positions):
+    """Mark tickets of `symbol` that are no longer open as CLOSED; forget old closed tickets."""
+    open_tickets = {pos.ticket for pos in positions or ()}
+    now = datetime.now()
+    for ticket, record in list(TRADE_STATES.items()):
+        if record["symbol"] != symbol:
+            continue
+        if record["state"] != CLOSED and ticket not in open_tickets:
+            _set_trade_state(ticket, CLOSED)
+        elif record["state"] == CLOSED and now - record["updated"] > CLOSED_STATE_RETENTION:
+            del TRADE_STATES[ticket]
+
+# ------------------ Execution Telemetry ------------------ #
+FILLING_BY_SYMBOL = {}  # symbol -> filling mode that last filled, once MT5_FILLING_MODE was rejected
+register_state("filling_modes", lambda: dict(FILLING_BY_SYMBOL), FILLING_BY_SYMBOL.update)
+
+
+def filling_mode(symbol: str) -> str:
+    return FILLING_BY_SYMBOL.get(symbol, MT5_FILLING_MODE)
+
+
+def record_execution(bot_mt5, symbol: str, side: str, kind: str, volume: float, requested_price: float, result):
+    """
+    Journal one order's execution quality (logs/<SYMBOL>/executions.csv): fill price from the deal,
+    slippage against the requested price in points (positive = adverse), latency, retcode and
+    the requotes/rejects/filling mode reported by safe_order_send. Returns the fill price.
+    """
+    stats = getattr(bot_mt5, "last_order_stats", None) or {}
+    done = result is not None and result.retcode == mt5.TRADE_RETCODE_DONE
+    fill_price = None
+    try:
+        if done:
+            deal = bot_mt5.safe_deal(result.deal) if result.deal else None
+            fill_price = deal.price if deal is not None else (result.price or None)
+            if stats.get("filling") and stats["filling"] != filling_mode(symbol):
+                FILLING_BY_SYMBOL[symbol] = stats["filling"]
+                print(f"{datetime.now()} [{symbol}] → Filling mode {stats['filling']} will be used from now on")
+
+        slippage = None
+        if fill_price:
+            slippage = (fill_price - requested_price if side == 'BUY' else requested_price - fill_price) / symbol_point(symbol)
+        log_execution({
+            "timestamp": datetime.now(),
+            "symbol": symbol,
+            "session": current_kill_zone() or "OFF",
+            "kind": kind,
+            "side": side,
+            "volume": volume,
+            "requested_price": requested_price,
+            "fill_price": fill_price,
+            "slippage_points": slippage,
+            "latency_ms": stats.get("latency_ms"),
+            "attempts": stats.get("attempts"),
+            "requotes": stats.get("requotes"),
+            "rejects": stats.get("rejects"),
+            "filling": stats.get("filling"),
+            "deviation": MT5_DEVIATION,
+            "retcode": result.retcode if result is not None else None,
+            "deal": result.deal if result is not None else None,
+        })
+    except Exception as e:
+        print(f"{datetime.now()} [{symbol}] → Execution telemetry failed: {e}")
+    return fill_price
+
+
+def place_order(bot_mt5, symbol, order_type: str, lot: float, sl: float, tp: float, magic: int = MAGIC_NUMBER, comment: str = "Python Bot"):
+    if TRADING_HALTED.is_set():
+        print(f"{datetime.now()} [{symbol}] → Trading halted (daily drawdown) — order not sent")
+        return False
     tick = bot_mt5.safe_tick(symbol)
     price = tick.ask if order_type == 'BUY' else tick.bid
 
@@ -17,13 +171,20 @@ def place_order(bot_mt5, symbol, order_type: str, lot: float, sl: float, tp: flo
         "sl": sl,
         "tp": tp,
         "deviation": MT5_DEVIATION,
-        "magic": MAGIC_NUMBER,
-        "comment": "Python Bot",
-        "type_filling": MT5_FILLING_MODE,
+        "magic": magic,
+        "comment": comment,
+        "type_filling": FILLING_MODES[filling_mode(symbol)],
         "type_time": mt5.ORDER_TIME_GTC,
     }
 
-    result = bot_mt5.safe_order_send(request)
+    try:
+        result = bot_mt5.safe_order_send(request)
+    except OrderRejected as e:
+        result = e.result
+    except ConnectionError:
+        record_execution(bot_mt5, symbol, order_type, "open", lot, price, None)
+        raise
+    record_execution(bot_mt5, symbol, order_type, "open", lot, price, result)
     trade_info = {
         "timestamp": datetime.now(),
         "symbol": symbol,
@@ -120,124 +281,198 @@ def check_closed_trades(bot_mt5, symbol):
                 LAST_PROCESSED_DEAL = d.ticket
 
 
-def manage_trade(bot_mt5, symbol: str, ticket: int, entry_price: float, tp: float, sl: float, move_pct=0.5, partial_pct=0.5):
+def manage_trade(bot_mt5, symbol: str, ticket: int, entry_price: float, tp: float, sl: float, move_pct=0.5, partial_pct=0.5, pos=None,
+                 magic: int = MAGIC_NUMBER):
     """
-    Adjust SL to breakeven and take partial profits.
+    Adjust SL to breakeven and take partial profits, each at most once per ticket and independently
+    of the other: a refused breakeven does not hold back the partial close.
+    Pass the position from positions_get as `pos` to avoid fetching it again; prices come from
+    pos.price_current, so a position with nothing left to do costs no broker calls.
     """
-    pos = bot_mt5.safe_position_get_by_ticket(ticket)
     if pos is None:
+        pos = bot_mt5.safe_position_get_by_ticket(ticket)
+        if pos is None:
+            return
+
+    record = _trade_state(pos, symbol)
+    if all(record[action] for action in MANAGEMENT_ACTIONS):
         return
 
-    tick = bot_mt5.safe_tick(symbol)
-    current_price = tick.bid if pos.type == mt5.ORDER_TYPE_BUY else tick.ask
+    is_buy = pos.type == mt5.ORDER_TYPE_BUY
+    current_price = pos.price_current
     lot = pos.volume
-
-    # --- Breakeven SL ---
     tp_move = abs(tp - entry_price)
-    threshold_price = entry_price + tp_move * move_pct if pos.type == mt5.ORDER_TYPE_BUY else entry_price - tp_move * move_pct
 
-    if (pos.type == mt5.ORDER_TYPE_BUY and current_price >= threshold_price) or \
-       (pos.type == mt5.ORDER_TYPE_SELL and current_price <= threshold_price):
-        
-        if pos.sl != entry_price:
+    def reached(pct):
+        level = entry_price + tp_move * pct if is_buy else entry_price - tp_move * pct
+        return current_price >= level if is_buy else current_price <= level
+
+    # --- Breakeven SL ---
+    if not record["breakeven"] and reached(move_pct):
+        if _sl_at_breakeven(pos, symbol):
+            _action_done(ticket, "breakeven")
+        else:
             # Move SL to entry price
             request = {
                 "action": mt5.TRADE_ACTION_SLTP,
-                "symbol": mt5.positions_get(ticket=ticket)[0].symbol,
+                "symbol": symbol,
                 "position": ticket,
                 "sl": entry_price,
                 "tp": tp,
                 "deviation": MT5_DEVIATION,
-                "magic": MAGIC_NUMBER,
+                "magic": magic,
             }
-            bot_mt5.safe_order_send(request)
-        
-            # Send email
-            subject = f"SL Moved to Breakeven | {symbol}"
-            message = f"""
-            STOP LOSS UPDATED
+            try:
+                bot_mt5.safe_order_send(request)
+            except OrderRejected as e:  # e.g. INVALID_STOPS / freeze level: resending cannot help
+                _action_done(ticket, "breakeven", f"refused, not retried ({e})")
+                send_alert(f"SL Breakeven Refused | {symbol}", f"Ticket {ticket}: {e}\nThe SL stays where it is.")
+            except ConnectionError as e:
+                print(f"{datetime.now()} [{symbol}] → Breakeven SL update failed for ticket {ticket}: {e}")
+            else:
+                _action_done(ticket, "breakeven")
+
+                # Send email
+                subject = f"SL Moved to Breakeven | {symbol}"
+                message = f"""
+                STOP LOSS UPDATED
+
+                Symbol: {symbol}
+                Ticket: {ticket}
+                New SL: {entry_price}
+
+                Risk on trade is now neutral.
+
+                -- PRO ICT Trading Bot
+                """
+                send_alert(subject, message)
+                print(f"{datetime.now()} [{symbol}] → SL moved to breakeven for ticket {ticket}")
 
-            Symbol: {symbol}
-            Ticket: {ticket}
-            New SL: {entry_price}
-
-            Risk on trade is now neutral.
+    # --- Partial close at 80% TP ---
+    if record["partial"] or not reached(PARTIAL_TP_PCT):
+        return
+    if lot < record["initial_volume"] - 1e-9:
+        _action_done(ticket, "partial", "already reduced")  # manually or before a restart
+        return
 
-            -- PRO ICT Trading Bot
-            """
-            send_alert(subject, message)
-            print(f"{datetime.now()} [{symbol}] → SL moved to breakeven for ticket {ticket}")
+    partial_lot = round(lot * partial_pct, 2)  # round to 2 decimal places or broker's step size
+    if partial_lot > lot:                     # prevent closing more than remaining
+        partial_lot = lot
 
-    # --- Partial close at 80% TP ---
-    partial_price = entry_price + tp_move * 0.8 if pos.type == mt5.ORDER_TYPE_BUY else entry_price - tp_move * 0.8
-    # Only try partial close if lots remain
-    if lot > 0 and ((pos.type == mt5.ORDER_TYPE_BUY and current_price >= partial_price) or (pos.type == mt5.ORDER_TYPE_SELL and current_price <= partial_price)):
-                
-        partial_lot = round(lot * partial_pct, 2)  # round to 2 decimal places or broker's step size
-        if partial_lot > lot:                     # prevent closing more than remaining
-            partial_lot = lot
-            
-        if partial_lot <= 0:
-            print(f"{symbol} → Calculated lot is 0 — skipping order")
-            return
+    if partial_lot <= 0:
+        print(f"{symbol} → Calculated lot is 0 — skipping partial close")
+        _action_done(ticket, "partial", "skipped")
+        return
 
-        # send partial close request
+    # send partial close request
+    close_side = 'SELL' if is_buy else 'BUY'
+    try:
         result = bot_mt5.safe_order_send({
             "action": mt5.TRADE_ACTION_DEAL,
             "symbol": symbol,
             "volume": partial_lot,
-            "type": mt5.ORDER_TYPE_SELL if pos.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY,
+            "type": mt5.ORDER_TYPE_SELL if is_buy else mt5.ORDER_TYPE_BUY,
             "price": current_price,
             "position": ticket,
             "deviation": MT5_DEVIATION,
-            "magic": MAGIC_NUMBER,
+            "magic": magic,
             "comment": "Partial close (Python Bot)",
+            "type_filling": FILLING_MODES[filling_mode(symbol)],
             "type_time": mt5.ORDER_TIME_GTC,
         })
-        
-        if result.retcode != mt5.TRADE_RETCODE_DONE:
-            print(f"{datetime.now()} → ORDER FAILED")
-            print(f"Retcode: {result.retcode}")
-            print(f"Comment: {result.comment}")
-
-            # Send emails
-            subject = f"Partial Close FAILED | {symbol}"
-            message = f"""
-            PARTIAL CLOSE FAILURE
-
-            Symbol: {symbol}
-            Ticket: {ticket}
-            Attempted Close Volume: {partial_lot}
-            Price: {current_price}
-
-            Retcode: {result.retcode}
-            Broker Comment: {result.comment}
-
-            Manual review may be required.
-
-            -- PRO ICT Trading Bot
-            """
-            send_alert(subject, message)
-            print(result)
-            return
-    
-        # update lot in memory
-        lot -= partial_lot
-        print(f"{datetime.now()} [{symbol}] → Closed {partial_lot} lots (partial) at {current_price} for ticket {ticket}")
+    except ConnectionError as e:
+        record_execution(bot_mt5, symbol, close_side, "partial_close", partial_lot, current_price, getattr(e, "result", None))
+        print(f"{datetime.now()} → ORDER FAILED: {e}")
 
         # Send emails
-        subject = f"Partial Close Executed | {symbol}"
+        subject = f"Partial Close FAILED | {symbol}"
         message = f"""
-        PARTIAL PROFIT TAKEN
+        PARTIAL CLOSE FAILURE
 
         Symbol: {symbol}
         Ticket: {ticket}
-        Closed Volume: {partial_lot}
-        Execution Price: {current_price}
+        Attempted Close Volume: {partial_lot}
+        Price: {current_price}
 
-        Remaining Position: {lot}
+        Error: {e}
+
+        Manual review may be required.
 
         -- PRO ICT Trading Bot
         """
         send_alert(subject, message)
+        return
+    _action_done(ticket, "partial")
+    fill_price = record_execution(bot_mt5, symbol, close_side, "partial_close", partial_lot, current_price, result)
 
+    # update lot in memory
+    lot -= partial_lot
+    print(f"{datetime.now()} [{symbol}] → Closed {partial_lot} lots (partial) at {fill_price or current_price} for ticket {ticket}")
+
+    # Send emails
+    subject = f"Partial Close Executed | {symbol}"
+    message = f"""
+    PARTIAL PROFIT TAKEN
+
+    Symbol: {symbol}
+    Ticket: {ticket}
+    Closed Volume: {partial_lot}
+    Execution Price: {fill_price or current_price}
+
+    Remaining Position: {lot}
+
+    -- PRO ICT Trading Bot
+    """
+    send_alert(subject, message)
+
+
+def flatten_positions(bot_mt5, magics=None) -> int:
+    """
+    Close all open positions (only those of `magics`, if given), biggest loser first, through the
+    urgent order path: failed sends are retried at once without waits or per-attempt alerts.
+    Returns the number of positions closed.
+    """
+    positions = [pos for pos in bot_mt5.safe_positions_get() if magics is None or pos.magic in magics]
+    closed, failed = 0, []
+    for pos in sorted(positions, key=lambda p: p.profit):
+        is_buy = pos.type == mt5.ORDER_TYPE_BUY
+        close_side = 'SELL' if is_buy else 'BUY'
+        tick = bot_mt5.safe_tick(pos.symbol)
+        price = tick.bid if is_buy else tick.ask
+        request = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": pos.symbol,
+            "volume": pos.volume,
+            "type": mt5.ORDER_TYPE_SELL if is_buy else mt5.ORDER_TYPE_BUY,
+            "price": price,
+            "position": pos.ticket,
+            "deviation": WATCHDOG_FLATTEN_DEVIATION,
+            "magic": pos.magic,
+            "comment": "Flatten (Python Bot)",
+            "type_filling": FILLING_MODES[filling_mode(pos.symbol)],
+            "type_time": mt5.ORDER_TIME_GTC,
+        }
+        try:
+            result = bot_mt5.safe_order_send(request, retry_interval=0)
+        except ConnectionError as e:
+            record_execution(bot_mt5, pos.symbol, close_side, "flatten", pos.volume, price, getattr(e, "result", None))
+            print(f"{datetime.now()} [{pos.symbol}] → Flatten FAILED for ticket {pos.ticket}: {e}")
+            failed.append(pos.ticket)
+            continue
+        record_execution(bot_mt5, pos.symbol, close_side, "flatten", pos.volume, price, result)
+        print(f"{datetime.now()} [{pos.symbol}] → Flattened ticket {pos.ticket} ({pos.volume} lots, P/L {pos.profit:.2f})")
+        closed += 1
+
+    if failed:
+        send_alert("Flatten FAILED", f"""
+        FLATTEN FAILURE
+
+        Timestamp: {datetime.now()}
+        Closed: {closed} of {len(positions)} positions
+        Still open (tickets): {failed}
+
+        Manual review required.
+
+        -- PRO ICT Trading Bot
+        """)
+    return closed
@@ -0,0 +1,136 @@
+# execution_quality.py
+# Execution telemetry analysis: per-symbol (and per-session) slippage and latency distributions from
+# the executions journals written by execution.record_execution, and an exportable slippage model
+# so backtests can charge real execution costs.
+import json
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+from config import SYMBOLS, SLIPPAGE_MODEL_PATH
+
+QUANTILE_LEVELS = np.linspace(0, 1, 21)  # stored per distribution; sampling interpolates between them
+MIN_FILLS = 20  # below this a session falls back to its symbol, a symbol to zero cost
+
+
+def load_executions(symbols=SYMBOLS) -> pd.DataFrame:
+    """All symbols' executions journals in one frame."""
+    from analytics import load_journal
+
+    frames = [load_journal(symbol, "executions") for symbol in symbols]
+    frames = [f for f in frames if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def execution_stats(executions: pd.DataFrame, by=("symbol", "session")) -> pd.DataFrame:
+    """Fill rate, requotes, rejects and slippage/latency percentiles per group."""
+    if executions.empty:
+        return pd.DataFrame()
+    df = executions.assign(filled=executions["fill_price"].notna())
+    grouped = df.groupby(list(by))
+    stats = grouped.agg(
+        orders=("filled", "size"),
+        filled=("filled", "sum"),
+        requotes=("requotes", "sum"),
+        rejects=("rejects", "sum"),
+        slippage_mean=("slippage_points", "mean"),
+        slippage_p50=("slippage_points", "median"),
+        slippage_p90=("slippage_points", lambda s: s.quantile(0.9)),
+        slippage_p99=("slippage_points", lambda s: s.quantile(0.99)),
+        latency_p50=("latency_ms", "median"),
+        latency_p90=("latency_ms", lambda s: s.quantile(0.9)),
+        latency_p99=("latency_ms", lambda s: s.quantile(0.99)),
+    )
+    stats.insert(2, "fill_rate", stats["filled"] / stats["orders"])
+    return stats
+
+
+# ------------------ Model ------------------ #
+def _distribution(values) -> dict:
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return {"n": 0, "mean": 0.0, "quantiles": []}
+    return {"n": int(len(values)), "mean": float(values.mean()), "quantiles": np.quantile(values, QUANTILE_LEVELS).tolist()}
+
+
+def fit_slippage_model(executions: pd.DataFrame) -> dict:
+    """Slippage (points, positive = adverse) and latency (ms) distributions per symbol and session."""
+    model = {"fitted_at": datetime.now().isoformat(timespec="seconds"), "quantile_levels": QUANTILE_LEVELS.tolist(), "symbols": {}}
+    if executions.empty:
+        return model
+    for symbol, rows in executions.groupby("symbol"):
+        model["symbols"][symbol] = {
+            "orders": int(len(rows)),
+            "requote_rate": float(rows["requotes"].sum() / len(rows)),
+            "reject_rate": float(rows["rejects"].sum() / len(rows)),
+            "slippage": _distribution(rows["slippage_points"]),
+            "latency_ms": _distribution(rows["latency_ms"]),
+            "sessions": {
+                session: {"slippage": _distribution(s["slippage_points"]), "latency_ms": _distribution(s["latency_ms"])}
+                for session, s in rows.groupby("session")
+            },
+        }
+    return model
+
+
+def export_slippage_model(model: dict = None, path=SLIPPAGE_MODEL_PATH) -> Path:
+    """Write the model (fitted from the journals if not given) as JSON."""
+    model = model if model is not None else fit_slippage_model(load_executions())
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(model, indent=2))
+    os.replace(tmp_path, path)
+    return path
+
+
+class SlippageModel:
+    """
+    Fitted execution costs for backtests. Distributions with fewer than MIN_FILLS fills fall back
+    from session to symbol, and from symbol to zero cost.
+    """
+
+    def __init__(self, model: dict):
+        self.model = model
+        self.levels = np.asarray(model.get("quantile_levels", QUANTILE_LEVELS), dtype=float)
+
+    @classmethod
+    def load(cls, path=SLIPPAGE_MODEL_PATH) -> "SlippageModel":
+        return cls(json.loads(Path(path).read_text()))
+
+    def _distribution(self, symbol: str, session: str = None, key: str = "slippage") -> dict | None:
+        entry = self.model["symbols"].get(symbol)
+        if entry is None:
+            return None
+        if session is not None:
+            dist = entry["sessions"].get(session, {}).get(key)
+            if dist and dist["n"] >= MIN_FILLS:
+                return dist
+        dist = entry[key]
+        return dist if dist["n"] >= MIN_FILLS else None
+
+    def expected(self, symbol: str, session: str = None) -> float:
+        """Mean slippage in points (0 without enough fills)."""
+        dist = self._distribution(symbol, session)
+        return dist["mean"] if dist else 0.0
+
+    def sample(self, symbol: str, size: int, rng=None, session: str = None) -> np.ndarray:
+        """Slippage draws in points from the fitted quantiles (inverse CDF, linear in between)."""
+        dist = self._distribution(symbol, session)
+        if dist is None:
+            return np.zeros(size)
+        rng = rng if rng is not None else np.random.default_rng()
+        return np.interp(rng.random(size), self.levels, dist["quantiles"])
+
+    def latency_ms(self, symbol: str, q: float = 0.5, session: str = None) -> float | None:
+        dist = self._distribution(symbol, session, key="latency_ms")
+        return float(np.interp(q, self.levels, dist["quantiles"])) if dist else None
+
+
+if __name__ == "__main__":
+    pd.set_option("display.width", 200)
+    executions = load_executions()
+    print(execution_stats(executions))
+    print(f"Slippage model written to {export_slippage_model(fit_slippage_model(executions))}")
@@ -0,0 +1,207 @@
+# gates.py
+# Pre-trade filters as a declarative pipeline: each gate declares its cost, the data it needs and
+# the gates it must follow; gates run cheapest first among those whose predecessors have passed,
+# the first rejection stops the pipeline, and data is only fetched when a gate that needs it runs.
+import time
+from datetime import datetime
+from config import TRADE_GATES
+from strategy_engine import generate_signal, get_candles, trend_filter, htf_trend_check, liquidity_sweep, is_inverted_fvg
+from ict_model import ICTModel
+from tick_recorder import TICKS
+
+UNSUITABLE_REGIMES = ("CONSOLIDATION", "RANGING")
+
+# Relative cost of producing each piece of data: lookups ~1, model runs on cached candles ~10,
+# broker round trips ~50. Data passed in up front (or already fetched) costs nothing.
+DATA_COSTS = {"positions": 50, "regime": 1, "df": 50, "signal": 10, "tick": 50, "h1": 50, "h4": 50}
+# Data that is the same for every strategy instance on a symbol; fetched once per cycle and reused
+SHARED_DATA = ("model", "tick", "h1", "h4")
+
+
+class GateContext:
+    """
+    Data for one symbol's pre-trade check. Missing keys are fetched on first access via `providers`.
+    Contexts of several strategies on the same symbol pass one `shared` dict, so SHARED_DATA is
+    fetched once per cycle however many strategies need it.
+    """
+
+    def __init__(self, symbol: str, providers: dict, shared: dict = None, **data):
+        self.symbol = symbol
+        self.providers = providers
+        self.shared = shared if shared is not None else {}
+        self.data = data
+
+    def __getitem__(self, key):
+        if key not in self.data:
+            if key in self.shared:
+                self.data[key] = self.shared[key]
+            else:
+                self.data[key] = self.providers[key](self)
+                if key in SHARED_DATA:
+                    self.shared[key] = self.data[key]
+        return self.data[key]
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    @property
+    def direction(self):
+        return self['signal']['direction']
+
+
+class Gate:
+    """
+    One filter. `check(ctx)` returns None to pass or a rejection message.
+    `cost` is the check's own relative cost; the data in `needs` adds DATA_COSTS until it is loaded.
+    `after` names gates that must pass first, whatever the costs; a `required` gate cannot be disabled.
+    """
+
+    def __init__(self, name: str, check, cost: float, needs=(), after=(), required: bool = False):
+        self.name = name
+        self.check = check
+        self.cost = cost
+        self.needs = tuple(needs)
+        self.after = tuple(after)
+        self.required = required
+        self.runs = 0
+        self.rejections = 0
+        self.seconds = 0.0
+
+
+class GatePipeline:
+    def __init__(self, gates, enabled: dict = TRADE_GATES, name: str = None):
+        self.name = name
+        self.gates = [Gate(g.name, g.check, g.cost, g.needs, g.after, g.required)
+                      for g in gates if g.required or enabled.get(g.name, False)]
+        names = {g.name for g in self.gates}
+        for g in self.gates:
+            missing = [name for name in g.after if name not in names]
+            if missing:
+                raise ValueError(f"gate {g.name} runs after {', '.join(missing)}, which is not enabled")
+
+    @staticmethod
+    def _cost(gate: Gate, ctx: GateContext) -> float:
+        return gate.cost + sum(DATA_COSTS.get(key, 0) for key in gate.needs if key not in ctx.data and key not in ctx.shared)
+
+    def run(self, ctx: GateContext) -> str | None:
+        """
+        Run the cheapest remaining gate whose `after` gates have passed until one rejects; data
+        loaded by a gate makes the gates sharing it cheaper. Returns the name of the rejecting
+        gate, or None if all pass.
+        """
+        remaining = list(self.gates)
+        passed = set()
+        while remaining:
+            ready = [g for g in remaining if passed.issuperset(g.after)]
+            gate = min(ready, key=lambda g: self._cost(g, ctx))  # ties keep declaration order
+            remaining.remove(gate)
+            start = time.perf_counter()
+            try:
+                reason = gate.check(ctx)
+            finally:
+                gate.runs += 1
+                gate.seconds += time.perf_counter() - start
+            if reason:
+                gate.rejections += 1
+                print(f"{datetime.now()} [{ctx.symbol}] → {f'{self.name}: ' if self.name else ''}{reason}")
+                return gate.name
+            passed.add(gate.name)
+        return None
+
+    def stats(self) -> list[dict]:
+        return [{
+            "gate": g.name,
+            "cost": g.cost,
+            "runs": g.runs,
+            "rejections": g.rejections,
+            "reject_rate": g.rejections / g.runs if g.runs else 0.0,
+            "avg_ms": 1000 * g.seconds / g.runs if g.runs else 0.0,
+            "total_s": g.seconds,
+        } for g in self.gates]
+
+    def print_stats(self):
+        print(f"{datetime.now()} → Pre-trade gate stats{f' ({self.name})' if self.name else ''}:")
+        for s in self.stats():
+            print(f"    {s['gate']:<18} runs={s['runs']:<6} rejected={s['rejections']:<6} "
+                  f"({s['reject_rate']:.0%}) avg={s['avg_ms']:.2f} ms total={s['total_s']:.2f} s")
+
+
+# ------------------ Gates ------------------ #
+def _existing_position(ctx):
+    if ctx['positions']:
+        return "Existing position detected — skipping new entries"
+
+
+def _regime(ctx):
+    regime = ctx['regime']
+    if regime in UNSUITABLE_REGIMES:
+        return f"Market regime unsuitable ({regime}) — skipping trade"
+
+
+def _signal(ctx):
+    if not ctx['signal']:
+        return "No signal"
+
+
+def _trend(ctx):
+    if not trend_filter(ctx['df'], ctx.direction):
+        return "Trend filter failed — skipping trade"
+
+
+def _ifvg(ctx):
+    signal = ctx['signal']
+    if signal['type'] == 'FVG' and not is_inverted_fvg(signal, ctx['df']):
+        return "Waiting for IFVG confirmation — skipping trade"
+
+
+def _liquidity_sweep(ctx):
+    if liquidity_sweep(ctx['df'], ctx.symbol) != ctx.direction:
+        return f"Liquidity sweep failed — signal: {ctx.direction} skipped"
+
+
+def _spread(ctx):
+    tick = ctx['tick']
+    ok, max_spread = TICKS.spread_ok(ctx.symbol, tick)
+    if not ok:
+        return f"Spread too high ({tick.ask - tick.bid:.5f} > {max_spread:.5f}) — skipping trade"
+
+
+def _htf(key, label):
+    def check(ctx):
+        if not htf_trend_check(ctx[key], ctx.direction):
+            return f"HTF {label} bias mismatch — signal: {ctx.direction} skipped"
+    return check
+
+
+# "signal" always runs: the gates after it, and evaluate's order, read the signal's direction
+DEFAULT_GATES = (
+    Gate("existing_position", _existing_position, cost=0, needs=("positions",)),
+    Gate("regime", _regime, cost=0, needs=("regime",)),
+    Gate("signal", _signal, cost=0, needs=("df", "signal"), required=True),
+    Gate("ifvg", _ifvg, cost=1, needs=("df", "signal"), after=("signal",)),
+    Gate("trend_filter", _trend, cost=2, needs=("df", "signal"), after=("signal",)),
+    Gate("liquidity_sweep", _liquidity_sweep, cost=2, needs=("df", "signal"), after=("signal",)),
+    Gate("spread", _spread, cost=1, needs=("tick",)),
+    Gate("htf_h1", _htf("h1", "H1"), cost=2, needs=("h1", "signal"), after=("signal",)),
+    Gate("htf_h4", _htf("h4", "H4"), cost=2, needs=("h4", "signal"), after=("signal",)),
+)
+
+
+def _fetch_tick(bot_mt5, symbol: str):
+    """A tick not supplied by the caller; fed to the spread statistics like the loop's own ticks."""
+    tick = bot_mt5.safe_tick(symbol)
+    TICKS.on_tick(symbol, tick)
+    return tick
+
+
+def default_providers(bot_mt5, allow_momentum: bool = True) -> dict:
+    """Lazy data sources for the default gates. "model" is the momentum-enabled ICT run every variant's signal derives from."""
+    return {
+        "model": lambda ctx: ICTModel(window=len(ctx['df'])).signal_at_last(ctx['df'])[1],
+        "signal": lambda ctx: generate_signal(ctx['df'], ctx.symbol, allow_momentum=allow_momentum,
+                                              features=ctx.data.setdefault('features', {}), row=ctx['model']),
+        "h1": lambda ctx: get_candles(bot_mt5, ctx.symbol, n=200, timeframe="H1"),
+        "h4": lambda ctx: get_candles(bot_mt5, ctx.symbol, n=200, timeframe="H4"),
+        "tick": lambda ctx: _fetch_tick(bot_mt5, ctx.symbol),
+        "positions": lambda ctx: bot_mt5.safe_positions_get(ctx.symbol),
+    }
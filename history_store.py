@@ -0,0 +1,496 @@
+# history_store.py
+# Years of third-party history for backtests beyond what the terminal serves. Bulk-ingests
+# HistData-style and MT5-exported CSV files (plain or zipped): the files are streamed in blocks,
+# blocks are parsed in parallel worker processes with explicit dtypes and fixed-width date
+# parsing, timestamps are normalized to BROKER_TIMEZONE (the wall clock MT5 bar times use),
+# duplicates are dropped and gaps reported.
+#
+# Bars go to a columnar store, one directory per symbol, timeframe and year holding one raw file
+# per BAR_DTYPE column; newer bars are appended, older or overlapping ones merged into their year.
+# Ticks go to the tick recorder's day files, so load_ticks and bar_builder read them as recorded.
+#
+#   Ingest: python history_store.py EURUSD DAT_ASCII_EURUSD_M1_2015.zip ... [--format histdata_m1]
+#   Load:   df = load_candles("EURUSD", "M5", "2016-01-01", "2024-01-01")   # get_candles layout
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from config import (BROKER_TIMEZONE, SESSION_TIMEZONE, TIMEFRAME, TICK_DATA_DIR, HISTORY_DATA_DIR, HISTORY_BLOCK_MB,
+                    HISTORY_WORKERS, HISTORY_GAP_MINUTES)
+from market_bus import BAR_DTYPE
+from tick_recorder import RAW_DTYPE
+
+STORE_TIMEFRAME = "M1"
+HISTDATA_TIMEZONE = "Etc/GMT+5"  # HistData timestamps are EST all year (UTC-5, no DST)
+PREFETCH_BLOCKS = 2              # blocks queued per worker ahead of the writer
+
+
+class DumpFormat(NamedTuple):
+    kind: str         # bars or ticks
+    sep: str
+    columns: tuple    # column names in file order
+    tz: str           # timezone of the file's timestamps
+
+
+FORMATS = {
+    # 20240102 170000;1.104270;1.104290;1.104250;1.104290;0
+    "histdata_m1": DumpFormat("bars", ";", ("datetime", "open", "high", "low", "close", "volume"), HISTDATA_TIMEZONE),
+    # 20240102 170014263,1.104250,1.104420,0
+    "histdata_tick": DumpFormat("ticks", ",", ("datetime", "bid", "ask", "volume"), HISTDATA_TIMEZONE),
+    # MT5 terminal exports (tab separated, <DATE> <TIME> header), already in broker time
+    "mt5_m1": DumpFormat("bars", "\t", ("date", "time", "open", "high", "low", "close", "tick_volume", "volume", "spread"),
+                         BROKER_TIMEZONE),
+    "mt5_tick": DumpFormat("ticks", "\t", ("date", "time", "bid", "ask", "last", "volume", "flags"), BROKER_TIMEZONE),
+}
+# Character spans of the fixed-width date/time fields
+DATE_SPANS = {
+    "datetime": {"year": (0, 4), "month": (4, 6), "day": (6, 8), "hour": (9, 11), "minute": (11, 13),
+                 "second": (13, 15), "ms": (15, 18)},
+    "date": {"year": (0, 4), "month": (5, 7), "day": (8, 10)},
+    "time": {"hour": (0, 2), "minute": (3, 5), "second": (6, 8), "ms": (9, 12)},
+}
+
+
+def detect_format(first_line: bytes) -> str:
+    """Format of a dump from its first line."""
+    if first_line.startswith(b"<DATE>"):
+        return "mt5_tick" if b"<BID>" in first_line else "mt5_m1"
+    if first_line.count(b";") == 5:
+        return "histdata_m1"
+    if first_line.count(b",") == 3:
+        return "histdata_tick"
+    raise ValueError(f"Unknown history format: {first_line[:80]!r}")
+
+
+# ------------------ Reading ------------------ #
+def _sources(paths):
+    """(name, binary file) per CSV: plain files as given, ZIP members in name order."""
+    for path in paths:
+        path = Path(path)
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for member in sorted(n for n in archive.namelist() if n.lower().endswith(".csv")):
+                    with archive.open(member) as f:
+                        yield f"{path.name}:{member}", f
+        else:
+            with open(path, "rb") as f:
+                yield path.name, f
+
+
+def _blocks(paths, block_bytes: int):
+    """CSV bytes in blocks ending on a line break; MT5 header lines are dropped."""
+    for _, f in _sources(paths):
+        rest = f.readline()
+        if rest.startswith(b"<"):
+            rest = b""
+        while True:
+            data = f.read(block_bytes)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                rest = data
+                continue
+            rest = data[cut:]
+            yield data[:cut]
+        if rest.strip():
+            yield rest
+
+
+def _first_line(path) -> bytes:
+    for _, f in _sources([path]):
+        return f.readline()
+    raise ValueError(f"No CSV data in {path}")
+
+
+# ------------------ Parsing (worker processes) ------------------ #
+def _epoch_days(year, month, day):
+    """Days since 1970-01-01 of proleptic Gregorian dates (vectorized days-from-civil)."""
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    return era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+
+
+def _parse_fields(values: np.ndarray, spans: dict, want_ms: bool) -> tuple[dict, np.ndarray]:
+    """Integer fields of fixed-width digit strings and a mask of rows that parsed."""
+    width = max(stop for name, (_, stop) in spans.items() if want_ms or name != "ms")
+    digits = values.astype(f"S{width}").view(np.uint8).reshape(-1, width).astype(np.int64) - 48
+    fields, ok = {}, np.ones(len(values), dtype=bool)
+    for name, (start, stop) in spans.items():
+        if name == "ms" and not want_ms:
+            continue
+        part = digits[:, start:stop]
+        ok &= ((part >= 0) & (part <= 9)).all(axis=1)
+        fields[name] = part @ (10 ** np.arange(stop - start - 1, -1, -1))
+    return fields, ok
+
+
+def _wall_ms(frame: pd.DataFrame, ticks: bool) -> tuple[np.ndarray, np.ndarray]:
+    """Milliseconds since the epoch of each row's wall-clock time, and the rows that parsed."""
+    if "datetime" in frame:
+        fields, ok = _parse_fields(frame["datetime"].to_numpy(), DATE_SPANS["datetime"], ticks)
+    else:
+        fields, ok = _parse_fields(frame["date"].to_numpy(), DATE_SPANS["date"], False)
+        clock, ok_time = _parse_fields(frame["time"].to_numpy(), DATE_SPANS["time"], ticks)
+        fields.update(clock)
+        ok &= ok_time
+    ok &= (fields["month"] >= 1) & (fields["month"] <= 12) & (fields["day"] >= 1) & (fields["day"] <= 31)
+    seconds = (_epoch_days(fields["year"], fields["month"], fields["day"]) * 86400
+               + fields["hour"] * 3600 + fields["minute"] * 60 + fields["second"])
+    return seconds * 1000 + fields.get("ms", 0), ok
+
+
+def _to_broker_ms(wall_ms: np.ndarray, source_tz: str, tz: str = BROKER_TIMEZONE) -> np.ndarray:
+    """Wall-clock ms in `source_tz` to wall-clock ms in `tz`; -1 where the source time does not exist."""
+    if source_tz == tz or len(wall_ms) == 0:
+        return wall_ms
+    index = pd.DatetimeIndex(wall_ms * 1_000_000)
+    try:
+        local = index.tz_localize(source_tz, ambiguous="infer", nonexistent="NaT")
+    except Exception:  # block starts or ends inside a repeated hour
+        local = index.tz_localize(source_tz, ambiguous="NaT", nonexistent="NaT")
+    out = local.tz_convert(tz).tz_localize(None).asi8 // 1_000_000
+    return np.where(local.isna(), -1, out)
+
+
+def _parse_block(raw: bytes, fmt: str, source_tz: str) -> tuple[np.ndarray, int]:
+    """One block of CSV lines as BAR_DTYPE (bars) or RAW_DTYPE (ticks) records in broker time, and rows dropped."""
+    spec = FORMATS[fmt]
+    ticks = spec.kind == "ticks"
+    text_columns = ("datetime", "date", "time")
+    frame = pd.read_csv(io.BytesIO(raw), sep=spec.sep, header=None, names=list(spec.columns), engine="c", on_bad_lines="skip",
+                        dtype={c: (object if c in text_columns else np.float64) for c in spec.columns})
+    wall, ok = _wall_ms(frame, ticks)
+    times = _to_broker_ms(np.where(ok, wall, 0), source_tz)
+    ok &= times >= 0
+
+    if ticks:
+        out = np.zeros(len(frame), dtype=RAW_DTYPE)
+        out['time_msc'] = times
+        out['bid'] = frame["bid"].to_numpy()    # MT5 exports leave unchanged prices empty (NaN)
+        out['ask'] = frame["ask"].to_numpy()
+        if "last" in frame:
+            out['last'] = frame["last"].fillna(0).to_numpy()
+            out['flags'] = frame["flags"].fillna(0).to_numpy()
+        out['volume'] = frame["volume"].fillna(0).to_numpy()
+    else:
+        ok &= frame[["open", "high", "low", "close"]].notna().all(axis=1).to_numpy()
+        out = np.zeros(len(frame), dtype=BAR_DTYPE)
+        out['time'] = times // 1000
+        for field in ("open", "high", "low", "close"):
+            out[field] = frame[field].to_numpy()
+        out['tick_volume'] = frame["tick_volume" if "tick_volume" in frame else "volume"].fillna(0).to_numpy()
+        if "spread" in frame:
+            out['spread'] = frame["spread"].fillna(0).to_numpy()
+            out['real_volume'] = frame["volume"].fillna(0).to_numpy()
+    return out[ok], int((~ok).sum())
+
+
+def _ordered_map(pool, fn, items, ahead: int):
+    """pool.map that keeps at most `ahead` tasks in flight, so results stream in order."""
+    pending = []
+    for item in items:
+        pending.append(pool.submit(fn, *item))
+        if len(pending) >= ahead:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
+
+
+# ------------------ Gaps ------------------ #
+def find_gaps(times: np.ndarray, min_seconds: float, tz: str = BROKER_TIMEZONE) -> pd.DataFrame:
+    """
+    Gaps between consecutive timestamps (epoch seconds, broker wall clock) longer than min_seconds,
+    except the weekend close (Friday evening to Sunday evening New York time).
+    """
+    times = np.asarray(times, dtype=np.int64)
+    at = np.flatnonzero(np.diff(times) > min_seconds)
+    start = pd.to_datetime(times[at], unit="s")
+    end = pd.to_datetime(times[at + 1], unit="s")
+    local_start = start.tz_localize(tz, ambiguous="NaT", nonexistent="shift_forward").tz_convert(SESSION_TIMEZONE)
+    local_end = end.tz_localize(tz, ambiguous="NaT", nonexistent="shift_forward").tz_convert(SESSION_TIMEZONE)
+    weekend = (np.isin(local_start.weekday, (4, 5)) & np.isin(local_end.weekday, (6, 0))
+               & ((end - start) < pd.Timedelta(days=3)))
+    gaps = pd.DataFrame({"start": start, "end": end, "minutes": (times[at + 1] - times[at]) / 60})
+    return gaps[~weekend].reset_index(drop=True)
+
+
+# ------------------ Bar Store ------------------ #
+class HistoryStore:
+    """
+    Columnar bar store: <directory>/<SYMBOL>/<timeframe>/<year>/<column> raw little-endian files.
+    A crash between column appends leaves columns of different lengths: readers use the shortest,
+    and the next append first truncates every column to it, so bars stay aligned across columns.
+    """
+
+    def __init__(self, directory=HISTORY_DATA_DIR):
+        self.directory = Path(directory)
+
+    def _dir(self, symbol: str, timeframe: str, year=None) -> Path:
+        path = self.directory / symbol.upper() / timeframe
+        return path if year is None else path / str(year)
+
+    def years(self, symbol: str, timeframe: str = STORE_TIMEFRAME) -> list[int]:
+        path = self._dir(symbol, timeframe)
+        return sorted(int(p.name) for p in path.iterdir() if p.name.isdigit()) if path.exists() else []
+
+    def _read_year(self, path: Path) -> np.ndarray:
+        columns = {name: np.fromfile(path / name, dtype=BAR_DTYPE[name]) if (path / name).exists() else np.zeros(0)
+                   for name in BAR_DTYPE.names}
+        n = min(len(c) for c in columns.values())
+        out = np.empty(n, dtype=BAR_DTYPE)
+        for name, values in columns.items():
+            out[name] = values[:n]
+        return out
+
+    def _align_columns(self, path: Path) -> int:
+        """Truncate every column file to the bars all of them hold; returns that count."""
+        sizes = {name: (path / name).stat().st_size if (path / name).exists() else 0 for name in BAR_DTYPE.names}
+        n = min(size // BAR_DTYPE[name].itemsize for name, size in sizes.items())
+        for name, size in sizes.items():
+            if size != n * BAR_DTYPE[name].itemsize:
+                os.truncate(path / name, n * BAR_DTYPE[name].itemsize)
+        return n
+
+    def _last_time(self, path: Path, n: int):
+        if n == 0:
+            return None
+        itemsize = BAR_DTYPE['time'].itemsize
+        return int(np.fromfile(path / "time", dtype=BAR_DTYPE['time'], count=1, offset=(n - 1) * itemsize)[0])
+
+    def read(self, symbol: str, timeframe: str = STORE_TIMEFRAME, start=None, end=None) -> np.ndarray:
+        """Stored bars with start <= time <= end (dates or timestamps, broker time), oldest first."""
+        lo = pd.Timestamp(start).year if start is not None else None
+        hi = pd.Timestamp(end).year if end is not None else None
+        parts = [self._read_year(self._dir(symbol, timeframe, year)) for year in self.years(symbol, timeframe)
+                 if (lo is None or year >= lo) and (hi is None or year <= hi)]
+        bars = np.concatenate(parts) if parts else np.zeros(0, dtype=BAR_DTYPE)
+        if start is not None:
+            bars = bars[bars['time'] >= pd.Timestamp(start).value // 1_000_000_000]
+        if end is not None:
+            bars = bars[bars['time'] <= pd.Timestamp(end).value // 1_000_000_000]
+        return bars
+
+    def write(self, symbol: str, timeframe: str, bars: np.ndarray) -> int:
+        """
+        Store BAR_DTYPE bars. Bars newer than a year's last bar are appended; others are merged into
+        the year, a stored bar being replaced by a new one with the same time. Returns bars replaced.
+        """
+        replaced = 0
+        years = pd.to_datetime(bars['time'], unit="s").year.to_numpy()
+        for year in np.unique(years):
+            chunk = bars[years == year]
+            path = self._dir(symbol, timeframe, year)
+            path.mkdir(parents=True, exist_ok=True)
+            last = self._last_time(path, self._align_columns(path))
+            if (last is None or chunk['time'][0] > last) and (np.diff(chunk['time']) > 0).all():
+                for name in BAR_DTYPE.names:
+                    with open(path / name, "ab") as f:
+                        np.ascontiguousarray(chunk[name]).tofile(f)
+                continue
+            merged = np.concatenate([self._read_year(path), chunk])
+            order = np.argsort(merged['time'], kind="stable")
+            merged = merged[order]
+            keep = np.r_[merged['time'][1:] != merged['time'][:-1], True]  # the later (newer) copy wins
+            replaced += int((~keep).sum())
+            merged = merged[keep]
+            for name in BAR_DTYPE.names:
+                tmp = path / f"{name}.tmp"
+                np.ascontiguousarray(merged[name]).tofile(tmp)
+                os.replace(tmp, path / name)
+        return replaced
+
+
+def resample_bars(bars: np.ndarray, seconds: int) -> np.ndarray:
+    """Aggregate time-ordered BAR_DTYPE bars into `seconds` bars (spread: lowest, volumes summed)."""
+    if len(bars) == 0:
+        return bars
+    keys = bars['time'] // seconds
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(bars)]
+    out = np.zeros(len(starts), dtype=BAR_DTYPE)
+    out['time'] = keys[starts] * seconds
+    out['open'] = bars['open'][starts]
+    out['high'] = np.maximum.reduceat(bars['high'], starts)
+    out['low'] = np.minimum.reduceat(bars['low'], starts)
+    out['close'] = bars['close'][ends - 1]
+    out['tick_volume'] = np.add.reduceat(bars['tick_volume'], starts)
+    out['spread'] = np.minimum.reduceat(bars['spread'], starts)
+    out['real_volume'] = np.add.reduceat(bars['real_volume'], starts)
+    return out
+
+
+def load_rates(symbol: str, timeframe: str = TIMEFRAME, start=None, end=None, directory=HISTORY_DATA_DIR) -> np.ndarray:
+    """Stored bars of `timeframe`, or M1 bars aggregated to it (any bar_builder time spec, e.g. M5, H4, D1)."""
+    from bar_builder import parse_bar_spec
+
+    store = HistoryStore(directory)
+    if store.years(symbol, timeframe):
+        return store.read(symbol, timeframe, start, end)
+    spec = parse_bar_spec(timeframe)
+    if spec.kind != "time":
+        raise ValueError(f"{timeframe} is not a time-based timeframe")
+    return resample_bars(store.read(symbol, STORE_TIMEFRAME, start, end), spec.size)
+
+
+def load_candles(symbol: str, timeframe: str = TIMEFRAME, start=None, end=None, n: int = None,
+                 directory=HISTORY_DATA_DIR) -> pd.DataFrame:
+    """Stored history in the get_candles layout (the last n bars when n is given), for backtests."""
+    from strategy_engine import rates_to_candles
+
+    rates = load_rates(symbol, timeframe, start, end, directory)
+    return rates_to_candles(rates[-n:] if n else rates)
+
+
+# ------------------ Ingestion ------------------ #
+def _dedupe_ticks(ticks: np.ndarray, previous) -> tuple[np.ndarray, int]:
+    """Forward-fills missing bid/ask and drops ticks repeating the previous one exactly -> (ticks, duplicates)."""
+    for field in ('bid', 'ask'):
+        filled = pd.Series(ticks[field]).ffill().to_numpy()
+        if previous is not None:
+            filled = np.where(np.isnan(filled), previous[field], filled)
+        ticks[field] = filled
+    ticks = ticks[~(np.isnan(ticks['bid']) | np.isnan(ticks['ask']))]
+    if len(ticks) == 0:
+        return ticks, 0
+    same = np.r_[previous is not None and ticks[0] == previous, ticks[1:] == ticks[:-1]]
+    return ticks[~same], int(same.sum())
+
+
+def _dedupe_bars(bars: np.ndarray, previous) -> tuple[np.ndarray, int]:
+    """Drops bars repeating the previous bar's time (the later copy wins within a block) -> (bars, duplicates)."""
+    if len(bars) == 0:
+        return bars, 0
+    keep = np.r_[bars['time'][1:] != bars['time'][:-1], True]
+    keep[0] &= previous is None or bars['time'][0] != previous
+    return bars[keep], int((~keep).sum())
+
+
+class TickDays:
+    """Appends ingested ticks to the tick recorder's day files, skipping ticks a file already holds."""
+
+    def __init__(self, symbol: str, point: float, directory=TICK_DATA_DIR):
+        self.symbol = symbol
+        self.point = point
+        self.directory = directory
+        self.writers = {}
+        self.stored_until = {}  # day -> last tick time_msc on disk before this ingest
+
+    def write(self, ticks: np.ndarray) -> tuple[int, int]:
+        """-> (ticks written, ticks skipped)."""
+        from tick_recorder import TickFileWriter, tick_file_path
+
+        written = skipped = 0
+        days = ticks['time_msc'] // 86_400_000
+        for day in np.unique(days):
+            chunk = ticks[days == day]
+            if day not in self.writers:
+                writer = self.writers[day] = TickFileWriter(
+                    tick_file_path(self.symbol, pd.Timestamp(int(day), unit="D"), self.directory), self.point)
+                self.stored_until[day] = writer._last[0] if writer._last is not None else None
+            if self.stored_until[day] is not None:
+                fresh = chunk['time_msc'] > self.stored_until[day]
+                skipped += int((~fresh).sum())
+                chunk = chunk[fresh]
+            self.writers[day].write(chunk)
+            written += len(chunk)
+        return written, skipped
+
+
+class IngestReport(NamedTuple):
+    symbol: str
+    kind: str          # bars or ticks
+    rows: int          # rows stored
+    invalid: int       # rows that did not parse or whose local time does not exist
+    duplicates: int    # repeated bar times / identical consecutive ticks, dropped
+    overlap: int       # stored bars replaced by ingested ones / ticks already on disk, skipped
+    first: pd.Timestamp
+    last: pd.Timestamp
+    gaps: pd.DataFrame
+    seconds: float
+
+
+def ingest(symbol: str, paths, fmt: str = None, source_tz: str = None, directory=HISTORY_DATA_DIR,
+           tick_directory=TICK_DATA_DIR, point: float = None, workers: int = HISTORY_WORKERS,
+           block_mb: float = HISTORY_BLOCK_MB, gap_minutes: float = HISTORY_GAP_MINUTES) -> IngestReport:
+    """
+    Ingest CSV/ZIP dumps of one symbol, given in time order (e.g. one file per year). The format is
+    detected from the first line unless given; source_tz overrides the format's timezone. Blocks
+    are parsed by `workers` processes while this process writes them in order, so memory stays at
+    a few blocks per worker however large the dumps are.
+    """
+    from market_engine import symbol_point
+
+    started = datetime.now()
+    paths = [Path(p) for p in ([paths] if isinstance(paths, (str, Path)) else paths)]
+    fmt = fmt or detect_format(_first_line(paths[0]))
+    kind = FORMATS[fmt].kind
+    source_tz = source_tz or FORMATS[fmt].tz
+    workers = workers or os.cpu_count()
+    store = HistoryStore(directory)
+    ticks_out = TickDays(symbol, point or symbol_point(symbol), tick_directory) if kind == "ticks" else None
+
+    rows = invalid = duplicates = overlap = 0
+    first = last = previous = None
+    gaps = []
+    blocks = ((block, fmt, source_tz) for block in _blocks(paths, int(block_mb * 1024 * 1024)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for records, dropped in _ordered_map(pool, _parse_block, blocks, workers * PREFETCH_BLOCKS):
+            invalid += dropped
+            if kind == "ticks":
+                records, dups = _dedupe_ticks(records, previous)
+            else:
+                records, dups = _dedupe_bars(records, previous)
+            duplicates += dups
+            if len(records) == 0:
+                continue
+
+            times = records['time_msc'] // 1000 if kind == "ticks" else records['time']
+            gaps.append(find_gaps(times if last is None else np.r_[last, times], gap_minutes * 60))
+            if kind == "ticks":
+                written, skipped = ticks_out.write(records)
+                previous = records[-1].copy()
+            else:
+                skipped = store.write(symbol, STORE_TIMEFRAME, records)
+                written = len(records) - skipped  # a replaced bar was already stored
+                previous = int(times[-1])
+            rows += written
+            overlap += skipped
+            first = int(times[0]) if first is None else first
+            last = int(times[-1])
+
+    report = IngestReport(
+        symbol.upper(), kind, rows, invalid, duplicates, overlap,
+        pd.to_datetime(first, unit="s") if first is not None else pd.NaT,
+        pd.to_datetime(last, unit="s") if last is not None else pd.NaT,
+        pd.concat(gaps, ignore_index=True) if gaps else find_gaps(np.zeros(0), 0),
+        (datetime.now() - started).total_seconds(),
+    )
+    print(f"{datetime.now()} [{report.symbol}] → Ingested {report.rows:,} {kind} ({fmt}) {report.first} .. {report.last} "
+          f"in {report.seconds:.1f}s — {report.invalid} invalid, {report.duplicates} duplicates, "
+          f"{report.overlap} {'replaced' if kind == 'bars' else 'already stored'}, {len(report.gaps)} gaps > {gap_minutes:g} min")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ingest HistData / MT5 CSV or ZIP history dumps")
+    parser.add_argument("symbol")
+    parser.add_argument("paths", nargs="+", help="files in time order")
+    parser.add_argument("--format", choices=sorted(FORMATS), help="detected from the first line by default")
+    parser.add_argument("--source-tz", help="timezone of the file timestamps (default: per format)")
+    parser.add_argument("--workers", type=int, default=HISTORY_WORKERS)
+    args = parser.parse_args()
+    result = ingest(args.symbol, args.paths, args.format, args.source_tz, workers=args.workers)
+    if len(result.gaps):
+        pd.set_option("display.width", 200)
+        print(result.gaps.sort_values("minutes", ascending=False).head(20))
@@ -0,0 +1,94 @@
+# import_budget.py
+# Measures the cold import time of the offline modules and checks that none of them
+# pulls in a live-only dependency. Run: python import_budget.py
+import subprocess
+import sys
+
+# Cold-import budget per module (ms, cumulative, fresh interpreter, best of IMPORT_RUNS).
+# pandas alone accounts for most of it; anything above is our own start-up cost.
+IMPORT_BUDGET_MS = {
+    "config": 5,
+    "sessions": 600,
+    "state_store": 50,
+    "memory_diagnostics": 50,
+    "profiler": 50,
+    "market_structure": 600,
+    "ict_model": 600,
+    "tick_recorder": 600,
+    "bar_builder": 600,
+    "session_analytics": 600,
+    "history_store": 600,
+    "regime_thresholds": 600,
+    "gates": 600,
+    "strategies": 600,
+    "strategy_engine": 600,
+    "market_engine": 600,
+    "risk_manager": 600,
+    "equity_watchdog": 600,
+    "analytics": 600,
+    "backtest": 600,
+    "backtest_cache": 600,
+    "loadtest": 600,
+    "execution_quality": 600,
+    "decision_journal": 600,
+}
+
+IMPORT_RUNS = 5  # the minimum filters out disk-cache and scheduler noise of single runs
+
+# Only the broker boundary (mt5.py, execution.py, bot.py) and alert delivery may load these.
+LIVE_ONLY_MODULES = ("MetaTrader5", "ta", "cryptography", "dotenv", "smtplib")
+
+
+def measure_import(module: str):
+    """Return (cumulative ms, set of loaded top-level packages) for a cold `import module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise ImportError(proc.stderr.strip().splitlines()[-1])
+
+    loaded = set()
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        loaded.add(name.strip().split(".")[0])
+        if name.strip() == module:
+            total_us = int(cumulative)
+    return total_us / 1000, loaded
+
+
+def best_import(module: str, runs: int = IMPORT_RUNS):
+    """Fastest of `runs` cold imports (ms) and the packages loaded by any of them."""
+    times, loaded = [], set()
+    for _ in range(runs):
+        elapsed, packages = measure_import(module)
+        times.append(elapsed)
+        loaded |= packages
+    return min(times), loaded
+
+
+def check_budgets(budgets=IMPORT_BUDGET_MS, runs: int = IMPORT_RUNS) -> bool:
+    ok = True
+    for module, budget in budgets.items():
+        try:
+            elapsed, loaded = best_import(module, runs)
+        except ImportError as e:
+            print(f"FAIL  {module:<16} import failed: {e}")
+            ok = False
+            continue
+
+        leaked = sorted(set(LIVE_ONLY_MODULES) & loaded)
+        status = "OK" if elapsed <= budget and not leaked else "FAIL"
+        ok &= status == "OK"
+        print(f"{status:<5} {module:<16} {elapsed:8.1f} ms (budget {budget} ms)"
+              + (f"  loads live-only: {', '.join(leaked)}" if leaked else ""))
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check_budgets() else 1)
@@ -0,0 +1,444 @@
+# loadtest.py
+# End-to-end load and soak test: the real bot.run() loop against a local simulated MT5 terminal
+# (configurable latency, error rate and synthetic price streams) on a virtual clock, so hours of
+# trading run in minutes. Reports cycle-time distribution, throughput, memory growth and missed
+# bars per universe size; `python loadtest.py` appends the scaling curve to LOADTEST_REPORT_PATH.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import namedtuple
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import numpy as np
+from config import (CHECK_INTERVAL, OFF_SESSION_INTERVAL, TIMEFRAME, LOADTEST_SYMBOL_COUNTS, LOADTEST_HOURS,
+                    LOADTEST_LATENCY_MS, LOADTEST_ERROR_RATE, LOADTEST_REPORT_PATH)
+from sessions import SessionScheduler, in_kill_zone, next_kill_zone
+from memory_diagnostics import current_rss_mb
+
+TIMEFRAME_SECONDS = {"M1": 60, "M5": 300, "M15": 900, "M30": 1800, "H1": 3600, "H4": 14400, "D1": 86400}
+DEFAULT_START = datetime(2026, 1, 5, tzinfo=timezone.utc)  # a Monday; runs start at its first kill zone
+HISTORY_BARS = 1000      # bars generated before the start for each series
+WARMUP_FRACTION = 0.1    # share of cycles ignored when fitting memory growth
+
+# Real symbols first (with their own point sizes), then synthetic ones
+SIM_SYMBOLS = {"EURUSD": (1.08, 0.00001), "GBPUSD": (1.27, 0.00001), "USDJPY": (148.0, 0.001), "XAUUSD": (2050.0, 0.01)}
+SIM_SPREAD_POINTS = 12
+SIM_BAR_VOLATILITY = 0.0008  # log-return standard deviation of an M5 bar
+SIM_TICK_VALUE = 1e-6        # account currency per point per lot; tiny so P/L never ends a soak
+
+Tick = namedtuple("Tick", "time bid ask last volume time_msc flags volume_real")
+SymbolInfo = namedtuple("SymbolInfo", "name point digits spread trade_tick_value trade_contract_size volume_min volume_step "
+                                     "filling_mode trade_exemode")
+AccountInfo = namedtuple("AccountInfo", "login balance equity profit margin_free currency")
+Position = namedtuple("Position", "ticket symbol type volume price_open price_current sl tp profit magic comment time")
+Deal = namedtuple("Deal", "ticket order position_id symbol type entry volume price profit magic time")
+OrderSendResult = namedtuple("OrderSendResult", "retcode deal order volume price bid ask comment request_id")
+RATES_DTYPE = np.dtype([("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"),
+                        ("tick_volume", "<u8"), ("spread", "<i4"), ("real_volume", "<u8")])
+
+
+def universe(n: int) -> list:
+    """n symbols: the configured majors first, then SIM0001, SIM0002, ..."""
+    names = list(SIM_SYMBOLS)[:n]
+    return names + [f"SIM{i:04d}" for i in range(1, n - len(names) + 1)]
+
+
+# ------------------ Virtual Clock ------------------ #
+class VirtualClock:
+    """UTC time that advances with sleeps and simulated broker latency, plus the real time spent computing."""
+
+    def __init__(self, start: datetime):
+        self.start = start
+        self.offset = 0.0
+        self._t0 = time.perf_counter()
+
+    def seconds(self) -> float:
+        """Virtual seconds since start."""
+        return self.offset + time.perf_counter() - self._t0
+
+    def timestamp(self) -> float:
+        return self.start.timestamp() + self.seconds()
+
+    def now(self) -> datetime:
+        return self.start + timedelta(seconds=self.seconds())
+
+    def sleep(self, seconds: float):
+        self.offset += max(0.0, seconds)
+
+
+# ------------------ Simulated MT5 ------------------ #
+class _Series:
+    """Random-walk OHLC bars of one symbol and timeframe, indexed by bar number (open time // period)."""
+
+    def __init__(self, rng, base: float, period: int, first: int):
+        self.rng = rng
+        self.period = period
+        self.sigma = SIM_BAR_VOLATILITY * (period / 300) ** 0.5
+        self.first = first
+        self.close = np.array([base])
+        self.bars = np.zeros(0, dtype=RATES_DTYPE)
+
+    def _extend(self, last: int):
+        n = last - self.first + 1 - len(self.bars)
+        closes = self.close[-1] * np.exp(np.cumsum(self.rng.normal(0, self.sigma, n)))
+        opens = np.concatenate(([self.close[-1]], closes[:-1]))
+        wick = np.abs(self.rng.normal(0, self.sigma / 2, (2, n))) * closes
+        new = np.zeros(n, dtype=RATES_DTYPE)
+        new["time"] = (self.first + len(self.bars) + np.arange(n)) * self.period
+        new["open"], new["close"] = opens, closes
+        new["high"] = np.maximum(opens, closes) + wick[0]
+        new["low"] = np.minimum(opens, closes) - wick[1]
+        new["tick_volume"] = self.rng.integers(50, 500, n)
+        new["spread"] = SIM_SPREAD_POINTS
+        self.bars = np.concatenate((self.bars, new))
+        self.close = closes[-1:]
+
+    def rows(self, lo: int, hi: int) -> np.ndarray:
+        """Bars lo..hi inclusive (bar numbers)."""
+        if hi - self.first >= len(self.bars):
+            self._extend(hi + 64)
+        return self.bars[max(lo - self.first, 0):hi - self.first + 1]
+
+
+class SimulatedMT5:
+    """
+    Stand-in for the MetaTrader5 package, installed in sys.modules before mt5.py is imported.
+    Every call costs a lognormal latency on the virtual clock and fails (returns None) with
+    probability `error_rate`. Orders fill at the current price; positions close at SL/TP.
+    """
+    ORDER_TYPE_BUY, ORDER_TYPE_SELL = 0, 1
+    TRADE_ACTION_DEAL, TRADE_ACTION_SLTP = 1, 6
+    ORDER_TIME_GTC = 0
+    ORDER_FILLING_FOK, ORDER_FILLING_IOC, ORDER_FILLING_RETURN = 0, 1, 2
+    TRADE_RETCODE_REQUOTE, TRADE_RETCODE_DONE, TRADE_RETCODE_INVALID = 10004, 10009, 10013
+    TRADE_RETCODE_INVALID_VOLUME, TRADE_RETCODE_INVALID_STOPS, TRADE_RETCODE_TRADE_DISABLED = 10014, 10016, 10017
+    TRADE_RETCODE_MARKET_CLOSED, TRADE_RETCODE_NO_MONEY, TRADE_RETCODE_PRICE_CHANGED = 10018, 10019, 10020
+    TRADE_RETCODE_PRICE_OFF, TRADE_RETCODE_INVALID_FILL = 10021, 10030
+    SYMBOL_TRADE_EXECUTION_MARKET = 2
+    DEAL_ENTRY_IN, DEAL_ENTRY_OUT = 0, 1
+    # Timeframe constants are the bar period in seconds
+    TIMEFRAME_M1, TIMEFRAME_M5, TIMEFRAME_M15, TIMEFRAME_M30 = 60, 300, 900, 1800
+    TIMEFRAME_H1, TIMEFRAME_H4, TIMEFRAME_D1 = 3600, 14400, 86400
+
+    def __init__(self, clock: VirtualClock, symbols, latency_ms=LOADTEST_LATENCY_MS, error_rate=LOADTEST_ERROR_RATE,
+                 seed=0, balance=100_000.0, entry_timeframe=TIMEFRAME):
+        self.clock = clock
+        self.symbols = {s: SIM_SYMBOLS.get(s, (1.0, 0.00001)) for s in symbols}
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.balance = balance
+        self.entry_period = TIMEFRAME_SECONDS[entry_timeframe]
+        self.series = {}
+        self.positions = {}
+        self.deals = {}
+        self.next_ticket = 1
+        self.calls = 0
+        self.errors = 0
+        self.orders = 0
+        self.last_closed_bar = {}
+        self.missed_bars = 0
+        self.seen_bars = 0
+
+    def install(self):
+        sys.modules["MetaTrader5"] = self
+
+    # ---- call cost ----
+    def _call(self) -> bool:
+        """Charge one round trip to the virtual clock; False if this call fails."""
+        self.calls += 1
+        self.clock.sleep(self.latency * self.rng.lognormal(0.0, 0.5))
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return False
+        return True
+
+    def _bars(self, symbol: str, period: int) -> _Series:
+        series = self.series.get((symbol, period))
+        if series is None:
+            base, _ = self.symbols[symbol]
+            first = int(self.clock.timestamp()) // period - HISTORY_BARS
+            rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), period])
+            series = self.series[(symbol, period)] = _Series(rng, base, period, first)
+        return series
+
+    def _price(self, symbol: str) -> float:
+        bar = int(self.clock.timestamp()) // self.entry_period
+        return float(self._bars(symbol, self.entry_period).rows(bar, bar)["close"][0])
+
+    def _track_bars(self, symbol: str, last_closed: int):
+        """Count entry bars that closed and were superseded before the bot fetched the symbol."""
+        previous = self.last_closed_bar.get(symbol)
+        self.last_closed_bar[symbol] = last_closed
+        if previous is None or last_closed <= previous:
+            return
+        self.seen_bars += 1
+        for bar in range(previous + 1, last_closed):
+            if in_kill_zone(datetime.fromtimestamp((bar + 1) * self.entry_period, tz=timezone.utc)):
+                self.missed_bars += 1
+
+    # ---- terminal ----
+    def initialize(self, *args, **kwargs):
+        return True
+
+    def login(self, *args, **kwargs):
+        return True
+
+    def last_error(self):
+        return (1, "Success")
+
+    def shutdown(self):
+        return None
+
+    # ---- market data ----
+    def symbol_info(self, symbol):
+        if not self._call() or symbol not in self.symbols:
+            return None
+        _, point = self.symbols[symbol]
+        digits = round(-np.log10(point))
+        return SymbolInfo(symbol, point, digits, SIM_SPREAD_POINTS, SIM_TICK_VALUE, 100_000, 0.01, 0.01, 3, self.SYMBOL_TRADE_EXECUTION_MARKET)
+
+    def symbol_info_tick(self, symbol):
+        if not self._call() or symbol not in self.symbols:
+            return None
+        _, point = self.symbols[symbol]
+        bid = self._price(symbol)
+        now = self.clock.timestamp()
+        return Tick(int(now), bid, bid + SIM_SPREAD_POINTS * point, bid, 1, int(now * 1000), 6, 1.0)
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        if not self._call() or symbol not in self.symbols:
+            return None
+        current = int(self.clock.timestamp()) // timeframe - start_pos
+        if timeframe == self.entry_period and start_pos == 0:
+            self._track_bars(symbol, current - 1)
+        return self._bars(symbol, timeframe).rows(current - count + 1, current).copy()
+
+    # ---- account and positions ----
+    def _settle(self):
+        """Close positions whose SL or TP has been touched by the current price."""
+        for ticket, pos in list(self.positions.items()):
+            price = self._price(pos["symbol"])
+            buy = pos["type"] == self.ORDER_TYPE_BUY
+            hit_sl = pos["sl"] and (price <= pos["sl"] if buy else price >= pos["sl"])
+            hit_tp = pos["tp"] and (price >= pos["tp"] if buy else price <= pos["tp"])
+            if hit_sl or hit_tp:
+                self.balance += self._profit(pos, price)
+                del self.positions[ticket]
+
+    def _profit(self, pos: dict, price: float) -> float:
+        _, point = self.symbols[pos["symbol"]]
+        direction = 1 if pos["type"] == self.ORDER_TYPE_BUY else -1
+        return direction * (price - pos["price_open"]) / point * SIM_TICK_VALUE * pos["volume"]
+
+    def _position(self, pos: dict) -> Position:
+        price = self._price(pos["symbol"])
+        return Position(pos["ticket"], pos["symbol"], pos["type"], pos["volume"], pos["price_open"], price,
+                        pos["sl"], pos["tp"], self._profit(pos, price), pos["magic"], pos["comment"], pos["time"])
+
+    def account_info(self):
+        if not self._call():
+            return None
+        self._settle()
+        profit = sum(self._profit(p, self._price(p["symbol"])) for p in self.positions.values())
+        return AccountInfo(1, self.balance, self.balance + profit, profit, self.balance + profit, "USD")
+
+    def positions_get(self, symbol=None, ticket=None):
+        if not self._call():
+            return None
+        self._settle()
+        return tuple(self._position(p) for p in self.positions.values()
+                     if (symbol is None or p["symbol"] == symbol) and (ticket is None or p["ticket"] == ticket))
+
+    def history_deals_get(self, *args, ticket=None, **kwargs):
+        if not self._call():
+            return None
+        return (self.deals[ticket],) if ticket in self.deals else ()
+
+    # ---- trading ----
+    def order_send(self, request):
+        if not self._call():
+            return None
+        symbol = request["symbol"]
+        price = self._price(symbol)
+        if request.get("type") == self.ORDER_TYPE_BUY:
+            price += SIM_SPREAD_POINTS * self.symbols[symbol][1]  # buys fill at the ask
+        ticket = request.get("position")
+        if request["action"] == self.TRADE_ACTION_SLTP:
+            pos = self.positions.get(ticket)
+            if pos:
+                pos["sl"], pos["tp"] = request.get("sl", pos["sl"]), request.get("tp", pos["tp"])
+        elif ticket:  # close (part of) a position
+            pos = self.positions.get(ticket)
+            if pos:
+                volume = min(request["volume"], pos["volume"])
+                self.balance += self._profit({**pos, "volume": volume}, price)
+                pos["volume"] = round(pos["volume"] - volume, 2)
+                if pos["volume"] <= 0:
+                    del self.positions[ticket]
+        else:
+            ticket = self.next_ticket
+            self.next_ticket += 1
+            self.orders += 1
+            self.positions[ticket] = {
+                "ticket": ticket, "symbol": symbol, "type": request["type"], "volume": request["volume"],
+                "price_open": price, "sl": request.get("sl", 0.0), "tp": request.get("tp", 0.0),
+                "magic": request.get("magic", 0), "comment": request.get("comment", ""), "time": int(self.clock.timestamp()),
+            }
+        deal = self.next_ticket
+        self.next_ticket += 1
+        self.deals[deal] = Deal(deal, deal, ticket, symbol, request.get("type", 0), self.DEAL_ENTRY_OUT if request.get("position") else self.DEAL_ENTRY_IN,
+                                request.get("volume", 0.0), price, 0.0, request.get("magic", 0), int(self.clock.timestamp()))
+        return OrderSendResult(self.TRADE_RETCODE_DONE, deal, ticket, request.get("volume", 0.0), price, price, price, "Done", 0)
+
+
+# ------------------ Measurement ------------------ #
+class LoadScheduler(SessionScheduler):
+    """SessionScheduler on the virtual clock that records each cycle's duration, kind and RSS."""
+
+    def __init__(self, clock: VirtualClock, check_interval=CHECK_INTERVAL, off_session_interval=OFF_SESSION_INTERVAL):
+        super().__init__(check_interval, off_session_interval, clock=clock.now, sleep=clock.sleep)
+        self.virtual = clock
+        self.cycles = []  # (virtual seconds at start, virtual duration, real duration, in session, RSS MB)
+        self._mark()
+
+    def _mark(self):
+        self._start = (self.virtual.seconds(), time.perf_counter(), self.in_session())
+
+    def wait(self):
+        start, real_start, in_session = self._start
+        self.cycles.append((start, self.virtual.seconds() - start, time.perf_counter() - real_start, in_session, current_rss_mb()))
+        super().wait()
+        self._mark()
+
+
+def summarize(n_symbols: int, scheduler: LoadScheduler, sim: SimulatedMT5, hours: float, wall_seconds: float) -> dict:
+    cycles = np.array([c[:4] for c in scheduler.cycles], dtype=float).reshape(-1, 4)
+    rss = np.array([c[4] if c[4] is not None else np.nan for c in scheduler.cycles], dtype=float)
+    session = cycles[:, 3] == 1
+    durations = cycles[session, 1]
+    q = np.percentile(durations, [50, 90, 99]) if len(durations) else [np.nan] * 3
+
+    growth = np.nan
+    warm = int(len(rss) * WARMUP_FRACTION)
+    if len(rss) - warm >= 3 and np.isfinite(rss[warm:]).all():
+        growth = float(np.polyfit(cycles[warm:, 0] / 3600, rss[warm:], 1)[0])
+
+    return {
+        "symbols": n_symbols,
+        "hours": round(scheduler.virtual.seconds() / 3600, 2),
+        "completed": scheduler.virtual.seconds() >= hours * 3600,
+        "cycles": len(cycles),
+        "session_cycles": int(session.sum()),
+        "cycle_p50_s": float(q[0]),
+        "cycle_p90_s": float(q[1]),
+        "cycle_p99_s": float(q[2]),
+        "cycle_max_s": float(durations.max()) if len(durations) else np.nan,
+        "over_check_interval": int((durations > scheduler.check_interval).sum()),
+        "over_bar_period": int((durations > sim.entry_period).sum()),
+        "compute_share": float(cycles[session, 2].sum() / durations.sum()) if len(durations) else np.nan,
+        "symbols_per_s": float(n_symbols * len(durations) / durations.sum()) if len(durations) else np.nan,
+        "missed_bars": sim.missed_bars,
+        "seen_bars": sim.seen_bars,
+        "rss_start_mb": float(rss[0]) if len(rss) else np.nan,
+        "rss_end_mb": float(rss[-1]) if len(rss) else np.nan,
+        "rss_peak_mb": float(np.nanmax(rss)) if len(rss) else np.nan,
+        "rss_growth_mb_per_h": growth,
+        "broker_calls": sim.calls,
+        "broker_errors": sim.errors,
+        "orders": sim.orders,
+        "wall_s": round(wall_seconds, 1),
+    }
+
+
+# ------------------ Runs ------------------ #
+def run_soak(n_symbols: int, hours=LOADTEST_HOURS, latency_ms=LOADTEST_LATENCY_MS, error_rate=LOADTEST_ERROR_RATE,
+             seed=0, start: datetime = None, workdir=None, quiet=True) -> dict:
+    """
+    Run bot.run() for `hours` of virtual time over n_symbols simulated symbols and return the summary.
+    Installs the simulated terminal in this process, so run each soak in a fresh interpreter
+    (scaling_curve does). Logs and snapshots go to `workdir` (a new temp dir by default).
+    """
+    os.chdir(workdir or tempfile.mkdtemp(prefix="loadtest-"))
+    start = start or next_kill_zone(DEFAULT_START)[1]
+    symbols = universe(n_symbols)
+    clock = VirtualClock(start)
+    sim = SimulatedMT5(clock, symbols, latency_ms, error_rate, seed)
+    sim.install()
+
+    # Bot modules are imported only now, so mt5.py binds the simulated terminal
+    import bot
+    from config import MAX_SPREAD
+    from market_engine import load_symbol_points
+    from mt5 import ResilientMT5
+    from portfolio_risk import PortfolioRisk
+
+    for symbol, (_, point) in sim.symbols.items():
+        MAX_SPREAD.setdefault(symbol, 3 * SIM_SPREAD_POINTS * point)
+
+    wall_start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull if quiet else sys.stdout):
+        bot_mt5 = ResilientMT5(retry_interval=10, max_retries=5, sleep=clock.sleep, credentials=(1, "sim", "SIM"))
+        load_symbol_points(bot_mt5, symbols)
+        scheduler = LoadScheduler(clock)
+        bot.run(bot_mt5, symbols, scheduler=scheduler, portfolio=PortfolioRisk(symbols),
+                stop=lambda: clock.seconds() >= hours * 3600)
+    return summarize(n_symbols, scheduler, sim, hours, time.perf_counter() - wall_start)
+
+
+def scaling_curve(counts=LOADTEST_SYMBOL_COUNTS, hours=LOADTEST_HOURS, latency_ms=LOADTEST_LATENCY_MS,
+                  error_rate=LOADTEST_ERROR_RATE, seed=0, report_path=LOADTEST_REPORT_PATH):
+    """One soak per universe size, each in its own interpreter; rows are appended to report_path."""
+    import pandas as pd
+    from backtest_cache import code_version
+
+    rows = []
+    for n in counts:
+        print(f"{datetime.now()} → Load test: {n} symbols, {hours} h simulated")
+        proc = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "--child", "--symbols", str(n), "--hours", str(hours),
+             "--latency-ms", str(latency_ms), "--error-rate", str(error_rate), "--seed", str(seed)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{datetime.now()} → Load test with {n} symbols failed:\n{proc.stderr.strip()}")
+            continue
+        rows.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    report = pd.DataFrame(rows)
+    if report.empty:
+        return report
+    report.insert(0, "code", code_version(("bot", "strategies", "gates", "strategy_engine", "ict_model", "market_engine", "regime_thresholds", "execution")))
+    report.insert(0, "run_at", datetime.now().replace(microsecond=0))
+    report.insert(2, "latency_ms", latency_ms)
+    report.insert(3, "error_rate", error_rate)
+    path = Path(report_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(path, mode="a", header=not path.exists(), index=False)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load and soak test of the bot's main loop on a simulated MT5")
+    parser.add_argument("--symbols", default=",".join(map(str, LOADTEST_SYMBOL_COUNTS)), help="comma separated universe sizes")
+    parser.add_argument("--hours", type=float, default=LOADTEST_HOURS)
+    parser.add_argument("--latency-ms", type=float, default=LOADTEST_LATENCY_MS)
+    parser.add_argument("--error-rate", type=float, default=LOADTEST_ERROR_RATE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.symbols.split(",")]
+    if args.child:
+        print(json.dumps(run_soak(counts[0], args.hours, args.latency_ms, args.error_rate, args.seed)))
+    else:
+        import pandas as pd
+        pd.set_option("display.width", 250)
+        print(scaling_curve(counts, args.hours, args.latency_ms, args.error_rate, args.seed).to_string(index=False))
@@ -1,6 +1,5 @@
 import pandas as pd
 from datetime import datetime
-import MetaTrader5 as mt5
 import os
 from pathlib import Path
 
@@ -14,7 +13,8 @@ def get_symbol_log_paths(symbol: str):
     return {
         "trades": symbol_dir / "trades.csv", # entries 
         "positions": symbol_dir / "positions.csv", # floating updates
-        "closed": symbol_dir / "closed_trades.csv" # final P/L
+        "closed": symbol_dir / "closed_trades.csv", # final P/L
+        "executions": symbol_dir / "executions.csv" # fill quality per order
     }
 
 
@@ -40,6 +40,10 @@ def log_trade_close(info: dict):
     info["timestamp"] = datetime.now()
     _append_csv(get_symbol_log_paths(info['symbol'])['closed'], info)
 
+# ------------------ EXECUTION QUALITY ------------------
+def log_execution(info: dict):
+    _append_csv(get_symbol_log_paths(info['symbol'])['executions'], info)
+
 def print_trade(trade_info: dict):
     print(f"{datetime.now()} [{trade_info['symbol']}] → {trade_info['type']} | "
           f"Volume: {trade_info['volume']} | Price: {trade_info['price']} | "
@@ -0,0 +1,318 @@
+# market_bus.py
+# One feeder process owns the broker connection and publishes bars and ticks into shared-memory
+# ring buffers; any number of reader processes attach and read them without touching MT5.
+#
+#   Feeder:  python market_bus.py
+#   Reader:  bus = BusMT5(SYMBOLS); df = get_candles(bus, "EURUSD")
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from multiprocessing import shared_memory
+from config import (SYMBOLS, TIMEFRAME, MARKET_BUS_PREFIX, MARKET_BUS_BAR_CAPACITY, MARKET_BUS_TICK_CAPACITY, MARKET_BUS_POLL_INTERVAL,
+                    MARKET_BUS_CUSTOM_BARS)
+
+# Record layouts match MT5's copy_rates_* and copy_ticks_* arrays
+BAR_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+    ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+TICK_DTYPE = np.dtype([
+    ('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+    ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8'),
+])
+
+BUS_MAGIC = 0x46584255   # "FXBU"
+HEADER_FIELDS = 4        # magic, capacity, seq, count
+_MAGIC, _CAPACITY, _SEQ, _COUNT = range(HEADER_FIELDS)
+READ_RETRIES = 100
+
+
+def bar_segment_name(symbol: str, timeframe=TIMEFRAME) -> str:
+    return f"{MARKET_BUS_PREFIX}_{symbol}_{timeframe}"
+
+
+def tick_segment_name(symbol: str) -> str:
+    return f"{MARKET_BUS_PREFIX}_{symbol}_ticks"
+
+
+# ------------------ Shared Ring Buffer ------------------ #
+class SharedRing:
+    """
+    Fixed-capacity ring of structured records in one shared-memory segment.
+
+    Single writer, many readers, no locks: the writer makes the sequence number odd while it
+    writes and even when done (seqlock). Readers copy what they need and retry if the sequence
+    changed or was odd meanwhile.
+    """
+
+    def __init__(self, name: str, dtype: np.dtype, capacity: int = 0, create: bool = False):
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        header_bytes = HEADER_FIELDS * 8
+
+        if create:
+            size = header_bytes + capacity * self.dtype.itemsize
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # Left over from a feeder that did not shut down cleanly
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.header = np.ndarray((HEADER_FIELDS,), dtype='<i8', buffer=self.shm.buf)
+            self.header[:] = (BUS_MAGIC, capacity, 0, 0)
+        else:
+            self.shm = _attach(name)
+            self.header = np.ndarray((HEADER_FIELDS,), dtype='<i8', buffer=self.shm.buf)
+            if self.header[_MAGIC] != BUS_MAGIC:
+                raise ValueError(f"Shared segment {name} is not a market bus ring")
+            capacity = int(self.header[_CAPACITY])
+
+        self.capacity = capacity
+        self.records = np.ndarray((capacity,), dtype=self.dtype, buffer=self.shm.buf, offset=header_bytes)
+
+    # ---- writer side ----
+    def _begin(self):
+        self.header[_SEQ] += 1  # odd: write in progress
+
+    def _end(self):
+        self.header[_SEQ] += 1  # even: consistent
+
+    def append(self, records: np.ndarray):
+        self._begin()
+        try:
+            count = int(self.header[_COUNT])
+            for record in records[-self.capacity:]:
+                self.records[count % self.capacity] = record
+                count += 1
+            self.header[_COUNT] = count
+        finally:
+            self._end()
+
+    def last_time(self) -> int:
+        """Time of the newest record (writer side), -1 if empty."""
+        count = int(self.header[_COUNT])
+        return int(self.records[(count - 1) % self.capacity]['time']) if count else -1
+
+    def publish_bars(self, rates: np.ndarray) -> int:
+        """Upsert bars by time: the forming bar is overwritten, newer bars appended. Returns bars appended."""
+        count = int(self.header[_COUNT])
+        last_time = self.last_time()
+        if len(rates) == 0 or (rates['time'][-1] < last_time):
+            return 0
+
+        self._begin()
+        try:
+            appended = 0
+            for rate in rates:
+                if rate['time'] == last_time:
+                    self.records[(count - 1) % self.capacity] = rate
+                elif rate['time'] > last_time:
+                    self.records[count % self.capacity] = rate
+                    count += 1
+                    appended += 1
+                    last_time = rate['time']
+            self.header[_COUNT] = count
+        finally:
+            self._end()
+        return appended
+
+    # ---- reader side ----
+    def view(self):
+        """
+        Zero-copy access: (ring array view, total records written, sequence number).
+        The view is only consistent if is_unchanged(seq) still holds after using it.
+        """
+        return self.records, int(self.header[_COUNT]), int(self.header[_SEQ])
+
+    def is_unchanged(self, seq: int) -> bool:
+        return seq % 2 == 0 and int(self.header[_SEQ]) == seq
+
+    def read(self, n: int) -> np.ndarray:
+        """Consistent copy of the latest n records, oldest first."""
+        for _ in range(READ_RETRIES):
+            seq = int(self.header[_SEQ])
+            if seq % 2:
+                time.sleep(0)  # writer mid-update; yield and retry
+                continue
+            count = int(self.header[_COUNT])
+            n_avail = min(n, count, self.capacity)
+            start = (count - n_avail) % self.capacity
+            if start + n_avail <= self.capacity:
+                out = self.records[start:start + n_avail].copy()
+            else:
+                out = np.concatenate([self.records[start:], self.records[:(start + n_avail) % self.capacity]])
+            if int(self.header[_SEQ]) == seq:
+                return out
+            time.sleep(0)
+        raise TimeoutError(f"Market bus ring {self.name} kept changing while reading")
+
+    def close(self):
+        self.records = None
+        self.header = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without letting this process's resource tracker unlink it on exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+# ------------------ Feeder ------------------ #
+def run_feeder(symbols=SYMBOLS, timeframes=(TIMEFRAME, "H1", "H4"), poll_interval=MARKET_BUS_POLL_INTERVAL,
+               bar_capacity=MARKET_BUS_BAR_CAPACITY, tick_capacity=MARKET_BUS_TICK_CAPACITY, bot_mt5=None, recorder=None,
+               custom_bars=MARKET_BUS_CUSTOM_BARS):
+    """
+    Own the broker connection and keep the rings current. Per poll this costs one small
+    copy_rates call per (symbol, timeframe) and one symbol_info_tick per symbol, however
+    many readers are attached. New ticks are also passed to `recorder` (a TickRecorder) if given,
+    and to a BarBuilder per custom bar spec (bar_builder.py), published like broker timeframes.
+    Custom bars only see the polled ticks, so keep poll_interval short when using them.
+    """
+    if bot_mt5 is None:
+        from mt5 import ResilientMT5
+        bot_mt5 = ResilientMT5(path=None, retry_interval=10, max_retries=5)
+
+    bar_rings = {}
+    tick_rings = {}
+    for symbol in symbols:
+        tick_rings[symbol] = SharedRing(tick_segment_name(symbol), TICK_DTYPE, tick_capacity, create=True)
+        for tf in timeframes:
+            ring = SharedRing(bar_segment_name(symbol, tf), BAR_DTYPE, bar_capacity, create=True)
+            ring.publish_bars(np.asarray(bot_mt5.safe_rates(symbol, tf, bar_capacity)).astype(BAR_DTYPE))
+            bar_rings[(symbol, tf)] = ring
+    builders = {symbol: [] for symbol in symbols}  # symbol -> [(BarBuilder, ring)] for custom bars
+    if custom_bars:
+        from bar_builder import BarBuilder
+        from market_engine import symbol_point
+        for symbol in symbols:
+            for spec in custom_bars:
+                ring = SharedRing(bar_segment_name(symbol, spec), BAR_DTYPE, bar_capacity, create=True)
+                builders[symbol].append((BarBuilder(spec, symbol_point(symbol, bot_mt5), bar_capacity), ring))
+    print(f"{datetime.now()} → Market bus feeding {len(symbols)} symbols x {len(timeframes) + len(custom_bars)} timeframes")
+
+    last_tick_msc = dict.fromkeys(symbols, 0)
+    try:
+        while True:
+            for (symbol, tf), ring in bar_rings.items():
+                try:
+                    rates = np.asarray(bot_mt5.safe_rates(symbol, tf, 3)).astype(BAR_DTYPE)
+                    if rates['time'][0] > ring.last_time():
+                        # No overlap with what was published: bars are missing, backfill
+                        rates = np.asarray(bot_mt5.safe_rates(symbol, tf, bar_capacity)).astype(BAR_DTYPE)
+                    ring.publish_bars(rates)
+                except Exception as e:
+                    print(f"{datetime.now()} [{symbol}] → Market bus bar error: {e}")
+
+            for symbol, ring in tick_rings.items():
+                try:
+                    tick = bot_mt5.safe_tick(symbol)
+                    if tick.time_msc > last_tick_msc[symbol]:
+                        ring.append(np.array([(tick.time, tick.bid, tick.ask, tick.last, tick.volume,
+                                               tick.time_msc, tick.flags, tick.volume_real)], dtype=TICK_DTYPE))
+                        last_tick_msc[symbol] = tick.time_msc
+                        if recorder is not None:
+                            recorder.on_tick(symbol, tick)
+                        for builder, bar_ring in builders[symbol]:
+                            builder.on_tick(tick)
+                            bar_ring.publish_bars(builder.rates(2))  # closed bar (if any) and the forming one
+                except Exception as e:
+                    print(f"{datetime.now()} [{symbol}] → Market bus tick error: {e}")
+
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("Market bus feeder stopped by user")
+    finally:
+        custom_rings = [ring for pairs in builders.values() for _, ring in pairs]
+        for ring in list(bar_rings.values()) + list(tick_rings.values()) + custom_rings:
+            ring.close()
+            ring.unlink()
+        if recorder is not None:
+            recorder.flush()
+        bot_mt5.shutdown()
+
+
+# ------------------ Reader ------------------ #
+class BusTick:
+    """Attribute access over one tick record, like MT5's Tick named tuple."""
+    __slots__ = TICK_DTYPE.names
+
+    def __init__(self, record):
+        for name in TICK_DTYPE.names:
+            setattr(self, name, record[name].item())
+
+
+class BusMT5:
+    """
+    Read-only market data client with the ResilientMT5 data interface (safe_rates,
+    safe_candles, safe_tick), served from the bus. Anything else (orders, positions,
+    account) is delegated to `broker` if one is given.
+    """
+
+    def __init__(self, symbols=SYMBOLS, broker=None):
+        self.symbols = list(symbols)
+        self.broker = broker
+        self._bars = {}
+        self._ticks = {}
+
+    def _bar_ring(self, symbol, timeframe) -> SharedRing:
+        key = (symbol, timeframe)
+        if key not in self._bars:
+            self._bars[key] = SharedRing(bar_segment_name(symbol, timeframe), BAR_DTYPE)
+        return self._bars[key]
+
+    def _tick_ring(self, symbol) -> SharedRing:
+        if symbol not in self._ticks:
+            self._ticks[symbol] = SharedRing(tick_segment_name(symbol), TICK_DTYPE)
+        return self._ticks[symbol]
+
+    def safe_rates(self, symbol: str, timeframe, n: int) -> np.ndarray:
+        rates = self._bar_ring(symbol, timeframe).read(n)
+        if len(rates) == 0:
+            raise ConnectionError(f"Market bus has no {timeframe} bars for {symbol}")
+        return rates
+
+    def safe_candles(self, symbol: str, timeframe, n: int) -> pd.DataFrame:
+        return pd.DataFrame(self.safe_rates(symbol, timeframe, n))
+
+    def safe_tick(self, symbol: str) -> BusTick:
+        ticks = self._tick_ring(symbol).read(1)
+        if len(ticks) == 0:
+            raise ConnectionError(f"Market bus has no ticks for {symbol}")
+        return BusTick(ticks[0])
+
+    def recent_ticks(self, symbol: str, n: int) -> np.ndarray:
+        return self._tick_ring(symbol).read(n)
+
+    def __getattr__(self, name):
+        broker = self.__dict__.get("broker")
+        if broker is None:
+            raise AttributeError(f"{name} needs a broker connection; BusMT5 only serves market data")
+        return getattr(broker, name)
+
+    def shutdown(self):
+        for ring in list(self._bars.values()) + list(self._ticks.values()):
+            ring.close()
+        self._bars.clear()
+        self._ticks.clear()
+        if self.broker is not None:
+            self.broker.shutdown()
+
+
+if __name__ == "__main__":
+    from tick_recorder import TickRecorder
+    run_feeder(recorder=TickRecorder())
@@ -1,8 +1,66 @@
 # market_engine.py
+import numpy as np
 import pandas as pd
 from datetime import datetime
-
-def detect_market_regime(df: pd.DataFrame, allow_momentum=False, session_hours=None) -> str:
+from functools import lru_cache
+from sessions import kill_zone_mask
+from state_store import register_state
+
+# ------------------ Regime Thresholds ------------------ #
+EMA_FAST_SPAN = 20
+EMA_SLOW_SPAN = 50
+ATR_WINDOW = 14
+MIN_REGIME_CANDLES = 50
+
+TREND_THRESHOLD_PIPS = 0.5
+MOMENTUM_TREND_THRESHOLD_PIPS = 0.2
+MOMENTUM_ATR_PIPS = 8        # RANGING with ATR above this is treated as trend for momentum entries
+VOLATILE_THRESHOLD = 12      # ATR pips
+CONSOLIDATION_THRESHOLD = 4  # ATR pips
+# Fixed thresholds by name; regime_thresholds.py replaces them per symbol and session with
+# streaming quantiles once enough bars have been seen
+FIXED_THRESHOLDS = {
+    "trend": TREND_THRESHOLD_PIPS,
+    "momentum_trend": MOMENTUM_TREND_THRESHOLD_PIPS,
+    "momentum_atr": MOMENTUM_ATR_PIPS,
+    "volatile": VOLATILE_THRESHOLD,
+    "consolidation": CONSOLIDATION_THRESHOLD,
+}
+
+# ------------------ Symbol Point Metadata ------------------ #
+# Fallback point sizes, used until the broker's symbol_info has been loaded.
+DEFAULT_POINT = 0.00001  # EURUSD 5-digit
+DEFAULT_POINTS = {
+    "EURUSD": 0.00001,
+    "GBPUSD": 0.00001,
+    "USDJPY": 0.001,     # JPY pairs quote 3 digits
+    "XAUUSD": 0.01,      # gold quotes 2 digits
+}
+SYMBOL_POINTS = {}  # symbol -> point, cached from the broker
+register_state("symbol_points", lambda: dict(SYMBOL_POINTS), SYMBOL_POINTS.update)
+
+
+def symbol_point(symbol: str, bot_mt5=None) -> float:
+    """
+    Point size for a symbol (pip = 10 points).
+    Looked up once from the broker when bot_mt5 is given, then served from the cache.
+    """
+    point = SYMBOL_POINTS.get(symbol)
+    if point is not None:
+        return point
+    if bot_mt5 is not None:
+        point = bot_mt5.safe_symbol_info(symbol).point
+        SYMBOL_POINTS[symbol] = point
+        return point
+    return DEFAULT_POINTS.get(symbol, DEFAULT_POINT)
+
+
+def load_symbol_points(bot_mt5, symbols) -> dict:
+    """Warm the point cache for a whole universe of symbols."""
+    return {symbol: symbol_point(symbol, bot_mt5) for symbol in symbols}
+
+def detect_market_regime(df: pd.DataFrame, allow_momentum=False, session_filter=False, point: float = None,
+                         thresholds: dict = None) -> str:
     """
     ICT-Inspired Market Regime Detection
 
@@ -16,78 +74,150 @@ def detect_market_regime(df: pd.DataFrame, allow_momentum=False, session_hours=N
     Enhancements over simple EMA + ATR:
     - EMA slope + cross
     - ATR volatility
-    - Session filter (optional)
+    - Session filter (optional): last bar outside the kill zones -> CONSOLIDATION
     - Avoid trades in low-probability zones
+
+    `point` is the symbol's point size (see symbol_point); defaults to EURUSD 5-digit.
+    `thresholds` overrides FIXED_THRESHOLDS (pips by name), e.g. RegimeThresholds.current(symbol, df).
     """
 
-    if len(df) < 50:
+    if len(df) < MIN_REGIME_CANDLES:
         return "RANGING"
 
     # ---- Session Filter ----
-    if session_hours:
-        current_hour = df['time'].iloc[-1].hour
-        start, end = session_hours
-        if not (start <= current_hour < end):
-            return "CONSOLIDATION"
+    if session_filter and not kill_zone_mask(df.index[-1:])[0]:
+        return "CONSOLIDATION"
 
-    point = 0.00001  # EURUSD 5-digit
+    point = point or DEFAULT_POINT
     pip = point * 10
 
     # ---- EMA Trend Detection ----
-    ema_fast = df['close'].ewm(span=20, adjust=False).mean()
-    ema_slow = df['close'].ewm(span=50, adjust=False).mean()
-    ema_fast_now = ema_fast.iloc[-1]
-    ema_fast_prev = ema_fast.iloc[-2]
-    ema_slow_now = ema_slow.iloc[-1]
-    price = df['close'].iloc[-1]
-
-    ema_slope = ema_fast_now - ema_fast_prev
-    ema_pip_diff = abs(ema_fast_now - ema_slow_now) / pip
-    ema_pct_diff = abs(ema_fast_now - ema_slow_now) / price
-
-    TREND_THRESHOLD_PIPS = 0.2 if allow_momentum else 0.5
-    TREND_THRESHOLD_PCT = 0.0001 if allow_momentum else 0.0002
-
-    if ema_fast_now > ema_slow_now and ema_slope > 0 and ema_pip_diff > TREND_THRESHOLD_PIPS:
-        trend = "TREND_UP"
-    elif ema_fast_now < ema_slow_now and ema_slope < 0 and ema_pip_diff > TREND_THRESHOLD_PIPS:
-        trend = "TREND_DOWN"
-    else:
-        trend = "RANGING"
-
-    # if ema_fast_now > ema_slow_now and ema_slope > 0 and ema_pct_diff > TREND_THRESHOLD_PCT:
-    #     trend = "TREND_UP"
-    # elif ema_fast_now < ema_slow_now and ema_slope < 0 and ema_pct_diff > TREND_THRESHOLD_PCT:
-    #     trend = "TREND_DOWN"
-    # else:
-    #     trend = "RANGING"
+    ema_fast = df['close'].ewm(span=EMA_FAST_SPAN, adjust=False).mean()
+    ema_slow = df['close'].ewm(span=EMA_SLOW_SPAN, adjust=False).mean()
 
     # ---- ATR Volatility ----
     hl = df['high'] - df['low']
-    atr = hl.rolling(14).mean().iloc[-1]
+    atr = hl.rolling(ATR_WINDOW).mean().iloc[-1]
+
+    return _classify_regimes(
+        np.array([ema_fast.iloc[-1]]),
+        np.array([ema_fast.iloc[-2]]),
+        np.array([ema_slow.iloc[-1]]),
+        np.array([atr]),
+        np.array([pip]),
+        allow_momentum,
+        thresholds,
+    )[0]
+
+
+def _classify_regimes(ema_fast_now, ema_fast_prev, ema_slow_now, atr, pip, allow_momentum=False, thresholds: dict = None) -> np.ndarray:
+    """
+    Vectorized regime classification shared by detect_market_regime and the batch scanner.
+    All inputs are 1-D arrays with one entry per symbol; `thresholds` values are scalars or
+    arrays of the same length (FIXED_THRESHOLDS by default).
+    """
+    thresholds = thresholds or FIXED_THRESHOLDS
+    ema_slope = ema_fast_now - ema_fast_prev
+    ema_pip_diff = np.abs(ema_fast_now - ema_slow_now) / pip
     atr_pips = atr / pip
 
-    
-    # print(f"{datetime.now()} → atr_pips {atr_pips:.2f}")
+    trend_threshold = thresholds["momentum_trend"] if allow_momentum else thresholds["trend"]
+    fast_above = ema_fast_now > ema_slow_now
+    fast_below = ema_fast_now < ema_slow_now
 
-    VOLATILE_THRESHOLD = 12
-    CONSOLIDATION_THRESHOLD = 4
+    trend = np.full(len(atr), "RANGING", dtype=object)
+    trend[fast_above & (ema_slope > 0) & (ema_pip_diff > trend_threshold)] = "TREND_UP"
+    trend[fast_below & (ema_slope < 0) & (ema_pip_diff > trend_threshold)] = "TREND_DOWN"
 
     # Treat as trend temporarily for momentum entries
     if allow_momentum:
-        if trend == "RANGING" and atr_pips > 8:
-            trend = "TREND_UP" if ema_fast_now > ema_slow_now else "TREND_DOWN"
-
-    volatility = None
-    if atr_pips < CONSOLIDATION_THRESHOLD:
-        volatility = "CONSOLIDATION"
-    elif atr_pips > VOLATILE_THRESHOLD:
-        volatility = "VOLATILE"
+        promote = (trend == "RANGING") & (atr_pips > thresholds["momentum_atr"])
+        trend[promote] = np.where(fast_above[promote], "TREND_UP", "TREND_DOWN")
 
     # ---- Combine Trend + Volatility ----
-    if volatility == "CONSOLIDATION":
-        return "CONSOLIDATION"
-    elif volatility == "VOLATILE" and trend == "RANGING":
-        return "VOLATILE"
-    else:
-        return trend
+    regime = trend
+    regime[(atr_pips > thresholds["volatile"]) & (trend == "RANGING")] = "VOLATILE"
+    regime[atr_pips < thresholds["consolidation"]] = "CONSOLIDATION"
+    return regime
+
+
+# ------------------ Batched Regime Scanner ------------------ #
+@lru_cache(maxsize=64)
+def _ema_weights(n: int, span: int) -> np.ndarray:
+    """
+    Weights w such that X @ w equals the last value of ewm(span, adjust=False) over n bars:
+    ema_T = (1-a)^(n-1) * x_0 + sum_i a * (1-a)^(n-1-i) * x_i
+    """
+    alpha = 2.0 / (span + 1)
+    decay = (1 - alpha) ** np.arange(n - 1, -1, -1, dtype=float)
+    weights = alpha * decay
+    weights[0] = decay[0]
+    weights.setflags(write=False)
+    return weights
+
+
+def scan_regime_arrays(closes: np.ndarray, highs: np.ndarray, lows: np.ndarray, pips: np.ndarray, allow_momentum=False,
+                       thresholds: dict = None) -> np.ndarray:
+    """
+    Classify the regime of many symbols in one pass.
+
+    closes/highs/lows are 2-D arrays (symbols x bars, oldest bar first) of equal length;
+    pips is a 1-D array of pip sizes per symbol. The EMAs reduce to one matrix-vector
+    product each, so this is the hot path for callers that already hold arrays.
+    """
+    n = closes.shape[1]
+    if n < MIN_REGIME_CANDLES:
+        return np.full(closes.shape[0], "RANGING", dtype=object)
+
+    ema_fast_now = closes @ _ema_weights(n, EMA_FAST_SPAN)
+    ema_fast_prev = closes[:, :-1] @ _ema_weights(n - 1, EMA_FAST_SPAN)
+    ema_slow_now = closes @ _ema_weights(n, EMA_SLOW_SPAN)
+    atr = (highs[:, -ATR_WINDOW:] - lows[:, -ATR_WINDOW:]).mean(axis=1)
+
+    return _classify_regimes(ema_fast_now, ema_fast_prev, ema_slow_now, atr, pips, allow_momentum, thresholds)
+
+
+def scan_market_regimes(frames: dict, allow_momentum=False, points: dict = None, thresholds: dict = None) -> dict:
+    """
+    Batched detect_market_regime over a universe of symbols.
+
+    frames: {symbol: candles DataFrame}. Frames of equal length are stacked and
+    evaluated together; results match detect_market_regime per symbol.
+    points: optional {symbol: point}; defaults to the cached symbol_point table.
+    thresholds: optional {symbol: thresholds dict} (RegimeThresholds.on_frames); FIXED_THRESHOLDS otherwise.
+    """
+    points = points or {}
+    by_length = {}
+    for symbol, df in frames.items():
+        by_length.setdefault(len(df), []).append(symbol)
+
+    regimes = {}
+    for n, symbols in by_length.items():
+        closes = np.stack([frames[s]['close'].to_numpy(dtype=float) for s in symbols])
+        highs = np.stack([frames[s]['high'].to_numpy(dtype=float) for s in symbols])
+        lows = np.stack([frames[s]['low'].to_numpy(dtype=float) for s in symbols])
+        pips = np.array([points.get(s) or symbol_point(s) for s in symbols]) * 10
+        group_thresholds = None
+        if thresholds:
+            group_thresholds = {name: np.array([thresholds.get(s, FIXED_THRESHOLDS)[name] for s in symbols], dtype=float)
+                                for name in FIXED_THRESHOLDS}
+
+        regimes.update(zip(symbols, scan_regime_arrays(closes, highs, lows, pips, allow_momentum, group_thresholds)))
+    return regimes
+
+
+def regime_series(df: pd.DataFrame, allow_momentum=False, point: float = None, thresholds: dict = None) -> np.ndarray:
+    """
+    detect_market_regime for every bar of a history in one pass (for backtests).
+    EMAs run over the whole history instead of a trailing window; the start-up weight
+    left after MIN_REGIME_CANDLES bars is negligible. `thresholds` values may be per-bar
+    arrays (RegimeThresholds.series).
+    """
+    pip = (point or DEFAULT_POINT) * 10
+    ema_fast = df['close'].ewm(span=EMA_FAST_SPAN, adjust=False).mean().to_numpy()
+    ema_slow = df['close'].ewm(span=EMA_SLOW_SPAN, adjust=False).mean().to_numpy()
+    atr = (df['high'] - df['low']).rolling(ATR_WINDOW).mean().to_numpy()
+
+    regimes = _classify_regimes(ema_fast, np.roll(ema_fast, 1), ema_slow, atr, np.full(len(df), pip), allow_momentum, thresholds)
+    regimes[:MIN_REGIME_CANDLES - 1] = "RANGING"
+    return regimes
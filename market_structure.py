@@ -0,0 +1,122 @@
+# market_structure.py
+# Streaming market structure per symbol: the high/low of each kill-zone session for liquidity
+# sweeps, fed one closed bar at a time; every query is a constant-time lookup. The rolling
+# extremes below also give ict_model its BOS range.
+from collections import deque
+import pandas as pd
+from sessions import kill_zone_at
+
+SWEEP_LOOKBACK = 5     # candles (including the forming one) checked for a sweep
+
+
+# ------------------ Rolling Extremes ------------------ #
+class RollingMax:
+    """Max of the last `size` values with a monotonic deque: amortized O(1) push, O(1) query."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.count = 0
+        self._deque = deque()  # (position, value), values strictly decreasing
+
+    def push(self, value: float):
+        while self._deque and self._deque[-1][1] <= value:
+            self._deque.pop()
+        self._deque.append((self.count, value))
+        self.count += 1
+        if self._deque[0][0] <= self.count - 1 - self.size:
+            self._deque.popleft()
+
+    def value(self) -> float | None:
+        return self._deque[0][1] if self._deque else None
+
+    def full(self) -> bool:
+        return self.count >= self.size
+
+
+class RollingMin(RollingMax):
+    """Min of the last `size` values (a RollingMax over negated values)."""
+
+    def push(self, value: float):
+        super().push(-value)
+
+    def value(self) -> float | None:
+        top = super().value()
+        return None if top is None else -top
+
+
+# ------------------ Structure Tracker ------------------ #
+class StructureTracker:
+    """
+    Session structure of one symbol, updated with each closed bar (`push`) or incrementally from
+    a candles DataFrame (`on_candles`). Queries take the forming bar and never look back over history.
+
+    Sessions are the KILL_ZONES windows: a session's high/low covers the bars labelled with that
+    zone on that day, and the previous session is the last one that has already ended.
+    """
+
+    def __init__(self, sweep_lookback=SWEEP_LOOKBACK):
+        self.last_time = None
+
+        # Kill-zone sessions
+        self.session = None           # {'name', 'window_start', 'start', 'end', 'high', 'low'} being built
+        self.prev_session = None      # last completed session
+
+        # Sweeps of the last closed bars, as evaluated when each bar closed
+        self._sweeps = deque(maxlen=max(sweep_lookback - 1, 0))
+
+    # ---- updates ----
+    def push(self, bar_time, high: float, low: float, close: float):
+        """Add one closed bar (time-ordered)."""
+        self._update_session(bar_time, high, low)
+        self._sweeps.append(self._sweep_of(high, low, close))
+        self.last_time = bar_time
+
+    def on_candles(self, df: pd.DataFrame):
+        """Push the closed bars of `df` (all but the forming last row) not seen yet."""
+        closed = df.iloc[:-1]
+        if self.last_time is not None:
+            closed = closed[closed.index > self.last_time]
+        for bar_time, high, low, close in zip(closed.index, closed['high'].to_numpy(), closed['low'].to_numpy(), closed['close'].to_numpy()):
+            self.push(bar_time, float(high), float(low), float(close))
+
+    def _update_session(self, bar_time, high, low):
+        window = kill_zone_at(bar_time)
+        session = self.session
+        if session is not None and (window is None or window[1] != session['window_start']):
+            self._close_session()
+            session = None
+        if window is None:
+            return
+        if session is None:
+            self.session = {'name': window[0], 'window_start': window[1], 'start': bar_time, 'end': bar_time, 'high': high, 'low': low}
+        else:
+            session['end'] = bar_time
+            session['high'] = max(session['high'], high)
+            session['low'] = min(session['low'], low)
+
+    def _close_session(self):
+        self.prev_session = self.session
+        self.session = None
+
+    # ---- queries (O(1)) ----
+    def _sweep_of(self, high, low, close) -> str | None:
+        prev = self.prev_session
+        if prev is None:
+            return None
+        # Bearish liquidity sweep: price pierces the session high then closes below it
+        if high > prev['high'] and close < prev['high']:
+            return 'SELL'
+        # Bullish liquidity sweep: price pierces the session low then closes above it
+        if low < prev['low'] and close > prev['low']:
+            return 'BUY'
+        return None
+
+    def sweep(self, high: float, low: float, close: float) -> str | None:
+        """
+        'BUY'/'SELL' if the previous session's low/high was swept by one of the last
+        SWEEP_LOOKBACK candles (the forming one included), oldest first; else None.
+        """
+        for result in self._sweeps:
+            if result:
+                return result
+        return self._sweep_of(high, low, close)
@@ -0,0 +1,165 @@
+# memory_diagnostics.py
+# Optional memory diagnostics for long-running bots: tracemalloc snapshots diffed every N cycles,
+# growth attributed to our modules (strategy_engine, logger, mt5, ...) or the library that
+# allocated, RSS per cycle and a memory budget warning. Reports are appended to a local file.
+import os
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from config import MEMORY_SNAPSHOT_EVERY, MEMORY_BUDGET_MB, MEMORY_REPORT_PATH, MEMORY_TOP_SITES, MEMORY_TRACE_FRAMES
+
+PROJECT_DIR = Path(__file__).resolve().parent
+RSS_WINDOW = 50  # cycles in the steady-state RSS estimate
+
+
+def current_rss_mb() -> float | None:
+    """Resident set size of this process in MB (psutil if installed, else /proc on Linux)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _in_project(filename: str) -> bool:
+    return Path(filename).resolve().is_relative_to(PROJECT_DIR)
+
+
+def module_of(filename: str) -> str:
+    """Our module name for project files, else the top-level package (or 'python' for the stdlib)."""
+    path = Path(filename)
+    if _in_project(filename):
+        return path.stem
+    parts = path.parts
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts and parts.index(marker) + 1 < len(parts):
+            return parts[parts.index(marker) + 1].removesuffix(".py")
+    return "python"
+
+
+def _site_of(traceback) -> tuple[str, str]:
+    """(module, 'file:line') of the innermost frame in our code, else of the allocating frame."""
+    frame = next((f for f in reversed(traceback) if _in_project(f.filename)), traceback[-1])
+    return module_of(frame.filename), f"{Path(frame.filename).name}:{frame.lineno}"
+
+
+class MemoryMonitor:
+    """
+    Call on_cycle() once per main-loop iteration. Every `every` cycles the tracemalloc snapshot is
+    diffed against the previous one and a report is appended to `report_path`.
+    """
+
+    def __init__(self, every=MEMORY_SNAPSHOT_EVERY, budget_mb=MEMORY_BUDGET_MB, report_path=MEMORY_REPORT_PATH,
+                 top=MEMORY_TOP_SITES, frames=MEMORY_TRACE_FRAMES):
+        self.every = every
+        self.budget_mb = budget_mb
+        self.report_path = Path(report_path)
+        self.top = top
+        self.frames = frames
+        self.cycle = 0
+        self.rss = deque(maxlen=RSS_WINDOW)
+        self.peak_rss = 0.0
+        self.over_budget = False
+        self._previous = None
+        self._previous_cycle = 0
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._previous = self._snapshot()
+        print(f"{datetime.now()} → Memory diagnostics on (report every {self.every} cycles to {self.report_path})")
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            self.report()
+            tracemalloc.stop()
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__, all_frames=True),  # our own snapshots and reports
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def steady_rss(self) -> float | None:
+        """Median RSS over the last RSS_WINDOW cycles (less noisy than the current value)."""
+        if not self.rss:
+            return None
+        values = sorted(self.rss)
+        return values[len(values) // 2]
+
+    def on_cycle(self):
+        self.cycle += 1
+        rss = current_rss_mb()
+        if rss is not None:
+            self.rss.append(rss)
+            self.peak_rss = max(self.peak_rss, rss)
+            self._check_budget(rss)
+        if self.cycle % self.every == 0:
+            self.report()
+
+    def _check_budget(self, rss: float):
+        if not self.budget_mb:
+            return
+        if rss > self.budget_mb and not self.over_budget:
+            self.over_budget = True
+            msg = f"RSS {rss:.0f} MB exceeds the memory budget of {self.budget_mb} MB (cycle {self.cycle})"
+            print(f"{datetime.now()} → ⚠️ {msg}")
+            from alerts import send_alert
+            send_alert("Bot Memory Budget Exceeded", msg)
+        elif rss <= self.budget_mb * 0.9:
+            self.over_budget = False  # re-arm once back under budget
+
+    def growth(self, snapshot) -> tuple[dict, list]:
+        """Growth since the previous snapshot: ({module: bytes}, [(bytes, blocks, module, site)])."""
+        by_module = {}
+        by_site = {}
+        for stat in snapshot.compare_to(self._previous, "traceback"):
+            if stat.size_diff == 0:
+                continue
+            module, site = _site_of(stat.traceback)
+            by_module[module] = by_module.get(module, 0) + stat.size_diff
+            size, blocks = by_site.get((module, site), (0, 0))
+            by_site[(module, site)] = (size + stat.size_diff, blocks + stat.count_diff)
+        sites = sorted(((size, blocks, module, site) for (module, site), (size, blocks) in by_site.items()), reverse=True)
+        return by_module, sites
+
+    def report(self):
+        if not tracemalloc.is_tracing() or self._previous is None:
+            return
+        snapshot = self._snapshot()
+        by_module, sites = self.growth(snapshot)
+        since = self._previous_cycle
+        self._previous, self._previous_cycle = snapshot, self.cycle
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        steady = self.steady_rss()
+
+        lines = [
+            f"=== {datetime.now()} cycle {self.cycle} ===",
+            f"RSS now {self.rss[-1] if self.rss else float('nan'):.1f} MB, steady {steady or float('nan'):.1f} MB, "
+            f"peak {self.peak_rss:.1f} MB, budget {self.budget_mb} MB",
+            f"traced now {traced / 2**20:.1f} MB, traced peak {traced_peak / 2**20:.1f} MB",
+            f"growth by module since cycle {since}:",
+        ]
+        for module, size in sorted(by_module.items(), key=lambda kv: kv[1], reverse=True):
+            lines.append(f"    {module:<20} {size / 1024:+10.1f} KiB")
+        lines.append(f"top {self.top} growing allocation sites:")
+        for size, count, module, site in sites[:self.top]:
+            lines.append(f"    {size / 1024:+10.1f} KiB {count:+7d} blocks  {module:<16} {site}")
+
+        self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.report_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n\n")
+        top_module = max(by_module.items(), key=lambda kv: kv[1], default=("-", 0))
+        print(f"{datetime.now()} → Memory report (cycle {self.cycle}): RSS {self.rss[-1] if self.rss else float('nan'):.1f} MB, "
+              f"top growth {top_module[0]} {top_module[1] / 1024:+.1f} KiB")
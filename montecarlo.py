@@ -0,0 +1,172 @@
+# montecarlo.py
+# Monte Carlo risk-of-ruin study for RISK_PER_TRADE and DAILY_DRAWDOWN_LIMIT.
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from config import SYMBOLS, RISK_PER_TRADE, DAILY_DRAWDOWN_LIMIT
+
+RISK_GRID = (0.0025, 0.005, 0.0075, RISK_PER_TRADE, 0.015, 0.02)
+PATHS_PER_TASK = 20_000  # paths simulated per worker task (bounds memory per task)
+
+
+# ------------------ Inputs ------------------ #
+def r_multiples_from_journal(symbols=SYMBOLS) -> np.ndarray:
+    """Realized R-multiples of all closed trades in the journals, in close-time order."""
+    from analytics import trade_outcomes
+
+    frames = [trade_outcomes(symbol) for symbol in symbols]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return np.array([])
+    outcomes = pd.concat(frames, ignore_index=True).sort_values("close_time")
+    return outcomes["r_multiple"].dropna().to_numpy(dtype=float)
+
+
+# ------------------ Simulation Kernel ------------------ #
+def _block_bootstrap(rng, n: int, n_paths: int, n_trades: int, block_size: int) -> np.ndarray:
+    """Indices (n_paths, n_trades) into the R-multiples, drawn in circular blocks to keep streaks."""
+    n_blocks = -(-n_trades // block_size)
+    starts = rng.integers(0, n, size=(n_paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block_size)) % n
+    return idx.reshape(n_paths, -1)[:, :n_trades]
+
+
+def _simulate_task(r, risk_grid, n_paths, n_trades, block_size, trades_per_day, daily_limit, ruin_level, seed):
+    """
+    Simulate one batch of paths for every risk setting.
+    Returns {risk: (max_drawdown, hit_daily_stop, days_stopped, ruined, final_equity)}.
+
+    Works in log-equity (float32) laid out as (trade of day, path, day), so each step of
+    the intraday loop is a contiguous operation over all paths and days at once.
+    """
+    rng = np.random.default_rng(seed)
+    n_days = -(-n_trades // trades_per_day)
+    pad = n_days * trades_per_day - n_trades
+
+    # Padding trades point at an extra zero-growth entry of the lookup table
+    idx = _block_bootstrap(rng, len(r), n_paths, n_trades, block_size)
+    idx = np.pad(idx, ((0, 0), (0, pad)), constant_values=len(r))
+    idx = np.ascontiguousarray(idx.reshape(n_paths, n_days, trades_per_day).transpose(2, 0, 1))
+
+    log_stop = np.float32(np.log1p(-daily_limit))
+    log_ruin = np.float32(np.log(ruin_level))
+
+    results = {}
+    for risk in risk_grid:
+        # Compounded growth per trade; a loss of 100% or more is ruin
+        table = np.append(np.log(np.maximum(1.0 + risk * r, 1e-12)), 0.0).astype(np.float32)
+        growth = table[idx]
+
+        # Pass 1: intraday drawdown from the day's peak (the bot's definition).
+        # Once the stop is hit the remaining trades of that day are not taken.
+        cum = np.zeros((n_paths, n_days), dtype=np.float32)
+        peak = np.zeros_like(cum)
+        stopped = np.zeros(cum.shape, dtype=bool)
+        for k in range(trades_per_day):
+            growth[k][stopped] = 0.0
+            cum += growth[k]
+            np.maximum(peak, cum, out=peak)
+            stopped |= (cum - peak) <= log_stop
+
+        # Pass 2: drawdown and ruin over the whole path
+        day_open = np.cumsum(cum, axis=1) - cum
+        day_high = day_open + peak
+        prev_high = np.maximum.accumulate(np.concatenate([np.zeros((n_paths, 1), np.float32), day_high[:, :-1]], axis=1), axis=1)
+        prev_high = np.maximum(prev_high, 0.0)
+
+        cum[:] = 0.0
+        peak[:] = 0.0
+        max_dd = np.zeros_like(cum)
+        low = np.zeros_like(cum)
+        for k in range(trades_per_day):
+            cum += growth[k]
+            np.maximum(peak, cum, out=peak)
+            equity = day_open + cum
+            np.maximum(max_dd, np.maximum(prev_high, day_open + peak) - equity, out=max_dd)
+            np.minimum(low, equity, out=low)
+
+        days_stopped = stopped.sum(axis=1)
+        results[risk] = (
+            -np.expm1(-max_dd.max(axis=1)),
+            days_stopped > 0,
+            days_stopped.astype(np.int32),
+            low.min(axis=1) <= log_ruin,
+            np.exp(day_open[:, -1] + cum[:, -1]),
+        )
+    return results
+
+
+# ------------------ Driver ------------------ #
+def simulate(
+    r_multiples,
+    risk_grid=RISK_GRID,
+    n_paths: int = 1_000_000,
+    n_trades: int = 250,
+    block_size: int = 5,
+    trades_per_day: int = 4,
+    daily_limit: float = DAILY_DRAWDOWN_LIMIT,
+    ruin_level: float = 0.5,
+    seed: int = 42,
+    workers: int = None,
+) -> pd.DataFrame:
+    """
+    Block-bootstrap Monte Carlo of compounded equity paths for a grid of risk-per-trade settings.
+
+    Args:
+        r_multiples: realized R-multiples (journal or backtest)
+        n_paths: simulated paths per risk setting
+        n_trades: trades per path
+        block_size: consecutive trades resampled together (preserves streaks)
+        trades_per_day: trades grouped into one day for the daily drawdown stop
+        daily_limit: intraday drawdown that stops trading for the day
+        ruin_level: equity (fraction of start) counted as ruin
+        seed: master seed; each task gets its own child seed, so results do not
+              depend on the number of workers
+        workers: process count (defaults to os.cpu_count())
+
+    Returns one row per risk setting with the max drawdown distribution,
+    the probability of hitting the daily stop and the risk of ruin.
+    """
+    r = np.asarray(r_multiples, dtype=float)
+    r = r[np.isfinite(r)]
+    if len(r) == 0:
+        raise ValueError("No R-multiples to resample")
+
+    task_sizes = [PATHS_PER_TASK] * (n_paths // PATHS_PER_TASK)
+    if n_paths % PATHS_PER_TASK:
+        task_sizes.append(n_paths % PATHS_PER_TASK)
+    seeds = np.random.SeedSequence(seed).spawn(len(task_sizes))
+
+    args = [(r, tuple(risk_grid), size, n_trades, block_size, trades_per_day, daily_limit, ruin_level, s)
+            for size, s in zip(task_sizes, seeds)]
+
+    if workers == 1 or len(args) == 1:
+        batches = [_simulate_task(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            batches = list(pool.map(_simulate_task, *zip(*args)))
+
+    rows = {}
+    for risk in risk_grid:
+        max_dd, hit, days, ruined, final = (np.concatenate(parts) for parts in zip(*(b[risk] for b in batches)))
+        rows[risk] = {
+            "mean_max_dd": float(max_dd.mean()),
+            "p50_max_dd": float(np.quantile(max_dd, 0.50)),
+            "p95_max_dd": float(np.quantile(max_dd, 0.95)),
+            "p99_max_dd": float(np.quantile(max_dd, 0.99)),
+            "p_daily_stop": float(hit.mean()),
+            "daily_stop_rate": float(days.sum() / (len(days) * -(-n_trades // trades_per_day))),
+            "risk_of_ruin": float(ruined.mean()),
+            "median_final_equity": float(np.median(final)),
+        }
+    report = pd.DataFrame.from_dict(rows, orient="index")
+    report.index.name = "risk_per_trade"
+    return report
+
+
+if __name__ == "__main__":
+    pd.set_option("display.width", 200)
+    r = r_multiples_from_journal()
+    print(f"Resampling {len(r)} realized R-multiples")
+    print(simulate(r))
@@ -1,29 +1,105 @@
 import MetaTrader5 as mt5
+import threading
 import time
 from datetime import datetime
 import pandas as pd
 from dotenv import load_dotenv
 from credentials import decrypt_secret
 from alerts import send_alert
+from config import MT5_FILLING_MODE, MT5_FILLING_FALLBACK
 import os
 
 # Load the .env file
 load_dotenv()
 
+# ------------------ Broker Constants ------------------
+# config.py uses plain names; they are translated to MetaTrader5 values only here.
+TIMEFRAMES = {
+    "M1": mt5.TIMEFRAME_M1,
+    "M5": mt5.TIMEFRAME_M5,
+    "M15": mt5.TIMEFRAME_M15,
+    "M30": mt5.TIMEFRAME_M30,
+    "H1": mt5.TIMEFRAME_H1,
+    "H4": mt5.TIMEFRAME_H4,
+    "D1": mt5.TIMEFRAME_D1,
+}
+FILLING_MODES = {
+    "FOK": mt5.ORDER_FILLING_FOK,
+    "IOC": mt5.ORDER_FILLING_IOC,
+    "RETURN": mt5.ORDER_FILLING_RETURN,
+}
+
+
+# Replies that resending the same request cannot fix: fail fast instead of retrying
+FATAL_RETCODES = (
+    mt5.TRADE_RETCODE_INVALID,
+    mt5.TRADE_RETCODE_INVALID_VOLUME,
+    mt5.TRADE_RETCODE_INVALID_STOPS,
+    mt5.TRADE_RETCODE_TRADE_DISABLED,
+    mt5.TRADE_RETCODE_MARKET_CLOSED,
+    mt5.TRADE_RETCODE_NO_MONEY,
+    mt5.TRADE_RETCODE_INVALID_FILL,
+)
+# Price moved: resend at once with the current price
+REQUOTE_RETCODES = (mt5.TRADE_RETCODE_REQUOTE, mt5.TRADE_RETCODE_PRICE_CHANGED, mt5.TRADE_RETCODE_PRICE_OFF)
+SYMBOL_FILLING_FOK, SYMBOL_FILLING_IOC = 1, 2  # symbol_info.filling_mode flags
+
+
+class OrderRejected(ConnectionError):
+    """The broker refused an order for a reason retrying cannot fix; `result` is its reply."""
+
+    def __init__(self, result):
+        super().__init__(f"Order rejected: retcode {result.retcode} ({result.comment})")
+        self.result = result
+
+
+def filling_mode_name(value) -> str | None:
+    return next((name for name, v in FILLING_MODES.items() if v == value), None)
+
+
+def supported_filling_modes(symbol_info) -> list:
+    """Filling modes the symbol accepts, in config preference order (MT5_FILLING_MODE, then MT5_FILLING_FALLBACK)."""
+    flags = getattr(symbol_info, "filling_mode", 0)
+    supported = {
+        "FOK": bool(flags & SYMBOL_FILLING_FOK),
+        "IOC": bool(flags & SYMBOL_FILLING_IOC),
+        "RETURN": getattr(symbol_info, "trade_exemode", None) != mt5.SYMBOL_TRADE_EXECUTION_MARKET,
+    }
+    preference = dict.fromkeys((MT5_FILLING_MODE,) + tuple(MT5_FILLING_FALLBACK))
+    return [mode for mode in preference if supported.get(mode)]
+
+
+def to_mt5_timeframe(timeframe):
+    """Map a timeframe name ("M5", "H1", ...) to its MT5 constant; MT5 values pass through."""
+    return TIMEFRAMES[timeframe] if isinstance(timeframe, str) else timeframe
+
+
 # ------------------ MT5 Resilient Wrapper ------------------
 class ResilientMT5:
-    def __init__(self, path=None, retry_interval=10, max_retries=5):
+    def __init__(self, path=None, retry_interval=10, max_retries=5, sleep=time.sleep, credentials=None):
+        """
+        credentials: optional (login, password, server); by default decrypted from .env.
+        sleep: wait between retries (a virtual clock's sleep in load tests).
+        """
         self.retry_interval = retry_interval
         self.max_retries = max_retries
+        self.sleep = sleep
+        # The terminal connection is shared by the main loop and the equity watchdog thread:
+        # one MT5 call at a time (never held across a retry sleep), order stats per thread
+        self._lock = threading.Lock()
+        self._local = threading.local()
 
-        # --- Load encrypted values ---
-        login_enc = os.getenv("MT5_LOGIN_ENC", "").strip()
-        password_enc = os.getenv("MT5_PASSWORD_ENC", "").strip()
-        server = os.getenv("MT5_SERVER", "").strip()
+        if credentials is None:
+            # --- Load encrypted values ---
+            login_enc = os.getenv("MT5_LOGIN_ENC", "").strip()
+            password_enc = os.getenv("MT5_PASSWORD_ENC", "").strip()
+            server = os.getenv("MT5_SERVER", "").strip()
 
-        # --- Decrypt ---
-        login = decrypt_secret(login_enc)
-        password = decrypt_secret(password_enc)
+            # --- Decrypt ---
+            login = decrypt_secret(login_enc)
+            password = decrypt_secret(password_enc)
+        else:
+            login, password, server = credentials
         
         if not login or not password:
             raise Exception("Failed to decrypt MT5 credentials.")
@@ -40,7 +116,7 @@ class ResilientMT5:
             raise Exception(f"Initialize failed: {mt5.last_error()}")
 
         if initialized:
-            time.sleep(1)  # wait 1 second to ensure MT5 API is ready
+            self.sleep(1)  # wait 1 second to ensure MT5 API is ready
 
             # Login with or without server
             if not server:
@@ -55,11 +131,17 @@ class ResilientMT5:
 
         print(f"{datetime.now()} → ✅ Connected to MT5 successfully")
 
+    @property
+    def last_order_stats(self) -> dict | None:
+        """Telemetry of this thread's last safe_order_send (another thread's orders never overwrite it)."""
+        return getattr(self._local, "order_stats", None)
+
     def safe_account_info(self) -> float:
         """Fetch account balance safely with retries and alerts"""
         retries = 0
         while retries < self.max_retries:
-            info = mt5.account_info()
+            with self._lock:
+                info = mt5.account_info()
             if info is not None:
                 return info
             else:
@@ -67,15 +149,21 @@ class ResilientMT5:
                 msg = f"Failed to fetch account balance (attempt {retries})"
                 print(f"{datetime.now()} → {msg}")
                 send_alert("MT5 API Balance Error", msg)
-                time.sleep(self.retry_interval)
+                self.sleep(self.retry_interval)
         # After max retries
         raise ConnectionError(f"Account balance unavailable after {self.max_retries} retries")
 
+    def account_info_once(self):
+        """One account_info() call: no retries, sleeps or alerts (None on failure). For high-rate polling."""
+        with self._lock:
+            return mt5.account_info()
+
     def safe_tick(self, symbol: str):
         """Get tick info with retries and alerts"""
         retries = 0
         while retries < self.max_retries:
-            tick = mt5.symbol_info_tick(symbol)
+            with self._lock:
+                tick = mt5.symbol_info_tick(symbol)
             if tick:
                 return tick
             else:
@@ -83,7 +171,7 @@ class ResilientMT5:
                 msg = f"Failed to get tick for {symbol} (attempt {retries})"
                 print(f"{datetime.now()} → {msg}")
                 send_alert("MT5 API Tick Error", msg)
-                time.sleep(self.retry_interval)
+                self.sleep(self.retry_interval)
         # After max retries
         raise ConnectionError(f"MT5 tick unavailable for {symbol} after {self.max_retries} retries")
     
@@ -91,7 +179,8 @@ class ResilientMT5:
         """Get symbol_info info with retries and alerts"""
         retries = 0
         while retries < self.max_retries:
-            symbol_info = mt5.symbol_info(symbol)
+            with self._lock:
+                symbol_info = mt5.symbol_info(symbol)
             if symbol_info:
                 return symbol_info
             else:
@@ -99,54 +188,112 @@ class ResilientMT5:
                 msg = f"Failed to get symbol_info for {symbol} (attempt {retries})"
                 print(f"{datetime.now()} → {msg}")
                 send_alert("MT5 API Symbol Info Error", msg)
-                time.sleep(self.retry_interval)
+                self.sleep(self.retry_interval)
         # After max retries
         raise ConnectionError(f"MT5 symbol_info unavailable for {symbol} after {self.max_retries} retries")
 
-    def safe_order_send(self, request):
-        """Send order safely with retries and alerts"""
+    def safe_order_send(self, request, retry_interval=None):
+        """
+        Send order safely with retries and alerts.
+        Requotes are resent at once at the current price; a rejected filling mode falls back to the
+        next one the symbol supports; other fatal retcodes raise OrderRejected without retrying.
+        retry_interval overrides the wait between other failed attempts (0 for urgent closes).
+        Per-order telemetry (attempts, requotes, rejects, latency, filling) is left in last_order_stats
+        of the calling thread.
+        """
+        retry_interval = self.retry_interval if retry_interval is None else retry_interval
+        stats = {"attempts": 0, "requotes": 0, "rejects": 0, "latency_ms": 0.0, "filling": filling_mode_name(request.get("type_filling"))}
+        self._local.order_stats = stats
+        fallbacks = None
         retries = 0
         while retries < self.max_retries:
-            result = mt5.order_send(request)
+            start = time.perf_counter()
+            with self._lock:
+                result = mt5.order_send(request)
+            stats["latency_ms"] = (time.perf_counter() - start) * 1000
+            stats["attempts"] += 1
             if result and result.retcode == mt5.TRADE_RETCODE_DONE:
                 return result
-            else:
-                retries += 1
-                msg = f"Order send failed: {result} (attempt {retries})"
-                print(f"{datetime.now()} → {msg}")
+
+            if result and result.retcode == mt5.TRADE_RETCODE_INVALID_FILL and "type_filling" in request:
+                stats["rejects"] += 1
+                if fallbacks is None:
+                    fallbacks = [m for m in supported_filling_modes(self.safe_symbol_info(request["symbol"])) if m != stats["filling"]]
+                if not fallbacks:
+                    raise OrderRejected(result)
+                mode = fallbacks.pop(0)
+                print(f"{datetime.now()} [{request['symbol']}] → Filling mode {stats['filling']} rejected — retrying with {mode}")
+                stats["filling"] = mode
+                request = {**request, "type_filling": FILLING_MODES[mode]}
+                continue
+
+            if result and result.retcode in FATAL_RETCODES:
+                stats["rejects"] += 1
+                raise OrderRejected(result)
+
+            retries += 1
+            if result and result.retcode in REQUOTE_RETCODES and "price" in request:
+                stats["requotes"] += 1
+                tick = self.safe_tick(request["symbol"])
+                request = {**request, "price": tick.ask if request["type"] == mt5.ORDER_TYPE_BUY else tick.bid}
+                print(f"{datetime.now()} [{request['symbol']}] → Requote ({result.retcode}) — resending at {request['price']}")
+                continue
+
+            msg = f"Order send failed: {result} (attempt {retries})"
+            print(f"{datetime.now()} → {msg}")
+            if retry_interval:  # urgent sends skip the per-attempt alert and the wait
                 send_alert("MT5 API Order Error", msg)
-                time.sleep(self.retry_interval)
+                self.sleep(retry_interval)
         raise ConnectionError(f"MT5 order failed after {self.max_retries} retries")
 
+    def safe_deal(self, deal_ticket: int):
+        """The deal with this ticket from the history, or None if it cannot be found."""
+        retries = 0
+        while retries < self.max_retries:
+            with self._lock:
+                deals = mt5.history_deals_get(ticket=deal_ticket)
+            if deals is not None:
+                return deals[0] if len(deals) else None
+            retries += 1
+            print(f"{datetime.now()} → Failed to fetch deal {deal_ticket} (attempt {retries})")
+            self.sleep(self.retry_interval)
+        return None
+
     def safe_candles(self, symbol: str, timeframe, n: int):
         """Get historical candles safely with retries and alerts"""
+        return pd.DataFrame(self.safe_rates(symbol, timeframe, n))
+
+    def safe_rates(self, symbol: str, timeframe, n: int):
+        """Get historical candles as the raw MT5 structured array, with retries and alerts"""
         retries = 0
         while retries < self.max_retries:
-            rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, n)
+            with self._lock:
+                rates = mt5.copy_rates_from_pos(symbol, to_mt5_timeframe(timeframe), 0, n)
             if rates is not None and len(rates) > 0:
-                return pd.DataFrame(rates)
+                return rates
             else:
                 retries += 1
                 msg = f"Failed to fetch {n} candles for {symbol} (attempt {retries})"
                 print(f"{datetime.now()} → {msg}")
                 send_alert("MT5 API Candle Error", msg)
-                time.sleep(self.retry_interval)
+                self.sleep(self.retry_interval)
         # After max retries
         raise ConnectionError(f"MT5 candles unavailable for {symbol} after {self.max_retries} retries")
 
-    def safe_positions_get(self, symbol: str):
-        """Fetch open positions safely"""
+    def safe_positions_get(self, symbol: str = None):
+        """Fetch open positions safely (all symbols if `symbol` is None)"""
         retries = 0
         while retries < self.max_retries:
-            positions = mt5.positions_get(symbol=symbol)
+            with self._lock:
+                positions = mt5.positions_get(symbol=symbol) if symbol else mt5.positions_get()
             if positions is not None:
                 return positions
             retries += 1
-            msg = f"Failed to get positions for {symbol} (attempt {retries})"
+            msg = f"Failed to get positions for {symbol or 'all symbols'} (attempt {retries})"
             print(f"{datetime.now()} → {msg}")
             send_alert("MT5 API Positions Error", msg)
-            time.sleep(self.retry_interval)
-        raise ConnectionError(f"MT5 positions unavailable for {symbol} after {self.max_retries} retries")
+            self.sleep(self.retry_interval)
+        raise ConnectionError(f"MT5 positions unavailable for {symbol or 'all symbols'} after {self.max_retries} retries")
 
     def safe_position_get_by_ticket(self, ticket: int):
         """
@@ -156,7 +303,8 @@ class ResilientMT5:
         retries = 0
         while retries < self.max_retries:
             try:
-                positions = mt5.positions_get()
+                with self._lock:
+                    positions = mt5.positions_get()
                 if positions is not None:
                     for pos in positions:
                         if pos.ticket == ticket:
@@ -169,7 +317,7 @@ class ResilientMT5:
             msg = f"Failed to get position for ticket {ticket} (attempt {retries})"
             print(f"{datetime.now()} → {msg}")
             send_alert("MT5 API Position Error", msg)
-            time.sleep(self.retry_interval)
+            self.sleep(self.retry_interval)
 
         raise ConnectionError(f"MT5 position unavailable for ticket {ticket} after {self.max_retries} retries")
 
@@ -181,7 +329,8 @@ class ResilientMT5:
         """
         retries = 0
         while retries < self.max_retries:
-            deals = mt5.history_deals_get(utc_from, utc_to)
+            with self._lock:
+                deals = mt5.history_deals_get(utc_from, utc_to)
             if deals is not None:
                 return deals
             else:
@@ -189,7 +338,7 @@ class ResilientMT5:
                 msg = f"Failed to fetch deals (attempt {retries})"
                 print(f"{datetime.now()} → {msg}")
                 send_alert("MT5 API Deals History Error", msg)
-                time.sleep(self.retry_interval)
+                self.sleep(self.retry_interval)
 
         # After max retries
         print(f"{datetime.now()} → Failed to fetch deals after {self.max_retries} retries. Returning empty list.")
@@ -197,7 +346,8 @@ class ResilientMT5:
 
 
     def shutdown(self):
-        mt5.shutdown()
+        with self._lock:
+            mt5.shutdown()
         print(f"{datetime.now()} → MT5 shutdown")
 
 
@@ -0,0 +1,191 @@
+# portfolio_risk.py
+# Correlation-aware position sizing: keeps correlated symbols (EURUSD/GBPUSD, XAUUSD/USDJPY)
+# from stacking risk far above a single trade's RISK_PER_TRADE.
+import math
+import numpy as np
+from datetime import datetime
+from config import SYMBOLS, RISK_PER_TRADE, PORTFOLIO_RISK_LIMIT, PORTFOLIO_EWMA_LAMBDA, PORTFOLIO_MIN_BARS
+from state_store import register_state
+
+
+def position_risk(pos, symbol_info, equity: float) -> float:
+    """
+    Signed fraction of equity an open position loses if its SL is hit (+ long / - short); 0 once
+    the SL is at or beyond the entry. Money per point per lot is trade_tick_value, as in calc_lot_size.
+    """
+    direction = 1 if pos.type == 0 else -1  # BUY / SELL
+    distance = direction * (pos.price_open - pos.sl)
+    if distance <= 0:
+        return 0.0
+    return direction * pos.volume * distance / symbol_info.point * symbol_info.trade_tick_value / equity
+
+
+class PortfolioRisk:
+    """
+    Exponentially weighted return covariance across symbols plus the signed open risk per symbol.
+
+    Portfolio risk is sqrt(e' R e), where e holds each symbol's open risk as a fraction of equity
+    (risk to stop loss) and R is the return correlation matrix. Until PORTFOLIO_MIN_BARS bars have
+    been seen, R is taken as all ones (fully correlated), which is the conservative assumption.
+    """
+
+    def __init__(self, symbols=SYMBOLS, lam=PORTFOLIO_EWMA_LAMBDA, risk_limit=PORTFOLIO_RISK_LIMIT, min_bars=PORTFOLIO_MIN_BARS):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.lam = lam
+        self.risk_limit = risk_limit
+        self.min_bars = min_bars
+
+        k = len(self.symbols)
+        self.cov = np.zeros((k, k))
+        self.last_close = np.full(k, np.nan)
+        self.last_time = None
+        self.n_updates = 0
+
+        self.corr = np.ones((k, k))
+        self.exposure = np.zeros(k)
+        self._corr_exposure = np.zeros(k)  # R @ e
+        self._quad = 0.0                    # e' R e
+
+    # ------------------ Covariance ------------------ #
+    def update(self, closes: np.ndarray, bar_time=None):
+        """
+        O(k^2) EWMA update with one vector of closes (one per symbol, NaN = no new price).
+        Uses zero-mean log returns: C <- lam * C + (1 - lam) * r r'
+        """
+        closes = np.asarray(closes, dtype=float)
+        prev = self.last_close
+        returns = np.log(closes / prev)
+        returns[~np.isfinite(returns)] = 0.0  # first bar or missing price
+
+        if np.isfinite(prev).any():
+            self.cov *= self.lam
+            self.cov += (1 - self.lam) * np.outer(returns, returns)
+            self.n_updates += 1
+
+        self.last_close = np.where(np.isfinite(closes), closes, prev)
+        self.last_time = bar_time
+        self._refresh_correlation()
+
+    def on_bars(self, frames: dict):
+        """
+        Feed the last closed bar of each symbol's candle frame; updates once per new bar time.
+        frames: {symbol: candles DataFrame indexed by time, last row = forming bar}
+        """
+        closes = np.full(len(self.symbols), np.nan)
+        bar_time = None
+        for symbol, df in frames.items():
+            i = self.index.get(symbol)
+            if i is None or len(df) < 2:
+                continue
+            closes[i] = df['close'].iloc[-2]
+            bar_time = df.index[-2] if bar_time is None else max(bar_time, df.index[-2])
+
+        if bar_time is not None and (self.last_time is None or bar_time > self.last_time):
+            self.update(closes, bar_time)
+
+    def seed(self, frames: dict):
+        """Warm the covariance from candle history (closed bars aligned on time)."""
+        import pandas as pd
+
+        closes = pd.DataFrame({s: df['close'].iloc[:-1] for s, df in frames.items() if s in self.index})
+        closes = closes.reindex(columns=self.symbols).sort_index()
+        for bar_time, row in zip(closes.index, closes.to_numpy()):
+            if self.last_time is None or bar_time > self.last_time:
+                self.update(row, bar_time)
+        print(f"{datetime.now()} → Portfolio covariance seeded with {self.n_updates} bars")
+
+    def _refresh_correlation(self):
+        if self.n_updates < self.min_bars:
+            self.corr = np.ones_like(self.cov)
+        else:
+            vol = np.sqrt(np.diag(self.cov))
+            vol[vol == 0] = np.inf  # no movement -> no correlation
+            self.corr = self.cov / np.outer(vol, vol)
+            np.fill_diagonal(self.corr, 1.0)
+        self._corr_exposure = self.corr @ self.exposure
+        self._quad = float(self.exposure @ self._corr_exposure)
+
+    # ------------------ Exposure ------------------ #
+    def set_exposure(self, symbol: str, signed_risk: float):
+        """Set a symbol's open risk (fraction of equity, + long / - short) in O(k)."""
+        i = self.index[symbol]
+        delta = signed_risk - self.exposure[i]
+        if delta == 0:
+            return
+        self._quad += 2 * delta * self._corr_exposure[i] + delta * delta * self.corr[i, i]
+        self._corr_exposure += self.corr[:, i] * delta
+        self.exposure[i] = signed_risk
+
+    def add_exposure(self, symbol: str, signed_risk: float):
+        """Add a new trade's risk on top of the symbol's current exposure (several strategies per symbol)."""
+        self.set_exposure(symbol, self.exposure[self.index[symbol]] + signed_risk)
+
+    def set_positions(self, symbol: str, positions, equity: float = None, symbol_info=None, magics=None,
+                      risk_per_trade: float = RISK_PER_TRADE):
+        """
+        Derive a symbol's exposure from its open MT5 positions (only `magics`, if given). Each
+        position's risk is the loss to its SL (position_risk) as a fraction of equity; without
+        equity and symbol_info, or without an SL, a position counts as one full trade's risk.
+        """
+        risk = 0.0
+        for pos in positions or ():
+            if magics is not None and pos.magic not in magics:
+                continue
+            if pos.sl and equity and symbol_info is not None:
+                risk += position_risk(pos, symbol_info, equity)
+                continue
+            direction = 1 if pos.type == 0 else -1  # BUY / SELL
+            at_risk = not pos.sl or direction * (pos.price_open - pos.sl) > 0
+            risk += direction * risk_per_trade if at_risk else 0.0
+        self.set_exposure(symbol, risk)
+
+    def portfolio_risk(self) -> float:
+        return math.sqrt(max(self._quad, 0.0))
+
+    # ------------------ Sizing ------------------ #
+    def scale_factor(self, symbol: str, direction: str, risk: float = RISK_PER_TRADE) -> float:
+        """
+        Largest s in [0, 1] such that adding s * risk on `symbol` keeps portfolio risk within
+        the limit. Constant time: solves a*s^2 + b*s + c <= 0 from cached R @ e and e' R e.
+        """
+        i = self.index.get(symbol)
+        if i is None:
+            return 1.0
+        x = risk if direction == 'BUY' else -risk
+        a = x * x * self.corr[i, i]
+        b = 2 * x * self._corr_exposure[i]
+        c = self._quad - self.risk_limit ** 2
+        if a + b + c <= 0:
+            return 1.0
+        disc = b * b - 4 * a * c
+        if disc < 0:
+            return 0.0
+        # Upper root; positive when the trade fits at some size (incl. hedges over budget)
+        return min(1.0, max(0.0, (-b + math.sqrt(disc)) / (2 * a)))
+
+    def scale_lot(self, symbol: str, direction: str, lot: float, risk: float = RISK_PER_TRADE) -> float:
+        return lot * self.scale_factor(symbol, direction, risk)
+
+    # ------------------ Snapshot ------------------ #
+    def get_state(self) -> dict:
+        return {
+            "symbols": self.symbols,
+            "cov": self.cov,
+            "last_close": self.last_close,
+            "last_time": self.last_time,
+            "n_updates": self.n_updates,
+        }
+
+    def set_state(self, state: dict):
+        if state["symbols"] != self.symbols:
+            return  # universe changed; start fresh
+        self.cov = state["cov"]
+        self.last_close = state["last_close"]
+        self.last_time = state["last_time"]
+        self.n_updates = state["n_updates"]
+        self._refresh_correlation()
+
+
+PORTFOLIO = PortfolioRisk()
+register_state("portfolio_risk", PORTFOLIO.get_state, PORTFOLIO.set_state)
@@ -0,0 +1,206 @@
+# profiler.py
+# On-demand profiling of the live loop without a restart. Touch the control file (or send SIGUSR1
+# where available) and the next N cycles are profiled, either by a low-overhead stack sampler
+# (collapsed stacks for flamegraph.pl / speedscope plus a per-function summary) or by cProfile
+# (.prof file plus summary). The hook then turns itself off.
+import io
+import os
+import signal
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+from config import PROFILE_CONTROL_FILE, PROFILE_OUTPUT_DIR, PROFILE_CYCLES, PROFILE_MODE, PROFILE_SAMPLE_INTERVAL
+from memory_diagnostics import module_of
+
+# Modules listed first in the summary (the rest of the project and libraries follow)
+FOCUS_MODULES = ("strategy_engine", "market_engine", "execution", "mt5", "logger")
+# Samples inside these functions are the loop sleeping, not working (Python 3.10 has no
+# co_qualname, so frames there are labelled with the bare function name)
+IDLE_FUNCTIONS = {("sessions", "SessionScheduler.wait"), ("sessions", "wait")}
+SUMMARY_TOP = 40
+PROFILE_MODES = ("sample", "cprofile")
+
+
+class StackSampler:
+    """Samples one thread's Python stack every `interval` seconds from a daemon thread."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}  # tuple of (module, function) from root to leaf -> samples
+        self.idle = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _label(self, code) -> tuple:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (module_of(code.co_filename), getattr(code, "co_qualname", code.co_name))
+        return label
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if not stack:
+                continue
+            if any(label in IDLE_FUNCTIONS for label in stack):
+                self.idle += 1
+                continue
+            key = tuple(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def collapsed(self) -> str:
+        """One line per distinct stack: 'module.func;module.func;... count'."""
+        return "".join(f"{';'.join(f'{m}.{f}' for m, f in stack)} {n}\n"
+                       for stack, n in sorted(self.stacks.items(), key=lambda kv: kv[1], reverse=True))
+
+    def summary(self) -> str:
+        total = sum(self.stacks.values())
+        own, inclusive, modules, module_inclusive = {}, {}, {}, {}
+        for stack, n in self.stacks.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + n
+            modules[stack[-1][0]] = modules.get(stack[-1][0], 0) + n
+            for label in set(stack):
+                inclusive[label] = inclusive.get(label, 0) + n
+            for module in {m for m, _ in stack}:
+                module_inclusive[module] = module_inclusive.get(module, 0) + n
+
+        pct = lambda n: 100 * n / total if total else 0.0
+        lines = [f"{total} busy samples, {self.idle} idle, every {self.interval * 1000:.1f} ms", "", "by module (self% / total%):"]
+        others = sorted((m for m in module_inclusive if m not in FOCUS_MODULES), key=lambda m: modules.get(m, 0), reverse=True)
+        for module in FOCUS_MODULES + tuple(others):
+            lines.append(f"    {module:<20} {pct(modules.get(module, 0)):6.1f}% {pct(module_inclusive.get(module, 0)):6.1f}%")
+        lines += ["", f"top {SUMMARY_TOP} functions (self% / total%):"]
+        for label, n in sorted(inclusive.items(), key=lambda kv: (own.get(kv[0], 0), kv[1]), reverse=True)[:SUMMARY_TOP]:
+            lines.append(f"    {pct(own.get(label, 0)):6.1f}% {pct(n):6.1f}%  {label[0]}.{label[1]}")
+        return "\n".join(lines) + "\n"
+
+
+class LoopProfiler:
+    """
+    Call on_cycle() at the top of every loop iteration. Idle cost is one stat() of the control
+    file per cycle. The control file may hold overrides, e.g. 'cycles=20 mode=cprofile interval=0.002'.
+    """
+
+    def __init__(self, control_file=PROFILE_CONTROL_FILE, output_dir=PROFILE_OUTPUT_DIR, cycles=PROFILE_CYCLES,
+                 mode=PROFILE_MODE, interval=PROFILE_SAMPLE_INTERVAL):
+        self.control_file = Path(control_file)
+        self.output_dir = Path(output_dir)
+        self.defaults = {"cycles": cycles, "mode": mode, "interval": interval}
+        self.requested = False
+        self.active = None  # settings of the running profile
+        self.remaining = 0
+        self._sampler = None
+        self._profile = None
+
+    def install_signal(self):
+        """Profile on SIGUSR1 (POSIX only; use the control file on Windows). Main thread only."""
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: setattr(self, "requested", True))
+
+    def _read_request(self) -> dict | None:
+        settings = dict(self.defaults)
+        if self.requested:
+            self.requested = False
+        elif self.control_file.exists():
+            try:
+                text = self.control_file.read_text()
+                self.control_file.unlink()
+            except OSError:
+                return None
+            for token in text.split():
+                key, _, value = token.partition("=")
+                try:
+                    settings[key] = _parse_setting(key, value, self.defaults)
+                except ValueError as e:
+                    print(f"{datetime.now()} → Profile request: ignoring '{token}' ({e})")
+        else:
+            return None
+        return settings
+
+    def on_cycle(self):
+        if self.active is None:
+            settings = self._read_request()
+            if settings is not None:
+                self.start(**settings)
+            return
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.stop()
+
+    def start(self, cycles=PROFILE_CYCLES, mode=PROFILE_MODE, interval=PROFILE_SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"unknown profile mode {mode!r}, expected one of {PROFILE_MODES}")
+        if mode == "cprofile":
+            import cProfile  # with pstats, only loaded when asked for
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident(), interval)
+            self._sampler.start()
+        self.active = {"cycles": cycles, "mode": mode, "interval": interval, "started": datetime.now()}
+        self.remaining = cycles
+        print(f"{datetime.now()} → Profiling the next {cycles} cycles ({mode})")
+
+    def stop(self):
+        """Stop a running profile and write its output; no-op when idle."""
+        if self.active is None:
+            return
+        stem = self.output_dir / f"{self.active['started']:%Y%m%d-%H%M%S}-{self.active['mode']}"
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self._sampler is not None:
+            self._sampler.stop()
+            Path(f"{stem}.collapsed").write_text(self._sampler.collapsed())
+            Path(f"{stem}.txt").write_text(self._sampler.summary())
+        else:
+            self._profile.disable()
+            self._profile.dump_stats(f"{stem}.prof")
+            Path(f"{stem}.txt").write_text(_cprofile_summary(self._profile))
+        print(f"{datetime.now()} → Profile written to {stem}.* — profiling off")
+        self.active, self._sampler, self._profile = None, None, None
+
+
+def _parse_setting(key: str, value: str, defaults: dict):
+    """One control-file override, converted to its default's type; ValueError if it is not valid."""
+    if key not in defaults:
+        raise ValueError(f"unknown setting, expected one of {', '.join(defaults)}")
+    if key == "mode":
+        if value not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}")
+        return value
+    parsed = type(defaults[key])(value)
+    if not parsed > 0:
+        raise ValueError(f"{key} must be positive")
+    return parsed
+
+
+def _cprofile_summary(profile) -> str:
+    """Per-module cumulative time plus the pstats tables sorted by own and cumulative time."""
+    import pstats
+    stats = pstats.Stats(profile)
+    modules = {}
+    for (filename, _, _), (_, _, own, _, _) in stats.stats.items():
+        module = module_of(filename) if os.path.sep in filename or filename.endswith(".py") else "builtins"
+        modules[module] = modules.get(module, 0.0) + own
+    lines = [f"{stats.total_tt:.3f} s profiled", "", "own time by module:"]
+    others = sorted((m for m in modules if m not in FOCUS_MODULES), key=modules.get, reverse=True)
+    for module in FOCUS_MODULES + tuple(others):
+        lines.append(f"    {module:<20} {modules.get(module, 0.0):8.3f} s")
+    out = io.StringIO()
+    stats.stream = out
+    stats.sort_stats("tottime").print_stats(SUMMARY_TOP)
+    stats.sort_stats("cumulative").print_stats(SUMMARY_TOP)
+    return "\n".join(lines) + "\n\n" + out.getvalue()
@@ -0,0 +1,252 @@
+# regime_thresholds.py
+# Per-symbol, per-session regime thresholds from streaming quantiles. The fixed pip thresholds in
+# market_engine mean different things on EURUSD, USDJPY and XAUUSD; here every threshold is a
+# quantile (config.REGIME_QUANTILES) of the symbol's own ATR or EMA-spread pips in the session the
+# bar belongs to. Each quantile is a P² estimator (five markers, O(1) memory and update) fed one
+# closed bar at a time, seeded in batch from history and kept in the state snapshot.
+#
+#   Live:     thresholds = REGIME_THRESHOLDS.on_frames(frames)   # then scan_market_regimes(..., thresholds=)
+#   Seed:     REGIME_THRESHOLDS.seed("EURUSD", history_store.load_candles("EURUSD", "M5"))
+#   Backtest: run_backtest(df, point=p, thresholds=REGIME_THRESHOLDS.series("EURUSD", df.index))
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from config import REGIME_QUANTILES, REGIME_MIN_SAMPLES, REGIME_SEED_BARS, TIMEFRAME
+from market_engine import (EMA_FAST_SPAN, EMA_SLOW_SPAN, ATR_WINDOW, MIN_REGIME_CANDLES, FIXED_THRESHOLDS,
+                           symbol_point)
+from sessions import session_labels
+from state_store import register_state
+
+SESSION_OFF = "OFF"
+
+
+# ------------------ P² Quantile ------------------ #
+class P2Quantile:
+    """
+    Streaming estimate of one quantile (Jain & Chlamtac's P² algorithm): five markers at the
+    minimum, q/2, q, (1+q)/2 and maximum, moved by piecewise-parabolic interpolation.
+    """
+
+    __slots__ = ("q", "n", "heights", "positions", "desired", "increments")
+
+    def __init__(self, q: float):
+        self.q = q
+        self.n = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.increments = [0.0, q / 2, q, (1 + q) / 2, 1.0]
+        self.desired = [1.0, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5.0]
+
+    def update(self, x: float):
+        self.n += 1
+        h = self.heights
+        if self.n <= 5:
+            h.append(x)
+            if self.n == 5:
+                h.sort()
+            return
+
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= h[k + 1]:
+                k += 1
+        n, desired = self.positions, self.desired
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = h[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+                if h[i - 1] < parabolic < h[i + 1]:
+                    h[i] = parabolic
+                else:
+                    h[i] += d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def seed(self, values: np.ndarray):
+        """Replace the estimate with the exact markers of a batch (any size; >= 5 for P² state)."""
+        values = np.asarray(values, dtype=float)
+        values = values[np.isfinite(values)]
+        self.__init__(self.q)
+        if len(values) < 5:
+            for x in values:
+                self.update(float(x))
+            return
+        m = len(values)
+        positions = np.rint(1 + (m - 1) * np.array(self.increments)).astype(int)
+        for i in (1, 2, 3):  # markers need distinct positions
+            positions[i] = min(max(positions[i], positions[i - 1] + 1), m - 4 + i)
+        self.n = m
+        self.positions = positions.tolist()
+        self.heights = np.partition(values, positions - 1)[positions - 1].tolist()
+        self.desired = (1 + (m - 1) * np.array(self.increments)).tolist()
+
+    def value(self) -> float:
+        if self.n >= 5:
+            return self.heights[2]
+        return float(np.quantile(self.heights, self.q)) if self.heights else float("nan")
+
+    def get_state(self) -> tuple:
+        return self.q, self.n, list(self.heights), list(self.positions), list(self.desired)
+
+    @classmethod
+    def from_state(cls, state: tuple) -> "P2Quantile":
+        q, n, heights, positions, desired = state
+        estimator = cls(q)
+        estimator.n, estimator.heights, estimator.positions, estimator.desired = n, list(heights), list(positions), list(desired)
+        return estimator
+
+
+# ------------------ Regime Thresholds ------------------ #
+def bar_features(df: pd.DataFrame, point: float) -> dict:
+    """ATR and EMA-spread pips of every bar as detect_market_regime sees them; NaN during warm-up."""
+    pip = point * 10
+    ema_fast = df['close'].ewm(span=EMA_FAST_SPAN, adjust=False).mean().to_numpy()
+    ema_slow = df['close'].ewm(span=EMA_SLOW_SPAN, adjust=False).mean().to_numpy()
+    features = {
+        "atr": (df['high'] - df['low']).rolling(ATR_WINDOW).mean().to_numpy() / pip,
+        "ema_spread": np.abs(ema_fast - ema_slow) / pip,
+    }
+    for values in features.values():
+        values[:MIN_REGIME_CANDLES - 1] = np.nan
+    return features
+
+
+def _sessions(index) -> np.ndarray:
+    labels = session_labels(index)
+    labels[labels == ""] = SESSION_OFF
+    return labels
+
+
+class RegimeThresholds:
+    """
+    P² estimators per (symbol, session) for every threshold in `quantiles`. A session's quantiles
+    replace FIXED_THRESHOLDS once it has `min_samples` closed bars.
+    """
+
+    def __init__(self, quantiles: dict = REGIME_QUANTILES, min_samples: int = REGIME_MIN_SAMPLES):
+        self.quantiles = dict(quantiles)
+        self.min_samples = min_samples
+        self.estimators = {}  # (symbol, session) -> {threshold name: P2Quantile}
+        self.last_bar = {}    # symbol -> open time (epoch seconds) of the newest closed bar seen
+
+    def _estimators(self, symbol: str, session: str) -> dict:
+        key = (symbol, session)
+        if key not in self.estimators:
+            self.estimators[key] = {name: P2Quantile(q) for name, (_, q) in self.quantiles.items()}
+        return self.estimators[key]
+
+    def samples(self, symbol: str, session: str) -> int:
+        estimators = self.estimators.get((symbol, session))
+        return min(e.n for e in estimators.values()) if estimators else 0
+
+    def update(self, symbol: str, session: str, features: dict):
+        """Add one closed bar's {"atr": pips, "ema_spread": pips}."""
+        for name, estimator in self._estimators(symbol, session).items():
+            estimator.update(features[self.quantiles[name][0]])
+
+    def on_bars(self, symbol: str, df: pd.DataFrame, point: float = None):
+        """Feed the closed bars of `df` (last row = forming bar) not seen before."""
+        if len(df) < 2:
+            return
+        times = np.asarray(df.index, dtype="datetime64[s]").astype(np.int64)
+        last = self.last_bar.get(symbol)
+        if last is not None and times[-2] <= last:
+            return  # no new closed bar; the common case between bar closes
+        closed = df.iloc[:-1]
+        new = np.flatnonzero(times[:-1] > last) if last is not None else np.arange(len(closed))
+        features = bar_features(closed, point or symbol_point(symbol))
+        sessions = _sessions(closed.index[new])
+        for i, session in zip(new, sessions):
+            bar = {name: values[i] for name, values in features.items()}
+            if all(np.isfinite(v) for v in bar.values()):
+                self.update(symbol, session, bar)
+        self.last_bar[symbol] = int(times[-2])
+
+    def seed(self, symbol: str, df: pd.DataFrame, point: float = None):
+        """Batch-initialize a symbol's estimators from a history of closed bars (replaces their state)."""
+        features = bar_features(df, point or symbol_point(symbol))
+        sessions = _sessions(df.index)
+        valid = np.isfinite(features["atr"]) & np.isfinite(features["ema_spread"])
+        for session in np.unique(sessions[valid]):
+            mask = valid & (sessions == session)
+            for name, estimator in self._estimators(symbol, session).items():
+                estimator.seed(features[self.quantiles[name][0]][mask])
+        if len(df):
+            newest = int(np.asarray(df.index[-1:], dtype="datetime64[s]").astype(np.int64)[0])
+            self.last_bar[symbol] = max(self.last_bar.get(symbol, newest), newest)
+        ranges = ", ".join(f"{s} {t['consolidation']:.1f}-{t['volatile']:.1f}"
+                           for s, t in ((s, self.thresholds(symbol, s)) for s in np.unique(sessions[valid])))
+        print(f"{datetime.now()} [{symbol}] → Regime thresholds seeded from {int(valid.sum())} bars (ATR pips: {ranges})")
+
+    def seed_from_broker(self, bot_mt5, symbols, n: int = REGIME_SEED_BARS, timeframe: str = TIMEFRAME):
+        """Seed symbols that have no estimators yet (e.g. no snapshot) from the broker's history."""
+        from strategy_engine import rates_to_candles
+
+        seeded = {symbol for symbol, _ in self.estimators}
+        for symbol in symbols:
+            if symbol in seeded:
+                continue
+            try:
+                self.seed(symbol, rates_to_candles(bot_mt5.safe_candles(symbol, timeframe, n)), symbol_point(symbol, bot_mt5))
+            except Exception as e:
+                print(f"{datetime.now()} [{symbol}] → Regime threshold seeding failed, fixed thresholds until enough bars: {e}")
+
+    def thresholds(self, symbol: str, session: str) -> dict:
+        """Pip thresholds by name for a symbol and session; FIXED_THRESHOLDS until min_samples bars."""
+        if self.samples(symbol, session) < self.min_samples:
+            return FIXED_THRESHOLDS
+        estimators = self.estimators[(symbol, session)]
+        return {**FIXED_THRESHOLDS, **{name: estimators[name].value() for name in estimators}}
+
+    def current(self, symbol: str, df: pd.DataFrame) -> dict:
+        """Thresholds for the session of df's last (forming) bar."""
+        return self.thresholds(symbol, _sessions(df.index[-1:])[0])
+
+    def on_frames(self, frames: dict, points: dict = None) -> dict:
+        """Feed every symbol's new closed bars; returns {symbol: current thresholds} for scan_market_regimes."""
+        points = points or {}
+        for symbol, df in frames.items():
+            self.on_bars(symbol, df, points.get(symbol))
+        return {symbol: self.current(symbol, df) for symbol, df in frames.items()}
+
+    def series(self, symbol: str, index) -> dict:
+        """Per-bar threshold arrays (each bar's session) for regime_series, from the current estimates."""
+        sessions = _sessions(index)
+        out = {name: np.full(len(sessions), value, dtype=float) for name, value in FIXED_THRESHOLDS.items()}
+        for session in np.unique(sessions):
+            mask = sessions == session
+            for name, value in self.thresholds(symbol, session).items():
+                out[name][mask] = value
+        return out
+
+    def get_state(self) -> dict:
+        return {
+            "estimators": {key: {name: e.get_state() for name, e in estimators.items()} for key, estimators in self.estimators.items()},
+            "last_bar": dict(self.last_bar),
+        }
+
+    def set_state(self, state: dict):
+        for key, estimators in state["estimators"].items():
+            restored = {name: P2Quantile.from_state(s) for name, s in estimators.items()
+                        if name in self.quantiles and s[0] == self.quantiles[name][1]}
+            if len(restored) == len(self.quantiles):  # quantile settings changed: start over
+                self.estimators[key] = restored
+        self.last_bar.update({symbol: t for symbol, t in state["last_bar"].items()
+                              if any(key[0] == symbol for key in self.estimators)})
+
+
+REGIME_THRESHOLDS = RegimeThresholds()
+register_state("regime_thresholds", REGIME_THRESHOLDS.get_state, REGIME_THRESHOLDS.set_state)
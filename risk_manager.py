@@ -1,7 +1,9 @@
 from config import DAILY_DRAWDOWN_LIMIT, RISK_PER_TRADE, LOTS_MIN, LOTS_MAX, SL_POINTS
+import threading
 from datetime import datetime
 import pandas as pd
 from alerts import send_alert
+from state_store import register_state
 
 def calc_lot_size(bot_mt5, symbol, sl_points: float = SL_POINTS, risk_percent: float = RISK_PER_TRADE) -> float:
     balance = bot_mt5.safe_account_info().balance
@@ -20,64 +22,100 @@ def calc_lot_size(bot_mt5, symbol, sl_points: float = SL_POINTS, risk_percent: f
 DAILY_PEAK_EQUITY = None
 DAILY_DATE = None
 DD_ALERT_SENT = False # Global alert flag to avoid spamming emails repeatedly in one day
+RISK_LOCK = threading.Lock()        # the equity watchdog thread and the main loop both update the state
+TRADING_HALTED = threading.Event()  # set on a breach: no new entries until the next day
 
-def daily_drawdown_check(bot_mt5) -> bool:
+
+def _get_risk_state() -> dict:
+    with RISK_LOCK:
+        return {"daily_peak_equity": DAILY_PEAK_EQUITY, "daily_date": DAILY_DATE, "dd_alert_sent": DD_ALERT_SENT}
+
+
+def _set_risk_state(state: dict):
+    # A baseline from a previous day is reset by the next update_drawdown anyway
+    global DAILY_PEAK_EQUITY, DAILY_DATE, DD_ALERT_SENT
+    with RISK_LOCK:
+        DAILY_PEAK_EQUITY = state["daily_peak_equity"]
+        DAILY_DATE = state["daily_date"]
+        DD_ALERT_SENT = state["dd_alert_sent"]
+        if DD_ALERT_SENT and DAILY_DATE == datetime.now().date():
+            TRADING_HALTED.set()  # the limit was hit earlier today
+
+
+register_state("risk", _get_risk_state, _set_risk_state)
+
+def update_drawdown(equity: float, now: datetime = None) -> tuple[float, float, bool]:
     """
-    Check daily drawdown and send email alert if limit is exceeded.
-    Returns True if drawdown limit exceeded.
+    Fold one equity reading into today's peak; a breach sets TRADING_HALTED for the rest of the day.
+    Returns (peak, drawdown %, first) where `first` is True only for the reading that first
+    crossed the limit today (the caller sends the alert).
     """
-
     global DAILY_PEAK_EQUITY, DAILY_DATE, DD_ALERT_SENT
 
-    now = datetime.now()
-    account_info = bot_mt5.safe_account_info()
-    equity = account_info.equity
+    now = now or datetime.now()
+    with RISK_LOCK:
+        # Reset at new day
+        if DAILY_DATE != now.date():
+            DAILY_DATE = now.date()
+            DAILY_PEAK_EQUITY = equity
+            DD_ALERT_SENT = False  # reset alert flag for new day
+            TRADING_HALTED.clear()
 
-    # Reset at new day
-    if DAILY_DATE != now.date():
-        DAILY_DATE = now.date()
-        DAILY_PEAK_EQUITY = equity
-        DD_ALERT_SENT = False  # reset alert flag for new day
+        # Update peak
+        if equity > DAILY_PEAK_EQUITY:
+            DAILY_PEAK_EQUITY = equity
 
-    # Update peak
-    if equity > DAILY_PEAK_EQUITY:
-        DAILY_PEAK_EQUITY = equity
+        # Real drawdown
+        drawdown_pct = (equity - DAILY_PEAK_EQUITY) / DAILY_PEAK_EQUITY * 100
+        first = False
+        if drawdown_pct <= -DAILY_DRAWDOWN_LIMIT * 100:
+            TRADING_HALTED.set()
+            first = not DD_ALERT_SENT
+            DD_ALERT_SENT = True  # prevent multiple emails on same day
+        return DAILY_PEAK_EQUITY, drawdown_pct, first
 
-    # Real drawdown
-    drawdown_pct = (equity - DAILY_PEAK_EQUITY) / DAILY_PEAK_EQUITY * 100
 
-    print(
-        f"{now} → Equity: {equity:.2f}, "
-        f"Peak: {DAILY_PEAK_EQUITY:.2f}, "
-        f"DD: {drawdown_pct:.2f}% "
-        f"(Limit: -{DAILY_DRAWDOWN_LIMIT*100:.2f}%)"
-    )
+def drawdown_alert(equity: float, peak: float, drawdown_pct: float, now: datetime = None):
+    now = now or datetime.now()
+    subject = "⚠ DAILY DRAWDOWN LIMIT HIT"
+    message = f"""
+    PRO ICT Trading Bot Alert
 
-    # If drawdown exceeds limit and email not sent yet
-    if drawdown_pct <= -DAILY_DRAWDOWN_LIMIT * 100 and not DD_ALERT_SENT:
-        subject = "⚠ DAILY DRAWDOWN LIMIT HIT"
-        message = f"""
-        PRO ICT Trading Bot Alert
+    Date: {now.date()}
+    Time: {now.time()}
 
-        Date: {now.date()}
-        Time: {now.time()}
+    Daily Drawdown Limit Exceeded!
 
-        Daily Drawdown Limit Exceeded!
+    Current Equity: {equity:.2f}
+    Peak Equity Today: {peak:.2f}
+    Drawdown: {drawdown_pct:.2f}% (Limit: -{DAILY_DRAWDOWN_LIMIT*100:.2f}%)
 
-        Current Equity: {equity:.2f}
-        Peak Equity Today: {DAILY_PEAK_EQUITY:.2f}
-        Drawdown: {drawdown_pct:.2f}% (Limit: -{DAILY_DRAWDOWN_LIMIT*100:.2f}%)
+    Trading has been disabled for today.
 
-        Trading has been disabled for today.
+    -- PRO ICT Trading Bot
+    """
+    send_alert(subject, message)
 
-        -- PRO ICT Trading Bot
-        """
-        send_alert(subject, message)
-        DD_ALERT_SENT = True  # prevent multiple emails on same day
 
-    # Return True if drawdown exceeded
-    return drawdown_pct <= -DAILY_DRAWDOWN_LIMIT * 100
+def daily_drawdown_check(bot_mt5) -> bool:
+    """
+    Check daily drawdown and send email alert if limit is exceeded.
+    Returns True while trading is halted for the day (by this check or the equity watchdog).
+    """
+    now = datetime.now()
+    account_info = bot_mt5.safe_account_info()
+    equity = account_info.equity
+    peak, drawdown_pct, first = update_drawdown(equity, now)
+
+    print(
+        f"{now} → Equity: {equity:.2f}, "
+        f"Peak: {peak:.2f}, "
+        f"DD: {drawdown_pct:.2f}% "
+        f"(Limit: -{DAILY_DRAWDOWN_LIMIT*100:.2f}%)"
+    )
 
-   
+    # If drawdown exceeds limit and email not sent yet
+    if first:
+        drawdown_alert(equity, peak, drawdown_pct, now)
 
-    
\ No newline at end of file
+    return TRADING_HALTED.is_set()
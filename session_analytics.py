@@ -0,0 +1,127 @@
+# session_analytics.py
+# Evidence for tuning KILL_ZONES per symbol: every historical bar and every backtested or
+# journaled trade is tagged with its session (kill zone or OFF), weekday, hour and hour of week
+# in New York time (sessions.session_tags, one vectorized timezone conversion), then signal
+# frequency, win rate, expectancy, ATR and spread are aggregated per symbol x session x weekday
+# (or any other grouping of the tags, e.g. by="hour" to see where a window should start and end).
+#
+#   grid = session_study({"EURUSD": df})                       # signals + backtest in every hour
+#   hours = session_study({"EURUSD": df}, by=("hour",))
+#   live = session_grid({}, {"EURUSD": tag_trades(trade_outcomes("EURUSD"), tz=LOCAL_TIMEZONE)})
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from config import SYMBOLS, BROKER_TIMEZONE
+from ict_model import ICTModel, SIGNAL_WINDOW
+from market_engine import ATR_WINDOW, symbol_point
+from sessions import session_tags
+
+GRID_KEYS = ("session", "weekday")
+TAG_COLUMNS = ("session", "weekday", "hour", "hour_of_week")
+SESSION_OFF = "OFF"
+# logger.py stamps journals with the bot machine's clock (datetime.now())
+LOCAL_TIMEZONE = datetime.now().astimezone().tzinfo
+
+
+# ------------------ Tagging ------------------ #
+def tag_bars(df: pd.DataFrame, point: float, allow_momentum: bool = True, window: int = SIGNAL_WINDOW,
+             tz=BROKER_TIMEZONE) -> pd.DataFrame:
+    """
+    Session tags per bar plus whether the ICT model signals on it (ict_model.run_batch), the
+    regime ATR (mean high-low over ATR_WINDOW bars) and the bar's spread, both in points.
+    """
+    tags = session_tags(df.index, tz, outside=SESSION_OFF)
+    tags["signal"] = ICTModel(allow_momentum, window).run_batch(df)['direction'].to_numpy() != 0
+    tags["atr_points"] = (df['high'] - df['low']).rolling(ATR_WINDOW).mean().to_numpy() / point
+    tags["spread_points"] = df['spread'].to_numpy(dtype=float) if 'spread' in df else np.nan
+    return tags
+
+
+def tag_trades(trades: pd.DataFrame, time_col: str = None, tz=BROKER_TIMEZONE) -> pd.DataFrame:
+    """
+    Trades with the session tags of their entry: run_backtest trades (entry_time, broker time)
+    or analytics.trade_outcomes (open_time; pass tz=LOCAL_TIMEZONE).
+    """
+    if trades.empty:
+        return trades.assign(**{col: pd.Series(dtype=object) for col in TAG_COLUMNS})
+    time_col = time_col or ("entry_time" if "entry_time" in trades else "open_time")
+    trades = trades[trades[time_col].notna()]
+    tags = session_tags(trades[time_col], tz, outside=SESSION_OFF)
+    return trades.assign(**{col: tags[col].to_numpy() for col in TAG_COLUMNS})
+
+
+# ------------------ Aggregation ------------------ #
+def _trade_stats(trades: pd.DataFrame, keys: list) -> pd.DataFrame:
+    r = trades["r_multiple"] if "r_multiple" in trades else pd.Series(np.nan, index=trades.index)
+    outcome = trades["profit"] if "profit" in trades else r
+    stats = pd.DataFrame({key: trades[key] for key in keys}).assign(
+        trades=1, win=(outcome > 0).astype(float), r_multiple=r.astype(float))
+    aggs = dict(trades=("trades", "sum"), win_rate=("win", "mean"), expectancy_r=("r_multiple", "mean"))
+    if "profit" in trades:
+        stats["profit"] = trades["profit"].astype(float)
+        aggs["expectancy"] = ("profit", "mean")
+    return stats.groupby(keys, observed=True).agg(**aggs)
+
+
+def session_grid(bars: dict, trades: dict = None, by=GRID_KEYS) -> pd.DataFrame:
+    """
+    Per symbol x `by` (any of TAG_COLUMNS): bars, signals, signal_rate (signals per bar),
+    avg_atr_points and avg_spread_points from tag_bars output, and trades, win_rate,
+    expectancy_r (mean R) and expectancy (mean profit, journaled trades) from tag_trades output.
+    """
+    keys = ["symbol", *by]
+    parts = []
+    frames = [tags.assign(symbol=symbol) for symbol, tags in bars.items() if len(tags)]
+    if frames:
+        tagged = pd.concat(frames, ignore_index=True)
+        bar_stats = tagged.groupby(keys, observed=True).agg(
+            bars=("signal", "size"),
+            signals=("signal", "sum"),
+            avg_atr_points=("atr_points", "mean"),
+            avg_spread_points=("spread_points", "mean"),
+        )
+        bar_stats.insert(2, "signal_rate", bar_stats["signals"] / bar_stats["bars"])
+        parts.append(bar_stats)
+
+    frames = [t.assign(symbol=symbol) for symbol, t in (trades or {}).items() if len(t)]
+    if frames:
+        parts.append(_trade_stats(pd.concat(frames, ignore_index=True), keys))
+
+    if not parts:
+        return pd.DataFrame()
+    grid = pd.concat(parts, axis=1).sort_index()
+    if "trades" in grid:
+        grid["trades"] = grid["trades"].fillna(0).astype(int)
+    return grid
+
+
+def session_study(candles: dict, points: dict = None, by=GRID_KEYS, allow_momentum: bool = True,
+                  window: int = SIGNAL_WINDOW, tz=BROKER_TIMEZONE, cache=None) -> pd.DataFrame:
+    """
+    session_grid over candle histories ({symbol: get_candles-layout DataFrame}) with the trades of a
+    backtest that ignores the current kill zones (session_filter=False), so every hour has evidence.
+    """
+    from backtest import run_backtest
+
+    bars, trades = {}, {}
+    for symbol, df in candles.items():
+        point = (points or {}).get(symbol) or symbol_point(symbol)
+        bars[symbol] = tag_bars(df, point, allow_momentum, window, tz)
+        result, _ = run_backtest(df, allow_momentum=allow_momentum, point=point, session_filter=False,
+                                 window=window, cache=cache)
+        trades[symbol] = tag_trades(result, "entry_time", tz)
+    return session_grid(bars, trades, by)
+
+
+def journal_grid(symbols=SYMBOLS, by=GRID_KEYS) -> pd.DataFrame:
+    """session_grid of the live trades in the logger journals."""
+    from analytics import trade_outcomes
+
+    trades = {symbol: tag_trades(trade_outcomes(symbol), "open_time", LOCAL_TIMEZONE) for symbol in symbols}
+    return session_grid({}, trades, by)
+
+
+if __name__ == "__main__":
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_rows", 500)
+    print(journal_grid())
@@ -0,0 +1,169 @@
+# sessions.py
+# Single source of truth for kill-zone timing: live checks, the scheduler and backtest masks.
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, date, time as dt_time, timedelta
+from functools import lru_cache
+from pytz import timezone, utc
+from config import KILL_ZONES, SESSION_TIMEZONE, BROKER_TIMEZONE, CHECK_INTERVAL, OFF_SESSION_INTERVAL
+
+
+def _parse_hhmm(value: str) -> dt_time:
+    hours, minutes = value.split(":")
+    return dt_time(int(hours), int(minutes))
+
+
+def _utc_now() -> datetime:
+    return datetime.now(utc)
+
+
+# ------------------ Daily Windows ------------------ #
+@lru_cache(maxsize=16)
+def kill_zone_windows(day: date) -> tuple:
+    """
+    Kill-zone windows for a New York calendar day as (name, start_utc, end_utc) tuples.
+    Localized through the session timezone, so DST shifts are handled per day.
+    """
+    session_tz = timezone(SESSION_TIMEZONE)
+    windows = []
+    for name, (start, end) in KILL_ZONES.items():
+        start_utc = session_tz.localize(datetime.combine(day, _parse_hhmm(start))).astimezone(utc)
+        end_utc = session_tz.localize(datetime.combine(day, _parse_hhmm(end))).astimezone(utc)
+        windows.append((name, start_utc, end_utc))
+    return tuple(windows)
+
+
+def _session_day(now: datetime) -> date:
+    return now.astimezone(timezone(SESSION_TIMEZONE)).date()
+
+
+def current_kill_zone(now: datetime = None) -> str | None:
+    """Name of the kill zone `now` (aware, defaults to current UTC time) falls in, else None."""
+    now = now or _utc_now()
+    for name, start, end in kill_zone_windows(_session_day(now)):
+        if start <= now <= end:
+            return name
+    return None
+
+
+def in_kill_zone(now: datetime = None) -> bool:
+    """True if `now` falls inside any configured KILL_ZONES window."""
+    return current_kill_zone(now) is not None
+
+
+def kill_zone_at(bar_time, tz: str = BROKER_TIMEZONE):
+    """
+    The kill-zone window (name, start_utc, end_utc) a bar timestamp falls in, else None.
+    Naive timestamps are in `tz`; scalar counterpart of session_labels.
+    """
+    stamp = pd.Timestamp(bar_time)
+    if stamp.tz is None:
+        stamp = stamp.tz_localize(tz)
+    now = stamp.tz_convert(utc).to_pydatetime()
+    for window in kill_zone_windows(_session_day(now)):
+        if window[1] <= now <= window[2]:
+            return window
+    return None
+
+
+def next_kill_zone(now: datetime = None):
+    """The current or next kill zone as (name, start_utc, end_utc)."""
+    now = now or _utc_now()
+    day = _session_day(now)
+    for offset in range(8):
+        for window in kill_zone_windows(day + timedelta(days=offset)):
+            if window[2] >= now:
+                return window
+    return None
+
+
+def seconds_until_next_kill_zone(now: datetime = None) -> float:
+    now = now or _utc_now()
+    _, start, _ = next_kill_zone(now)
+    return max(0.0, (start - now).total_seconds())
+
+
+# ------------------ Vectorized Session Tagging ------------------ #
+def _session_local(index, tz: str = BROKER_TIMEZONE) -> pd.DatetimeIndex:
+    """Timestamps in the session timezone (naive timestamps are in `tz`)."""
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        index = index.tz_localize(tz, ambiguous="NaT", nonexistent="shift_forward")
+    return index.tz_convert(SESSION_TIMEZONE)
+
+
+def _session_seconds(index, tz: str = BROKER_TIMEZONE) -> np.ndarray:
+    """Seconds since New York midnight for each timestamp (naive timestamps are in `tz`)."""
+    local = _session_local(index, tz)
+    return (local.hour * 3600 + local.minute * 60 + local.second).to_numpy()
+
+
+def session_labels(index, tz: str = BROKER_TIMEZONE) -> np.ndarray:
+    """
+    Kill-zone name per timestamp ('' outside kill zones) for backtests and analytics.
+    On a shared boundary the earlier zone in KILL_ZONES wins.
+    """
+    return _labels_from_seconds(_session_seconds(index, tz))
+
+
+def session_tags(index, tz: str = BROKER_TIMEZONE, outside: str = "OFF") -> pd.DataFrame:
+    """
+    Session (kill zone, `outside` elsewhere), weekday (0 = Monday), hour and hour of week
+    (0-167) in the session timezone per timestamp, from one timezone conversion.
+    """
+    local = _session_local(index, tz)
+    hour = local.hour.to_numpy()
+    weekday = local.weekday.to_numpy()
+    seconds = hour * 3600 + local.minute.to_numpy() * 60 + local.second.to_numpy()
+    labels = _labels_from_seconds(seconds)
+    labels[labels == ""] = outside
+    return pd.DataFrame({"session": labels, "weekday": weekday, "hour": hour, "hour_of_week": weekday * 24 + hour},
+                        index=pd.DatetimeIndex(index))
+
+
+def _labels_from_seconds(seconds: np.ndarray) -> np.ndarray:
+    labels = np.full(len(seconds), "", dtype=object)
+    for name, (start, end) in reversed(list(KILL_ZONES.items())):
+        start_t, end_t = _parse_hhmm(start), _parse_hhmm(end)
+        lo = start_t.hour * 3600 + start_t.minute * 60
+        hi = end_t.hour * 3600 + end_t.minute * 60
+        labels[(seconds >= lo) & (seconds <= hi)] = name
+    return labels
+
+
+def kill_zone_mask(index, tz: str = BROKER_TIMEZONE) -> np.ndarray:
+    """Boolean mask of timestamps inside any kill zone; vectorized equivalent of in_kill_zone."""
+    return session_labels(index, tz) != ""
+
+
+def session_config() -> dict:
+    """The session settings behind the masks above; part of the backtest cache key."""
+    return {"kill_zones": KILL_ZONES, "session_timezone": SESSION_TIMEZONE, "broker_timezone": BROKER_TIMEZONE}
+
+
+# ------------------ Scheduler ------------------ #
+class SessionScheduler:
+    """
+    Decides how long the main loop sleeps.
+    Inside a kill zone it polls every `check_interval`; outside it sleeps straight to the
+    next window, waking at least every `off_session_interval` for housekeeping
+    (position management, drawdown checks).
+    """
+    def __init__(self, check_interval=CHECK_INTERVAL, off_session_interval=OFF_SESSION_INTERVAL, clock=_utc_now, sleep=time.sleep):
+        self.check_interval = check_interval
+        self.off_session_interval = off_session_interval
+        self.clock = clock
+        self.sleep = sleep
+
+    def in_session(self) -> bool:
+        return in_kill_zone(self.clock())
+
+    def next_sleep(self) -> float:
+        now = self.clock()
+        if in_kill_zone(now):
+            return self.check_interval
+        return max(1.0, min(self.off_session_interval, seconds_until_next_kill_zone(now)))
+
+    def wait(self):
+        self.sleep(self.next_sleep())
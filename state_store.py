@@ -0,0 +1,90 @@
+# state_store.py
+# Periodic atomic snapshots of runtime state so the bot can warm-restart after a crash or deploy.
+import os
+import pickle
+import time
+from datetime import datetime
+from pathlib import Path
+from config import STATE_SNAPSHOT_PATH, STATE_SNAPSHOT_INTERVAL
+
+SNAPSHOT_VERSION = 1
+
+# name -> (get_state, set_state); modules register their own state at import time
+_COMPONENTS = {}
+_LAST_SNAPSHOT = 0.0
+
+
+def register_state(name: str, get_state, set_state):
+    """
+    Register a piece of runtime state for snapshots.
+    get_state() must return picklable data; set_state(data) restores it.
+    """
+    _COMPONENTS[name] = (get_state, set_state)
+
+
+def save_snapshot(path=STATE_SNAPSHOT_PATH) -> bool:
+    """Write all registered state to `path` atomically (temp file + rename)."""
+    global _LAST_SNAPSHOT
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    state = {}
+    for name, (get_state, _) in _COMPONENTS.items():
+        try:
+            state[name] = get_state()
+        except Exception as e:
+            print(f"{datetime.now()} → Snapshot of '{name}' failed: {e}")
+
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"version": SNAPSHOT_VERSION, "saved_at": datetime.now(), "state": state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"{datetime.now()} → Failed to write state snapshot: {e}")
+        return False
+
+    _LAST_SNAPSHOT = time.monotonic()
+    return True
+
+
+def maybe_save_snapshot(interval=STATE_SNAPSHOT_INTERVAL, path=STATE_SNAPSHOT_PATH) -> bool:
+    """Save a snapshot if at least `interval` seconds passed since the last one."""
+    if time.monotonic() - _LAST_SNAPSHOT < interval:
+        return False
+    return save_snapshot(path)
+
+
+def restore_snapshot(path=STATE_SNAPSHOT_PATH) -> bool:
+    """
+    Restore registered state from the last snapshot, if any.
+    Components are restored independently; a bad entry never blocks startup.
+    """
+    path = Path(path)
+    if not path.exists():
+        print(f"{datetime.now()} → No state snapshot found — cold start")
+        return False
+
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except Exception as e:
+        print(f"{datetime.now()} → Unreadable state snapshot ({e}) — cold start")
+        return False
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        print(f"{datetime.now()} → State snapshot version {snapshot.get('version')} not supported — cold start")
+        return False
+
+    for name, data in snapshot["state"].items():
+        if name not in _COMPONENTS:
+            continue
+        try:
+            _COMPONENTS[name][1](data)
+        except Exception as e:
+            print(f"{datetime.now()} → Restoring '{name}' failed: {e}")
+
+    print(f"{datetime.now()} → Warm restart from snapshot saved at {snapshot['saved_at']}")
+    return True
@@ -0,0 +1,46 @@
+# strategies.py
+# Several strategy configurations (config.STRATEGIES) side by side on one data feed. bot.run fetches
+# candles, ticks and regimes once per cycle and each symbol's higher-timeframe candles and ICT model
+# run once (GateContext.shared); every instance then only adds its own gate decisions, and trades
+# and manages positions under its own magic number.
+from config import STRATEGIES, TRADE_GATES
+from gates import GatePipeline, DEFAULT_GATES, default_providers
+
+# Management profile for positions no configured strategy owns (e.g. manual trades)
+DEFAULT_MOVE_PCT = 0.4      # breakeven at 40% of the way to TP
+DEFAULT_PARTIAL_PCT = 0.5   # close half at PARTIAL_TP_PCT
+
+
+class Strategy:
+    """One configured instance: signal variant, enabled gates, management profile and magic number."""
+
+    def __init__(self, name: str, magic: int, allow_momentum: bool = True, move_pct: float = DEFAULT_MOVE_PCT,
+                 partial_pct: float = DEFAULT_PARTIAL_PCT, gates: dict = None, providers: dict = None):
+        self.name = name
+        self.magic = magic
+        self.allow_momentum = allow_momentum
+        self.move_pct = move_pct
+        self.partial_pct = partial_pct
+        self.gates = GatePipeline(DEFAULT_GATES, {**TRADE_GATES, **(gates or {})}, name=name)
+        self.providers = providers
+
+    def own(self, positions) -> list:
+        """This instance's positions among a symbol's open positions."""
+        return [pos for pos in positions or () if pos.magic == self.magic]
+
+
+def load_strategies(bot_mt5, config: dict = STRATEGIES) -> list[Strategy]:
+    """Enabled instances from config; `gates` entries override TRADE_GATES for that instance."""
+    strategies = []
+    for name, params in config.items():
+        params = dict(params)
+        if not params.pop("enabled", True):
+            continue
+        strategy = Strategy(name, **params)
+        strategy.providers = strategy.providers or default_providers(bot_mt5, strategy.allow_momentum)
+        strategies.append(strategy)
+
+    magics = [s.magic for s in strategies]
+    if len(set(magics)) != len(magics):
+        raise ValueError(f"Strategy magic numbers must be unique: {magics}")
+    return strategies
@@ -1,23 +1,11 @@
-import MetaTrader5 as mt5
 import pandas as pd
-from datetime import datetime, time as dt_time
-from pytz import timezone
-from datetime import datetime, time as dt_time
+from datetime import datetime
 from config import TIMEFRAME, RISK_TO_REWARD_RATIO, RISK_PER_TRADE
-from typing import TypedDict, Literal, Optional
-import ta
+from state_store import register_state
+from ict_model import ICTModel, Signal, MIN_SIGNAL_CANDLES, BOS_NAMES, restrict_row, row_to_signal
+from market_structure import StructureTracker, SWEEP_LOOKBACK
 
 # ------------------ Helper Functions ------------------ #
-def in_kill_zone():
-    est = timezone('US/Eastern')
-    now = datetime.now(est).time()
-    # London Open 2AM-5AM (3AM-6AM NGN), NY Open 7AM-10AM (12PM-3PM NGN), London Close 10AM-12PM (11AM-1PM NGN)
-    if (dt_time(2,0) <= now <= dt_time(5,0)) or \
-       (dt_time(7,0) <= now <= dt_time(10,0)) or \
-       (dt_time(10,0) <= now <= dt_time(12,0)):
-        return True
-    return False
-
 def trend_filter(df, direction):
     """200 EMA Trend Filter"""
     ema200 = df['close'].ewm(span=200, adjust=False).mean().iloc[-1]
@@ -39,33 +27,25 @@ def htf_trend_check(df_htf, direction):
         return False  # Don't allow sell if HTF trend is bullish
     return True
 
-def liquidity_sweep(df, session_candles=20, lookback_candles=5):
+def liquidity_sweep(df, symbol=None, lookback_candles=SWEEP_LOOKBACK):
     """
-    Enhanced liquidity sweep detection:
-    - Uses the previous session's high/low (first `session_candles`)
-    - Checks the last `lookback_candles` for price piercing and reversal
+    Liquidity sweep of the previous kill-zone session:
+    - Session high/low come from the symbol's structure tracker (true session boundaries,
+      not the first candles of the fetched window)
+    - Checks the last `lookback_candles` (forming one included) for price piercing and reversal
     - Returns 'BUY' or 'SELL' if sweep conditions are met, else None
+
+    Without a symbol a throwaway tracker is built from `df`; tracked symbols use SWEEP_LOOKBACK.
     """
-    # Define previous session high/low
-    session_high = df['high'].iloc[:session_candles].max()
-    session_low = df['low'].iloc[:session_candles].min()
-    
-    # Check last few candles for sweep + rejection
-    for i in range(-lookback_candles, 0):
-        candle = df.iloc[i]
-        
-        # Bearish liquidity sweep: price pierces session high then closes below it
-        if candle['high'] > session_high and candle['close'] < session_high:
-            return 'SELL'
-        
-        # Bullish liquidity sweep: price pierces session low then closes above it
-        if candle['low'] < session_low and candle['close'] > session_low:
-            return 'BUY'
-    
-    return None
+    tracker = structure_tracker(symbol, df) if symbol else StructureTracker(sweep_lookback=lookback_candles)
+    if not symbol:
+        tracker.on_candles(df)
+    last = df.iloc[-1]
+    return tracker.sweep(last['high'], last['low'], last['close'])
 
 def atr_sl_tp(df, direction, rr_ratio=RISK_TO_REWARD_RATIO):
     """Calculate ATR-based SL and TP"""
+    import ta  # heavy; only needed when a trade is actually sized
     atr = ta.volatility.AverageTrueRange(df['high'], df['low'], df['close'], window=14).average_true_range().iloc[-1]
     last_close = df['close'].iloc[-1]
     if direction == 'BUY':
@@ -115,18 +95,19 @@ def is_inverted_fvg(signal, df: pd.DataFrame) -> bool:
 # This bot will only produce signals when market structure, displacement, and mitigation conditions are satisfied.
 # This is normal ICT behavior — there will be periods of no signal.
 # Make sure the get_candles() function fetches enough historical candles (≥100) so BOS and displacement detection works.
-def get_candles(bot_mt5, symbol, n=200, timeframe=None) -> pd.DataFrame:
-    """
-    Fetch historical candles and return as DataFrame.
+# Last candles per (symbol, timeframe). Refreshed incrementally and kept in the state snapshot,
+# so a warm restart only fetches the bars that formed while the bot was down.
+CANDLE_CACHE = {}
+INCREMENTAL_CANDLES = 3  # bars fetched on refresh; must overlap the cached tail
 
-    Args:
-        bot_mt5: ResilientMT5 instance
-        symbol: string, e.g., "EURUSD"
-        n: number of candles
-        timeframe: optional MT5 timeframe, e.g., mt5.TIMEFRAME_H1
-    """
-    tf = timeframe if timeframe else TIMEFRAME
-    df = bot_mt5.safe_candles(symbol, tf, n)
+
+def _fetch_candles(bot_mt5, symbol, timeframe, n) -> pd.DataFrame:
+    return rates_to_candles(bot_mt5.safe_candles(symbol, timeframe, n))
+
+
+def rates_to_candles(rates) -> pd.DataFrame:
+    """MT5 rates (structured array or DataFrame) in the get_candles layout."""
+    df = pd.DataFrame(rates)
 
     # Ensure numeric types for TA calculations
     df['open'] = df['open'].astype(float)
@@ -141,6 +122,55 @@ def get_candles(bot_mt5, symbol, n=200, timeframe=None) -> pd.DataFrame:
 
     return df
 
+
+def get_candles(bot_mt5, symbol, n=200, timeframe=None) -> pd.DataFrame:
+    """
+    Fetch historical candles and return as DataFrame.
+
+    Args:
+        bot_mt5: ResilientMT5 instance
+        symbol: string, e.g., "EURUSD"
+        n: number of candles
+        timeframe: optional timeframe name, e.g., "H1"
+
+    Only the last few bars are fetched when the cached history still overlaps them;
+    otherwise (first call, gap, restart after a long outage) all n bars are refetched.
+    """
+    tf = timeframe if timeframe else TIMEFRAME
+    key = (symbol, tf)
+
+    cached = CANDLE_CACHE.get(key)
+    if cached is not None and len(cached) >= n:
+        fresh = _fetch_candles(bot_mt5, symbol, tf, INCREMENTAL_CANDLES)
+        if fresh.index[0] <= cached.index[-1]:
+            df = pd.concat([cached[cached.index < fresh.index[0]], fresh]).iloc[-n:]
+            CANDLE_CACHE[key] = df
+            return df
+
+    df = _fetch_candles(bot_mt5, symbol, tf, n)
+    CANDLE_CACHE[key] = df
+    return df
+
+
+register_state("candles", lambda: dict(CANDLE_CACHE), CANDLE_CACHE.update)
+
+# Streaming market structure per symbol, fed with closed entry-timeframe bars
+STRUCTURE = {}
+
+
+def structure_tracker(symbol, df: pd.DataFrame = None) -> StructureTracker:
+    """The symbol's StructureTracker, brought up to date with the closed bars of `df` if given."""
+    tracker = STRUCTURE.get(symbol)
+    if tracker is None:
+        tracker = STRUCTURE[symbol] = StructureTracker()
+    if df is not None:
+        tracker.on_candles(df)
+    return tracker
+
+
+register_state("structure", lambda: dict(STRUCTURE), STRUCTURE.update)
+
+# Per-window reference helpers; ict_model.verify_conformance checks the model against them
 def detect_bos(df: pd.DataFrame, symbol) -> str | None:
     """
     Detect Break of Structure (BOS)
@@ -218,13 +248,7 @@ def find_fvg(df: pd.DataFrame, disp_index: int, direction: str):
 
     return None
 
-class Signal(TypedDict):
-    direction: Literal['BUY', 'SELL']
-    entry_type: Literal['MITIGATION', 'MOMENTUM']
-    type: Literal['FVG', 'OB', 'MOMENTUM']
-    fvg: Optional[tuple[float, float]]  # None if not an FVG
-
-def generate_signal(df: pd.DataFrame, symbol, allow_momentum: bool = True) -> Signal | None:
+def generate_signal(df: pd.DataFrame, symbol, allow_momentum: bool = True, features: dict = None, row: dict = None) -> Signal | None:
     """
     TRUE ICT ENTRY MODEL
     Returns a dict with:
@@ -235,51 +259,34 @@ def generate_signal(df: pd.DataFrame, symbol, allow_momentum: bool = True) -> Si
     
     Parameters:
     - allow_momentum: whether to allow momentum entries (price outside OB/FVG)
+    - features: optional dict, filled with the model's features for the last bar (BOS, displacement, OB, FVG, ...)
+    - row: the last bar's output of a momentum-enabled ICTModel over `df`, if already computed (shared
+      between strategy variants); the model is then not run again
     """
 
-    if len(df) < 100:
+    if len(df) < MIN_SIGNAL_CANDLES:
         print(f"{datetime.now()} [{symbol}] → Not enough candles for signal")
         return None
 
-    bos = detect_bos(df, symbol)
-    if not bos:
-        # print(f"{datetime.now()} [{symbol}] → No BOS found")
+    # Same model the backtester runs in batch; the window is the candles passed in
+    if row is None:
+        signal, row = ICTModel(allow_momentum, window=len(df)).signal_at_last(df)
+    else:
+        row = restrict_row(row, allow_momentum)
+        signal = row_to_signal(row)
+    if features is not None:
+        features.update(row)
+    if not row['bos']:
         return None
-
-    disp_index = find_displacement(df)
-    if disp_index is None:
+    if row['disp'] < 0:
         print(f"{datetime.now()}  [{symbol}] → No displacement found")
         return None
 
-    ob = find_order_block(df, disp_index, bos)
-    fvg = find_fvg(df, disp_index, bos)
-    last_price = df['close'].iloc[-1]
-
-    print(f"{datetime.now()} [{symbol}] → BOS detected: {bos}")
-    print(f"{datetime.now()} [{symbol}] → Displacement index: {disp_index}")
+    ob = None if pd.isna(row['ob_low']) else (row['ob_low'], row['ob_high'])
+    fvg = None if pd.isna(row['fvg_low']) else (row['fvg_low'], row['fvg_high'])
+    print(f"{datetime.now()} [{symbol}] → BOS detected: {BOS_NAMES[row['bos']]}")
+    print(f"{datetime.now()} [{symbol}] → Displacement index: {row['disp']}")
     print(f"{datetime.now()} [{symbol}] → Order block: {ob}")
     print(f"{datetime.now()} [{symbol}] → FVG: {fvg}")
-    print(f"{datetime.now()} [{symbol}] → Last price: {last_price}")
-
-    # --- Mitigation entry check ---
-    if bos == 'BULLISH_BOS':
-        if ob and ob[0] <= last_price <= ob[1]:
-            return Signal(direction='BUY', entry_type='MITIGATION', type='OB', fvg=None)
-        if fvg and fvg[0] <= last_price <= fvg[1]:
-            return Signal(direction='BUY', entry_type='MITIGATION', type='FVG', fvg=fvg)
-
-        # --- Momentum entry (optional) ---
-        if allow_momentum:
-            return Signal(direction='BUY', entry_type='MOMENTUM', type='MOMENTUM', fvg=None)
-
-
-    if bos == 'BEARISH_BOS':
-        if ob and ob[0] <= last_price <= ob[1]:
-            return Signal(direction='SELL', entry_type='MITIGATION', type='OB', fvg=None)
-        if fvg and fvg[0] <= last_price <= fvg[1]:
-            return Signal(direction='SELL', entry_type='MITIGATION', type='FVG', fvg=fvg)
-
-        if allow_momentum:
-            return Signal(direction='SELL', entry_type='MOMENTUM', type='MOMENTUM', fvg=None)
-
-    return None
\ No newline at end of file
+    print(f"{datetime.now()} [{symbol}] → Last price: {df['close'].iloc[-1]}")
+    return signal
@@ -0,0 +1,76 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+import decision_journal as dj
+
+
+def _candles(n=60):
+    index = pd.date_range(pd.Timestamp.now().floor("5min") - pd.Timedelta(minutes=5 * (n - 1)), periods=n, freq="5min", name="time")
+    close = 1.1 + np.cumsum(np.random.default_rng(0).normal(0, 1e-4, n))
+    return pd.DataFrame({"open": close, "high": close + 1e-4, "low": close - 1e-4, "close": close, "tick_volume": 1.0}, index=index)
+
+
+@pytest.fixture(params=["UTC", "America/New_York", "Asia/Tokyo"])
+def local_tz(request, monkeypatch):
+    monkeypatch.setenv("TZ", request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_recorded_decision_reads_back(tmp_path, local_tz):
+    journal = dj.DecisionJournal(directory=tmp_path)
+    journal.record("EURUSD", _candles(), "TREND_UP", point=1e-5, gate="spread", magic=7)
+    journal.flush()
+
+    decisions = dj.load_decisions("EURUSD", directory=tmp_path)
+    assert len(decisions) == 1
+    assert decisions["gate"].iloc[0] == "spread" and decisions["magic"].iloc[0] == 7
+    assert abs(decisions.index[0] - pd.Timestamp.now()) < pd.Timedelta(minutes=1)  # local wall clock
+
+    today = pd.Timestamp.now().normalize()
+    assert len(dj.load_decisions("EURUSD", today, today + pd.Timedelta(days=1), directory=tmp_path)) == 1
+
+
+def test_older_day_file_rolls_over(tmp_path):
+    day = pd.Timestamp.now().normalize()
+    old = tmp_path / "EURUSD" / f"{day:%Y%m%d}.dec"
+    old.parent.mkdir(parents=True)
+    header = np.array([(dj.DECISION_MAGIC, dj.DECISION_FILE_VERSION - 1, dj.DECISION_DTYPE.itemsize - 40)], dtype=dj.HEADER_DTYPE)
+    header.tofile(old)
+    old_size = old.stat().st_size
+
+    journal = dj.DecisionJournal(directory=tmp_path)
+    journal.record("EURUSD", _candles(), "RANGING", point=1e-5)
+    journal.flush()
+
+    assert old.stat().st_size == old_size
+    assert old.with_suffix(f".v{dj.DECISION_FILE_VERSION}.dec").exists()
+    assert len(dj.load_decisions("EURUSD", directory=tmp_path)) == 1
+
+
+def test_flush_after_torn_tail_stays_aligned(tmp_path):
+    candles = _candles()
+    journal = dj.DecisionJournal(directory=tmp_path)
+    journal.record("EURUSD", candles, "TREND_UP", point=1e-5, gate="spread")
+    journal.flush()
+    day_file = dj.decision_file_path("EURUSD", pd.Timestamp.now(), tmp_path)
+    bar_file = dj.bar_file_path("EURUSD", directory=tmp_path)
+    for path in (day_file, bar_file):
+        with open(path, "ab") as f:
+            f.write(b"\x01\x02\x03")  # a record torn by a crash
+
+    journal = dj.DecisionJournal(directory=tmp_path)
+    candles = _candles()
+    candles = pd.concat([candles, candles.iloc[-1:].set_axis([candles.index[-1] + pd.Timedelta(minutes=5)])])
+    journal.record("EURUSD", candles, "RANGING", point=1e-5, gate="regime")
+    journal.flush()
+
+    decisions = dj.load_decisions("EURUSD", directory=tmp_path)
+    assert list(decisions["gate"]) == ["spread", "regime"]
+    assert list(decisions["regime"]) == ["TREND_UP", "RANGING"]
+    bars = dj.read_bars("EURUSD", directory=tmp_path)
+    np.testing.assert_array_equal(bars['time'], np.asarray(candles.index[:-1], dtype="datetime64[s]").astype(np.int64))
+    np.testing.assert_allclose(bars['close'], candles['close'].to_numpy()[:-1])
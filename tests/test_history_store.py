@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import history_store as hs
+
+
+def _bars(start, n):
+    bars = np.zeros(n, dtype=hs.BAR_DTYPE)
+    bars['time'] = pd.Timestamp(start).value // 1_000_000_000 + 60 * np.arange(n)
+    bars['open'] = 1.1 + 1e-5 * np.arange(n)
+    bars['high'] = bars['open'] + 2e-5
+    bars['low'] = bars['open'] - 2e-5
+    bars['close'] = bars['open'] + 1e-5
+    return bars
+
+
+def test_append_after_torn_column_write_stays_aligned(tmp_path):
+    store = hs.HistoryStore(tmp_path)
+    first, lost, second = _bars("2024-03-01", 100), _bars("2024-03-01 01:40", 50), _bars("2024-03-01 02:30", 100)
+    store.write("EURUSD", "M1", first)
+    path = store._dir("EURUSD", "M1", 2024)
+    for name in ("time", "open"):  # crash after two of the columns were appended
+        with open(path / name, "ab") as f:
+            np.ascontiguousarray(lost[name]).tofile(f)
+
+    store.write("EURUSD", "M1", second)
+
+    stored = store.read("EURUSD", "M1")
+    np.testing.assert_array_equal(stored, np.concatenate([first, second]))
+
+
+def test_ingest_counts_replaced_bars_once(tmp_path):
+    bars = _bars("2024-03-01", 200)
+    lines = [f"{pd.Timestamp(t, unit='s'):%Y%m%d %H%M%S};{o:.5f};{h:.5f};{l:.5f};{c:.5f};0"
+             for t, o, h, l, c in zip(bars['time'], bars['open'], bars['high'], bars['low'], bars['close'])]
+    (tmp_path / "a.csv").write_text("\n".join(lines[:120]) + "\n")
+    (tmp_path / "b.csv").write_text("\n".join(lines[110:]) + "\n")  # 10 bars overlap the first dump
+
+    hs.ingest("EURUSD", tmp_path / "a.csv", directory=tmp_path / "store", workers=1)
+    report = hs.ingest("EURUSD", tmp_path / "b.csv", directory=tmp_path / "store", workers=1)
+
+    assert report.overlap == 10 and report.rows == 80
+    assert len(hs.HistoryStore(tmp_path / "store").read("EURUSD", "M1")) == 200
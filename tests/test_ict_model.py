@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+from ict_model import ICTModel, ENTRY_MOMENTUM, ENTRY_MITIGATION, _synthetic_candles, verify_conformance
+
+
+@pytest.fixture(scope="module")
+def candles():
+    return _synthetic_candles(3000)
+
+
+@pytest.mark.parametrize("allow_momentum", [True, False])
+def test_step_matches_batch(candles, allow_momentum):
+    batch = ICTModel(allow_momentum).run_batch(candles)
+    stepper = ICTModel(allow_momentum)
+    steps = pd.DataFrame([stepper.step(bar) for bar in candles[['open', 'high', 'low', 'close']].to_dict('records')],
+                         index=batch.index)[list(ICTModel.COLUMNS)]
+
+    pd.testing.assert_frame_equal(steps, batch[list(ICTModel.COLUMNS)], check_dtype=False)
+    entries = set(batch.loc[batch['direction'] != 0, 'entry_type'])
+    assert ENTRY_MITIGATION in entries  # the candles exercise the signal paths, not only "no signal"
+    assert (ENTRY_MOMENTUM in entries) == allow_momentum
+
+
+@pytest.mark.parametrize("allow_momentum", [True, False])
+def test_model_matches_reference_helpers(candles, allow_momentum):
+    assert verify_conformance(candles.iloc[:600], allow_momentum) == 600
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+import tick_recorder as tr
+
+
+def _ticks(start_msc, n, bid=1.10000):
+    ticks = np.zeros(n, dtype=tr.RAW_DTYPE)
+    ticks['time_msc'] = start_msc + 250 * np.arange(n)
+    ticks['bid'] = bid + 1e-5 * np.arange(n)
+    ticks['ask'] = ticks['bid'] + 2e-5
+    ticks['volume'] = 1
+    return ticks
+
+
+@pytest.mark.parametrize("delta", [True, False])
+def test_reopen_after_torn_tail(tmp_path, delta):
+    path = tmp_path / "EURUSD" / "20240501.ticks"
+    first, second = _ticks(1_714_521_600_000, 5), _ticks(1_714_521_610_000, 5, bid=1.10100)
+    tr.TickFileWriter(path, 1e-5, delta).write(first)
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")  # a record torn by a crash
+
+    tr.TickFileWriter(path, 1e-5, delta).write(second)
+
+    ticks = tr.read_tick_file(path)
+    expected = np.concatenate([first, second])
+    np.testing.assert_array_equal(ticks['time_msc'], expected['time_msc'])
+    np.testing.assert_allclose(ticks['bid'], expected['bid'])
+    np.testing.assert_allclose(ticks['ask'], expected['ask'])
@@ -0,0 +1,326 @@
+# tick_recorder.py
+# Records symbol_info_tick updates to compact append-only binary files (one per symbol per day)
+# and keeps rolling spread percentiles per symbol and kill-zone session for the spread gate.
+#
+#   Recorder:  python tick_recorder.py
+#   Replay:    ticks = load_ticks("EURUSD", "2024-05-01", "2024-05-03")
+import os
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from pathlib import Path
+from config import (SYMBOLS, MAX_SPREAD, TICK_DATA_DIR, TICK_DELTA_COMPRESSION, TICK_FLUSH_EVERY, TICK_POLL_INTERVAL,
+                    SPREAD_WINDOW, SPREAD_MIN_SAMPLES, SPREAD_GATE_PERCENTILE, SPREAD_GATE_MULTIPLIER)
+from market_engine import symbol_point
+from sessions import kill_zone_at
+from state_store import register_state
+
+# ------------------ File Format ------------------ #
+# Header, then fixed-width records. Raw records hold absolute values; delta records hold
+# differences to the previous tick (prices in points), starting from the base tick in the header.
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'), ('version', '<u2'), ('format', '<u2'), ('point', '<f8'),
+    ('time_msc', '<i8'), ('bid', '<i8'), ('ask', '<i8'), ('last', '<i8'),
+])
+RAW_DTYPE = np.dtype([
+    ('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'), ('flags', '<u4'),
+])
+DELTA_DTYPE = np.dtype([
+    ('dt', '<u4'), ('bid', '<i4'), ('ask', '<i4'), ('last', '<i4'), ('volume', '<u4'), ('flags', '<u4'),
+])
+TICK_MAGIC = b"TICK"
+TICK_FILE_VERSION = 1
+FORMAT_RAW, FORMAT_DELTA = 0, 1
+SESSION_OFF = "OFF"  # spread statistics bucket outside the kill zones
+
+
+def tick_file_path(symbol: str, day, directory=TICK_DATA_DIR) -> Path:
+    return Path(directory) / symbol.upper() / f"{pd.Timestamp(day):%Y%m%d}.ticks"
+
+
+def _to_points(prices: np.ndarray, point: float) -> np.ndarray:
+    return np.rint(prices / point).astype(np.int64)
+
+
+def _decode(header, records: np.ndarray) -> np.ndarray:
+    """Raw records from a file's header and body."""
+    if header['format'] == FORMAT_RAW:
+        return records
+    point = header['point']
+    out = np.empty(len(records), dtype=RAW_DTYPE)
+    out['time_msc'] = header['time_msc'] + np.cumsum(records['dt'], dtype=np.int64)
+    for field in ('bid', 'ask', 'last'):
+        out[field] = (header[field] + np.cumsum(records[field], dtype=np.int64)) * point
+    out['volume'] = records['volume']
+    out['flags'] = records['flags']
+    return out
+
+
+def read_tick_file(path) -> np.ndarray:
+    """All ticks of one file as RAW_DTYPE records, oldest first."""
+    data = np.fromfile(path, dtype=np.uint8)
+    header = data[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)[0]
+    if header['magic'] != TICK_MAGIC:
+        raise ValueError(f"{path} is not a tick file")
+    dtype = DELTA_DTYPE if header['format'] == FORMAT_DELTA else RAW_DTYPE
+    body = data[HEADER_DTYPE.itemsize:]
+    body = body[:len(body) - len(body) % dtype.itemsize]  # drop a torn last record
+    return _decode(header, body.view(dtype))
+
+
+def _truncate_torn_tail(path: Path, record_size: int, header_size: int = HEADER_DTYPE.itemsize):
+    """Cut a partial last record left by a crash, so appends stay aligned to whole records."""
+    size = path.stat().st_size
+    whole = header_size + (size - header_size) // record_size * record_size
+    if whole != size:
+        os.truncate(path, whole)
+
+
+class TickFileWriter:
+    """
+    Append-only writer for one symbol-day file. Reopening an existing file continues it after
+    its last whole record.
+    """
+
+    def __init__(self, path: Path, point: float, delta: bool = TICK_DELTA_COMPRESSION):
+        self.path = Path(path)
+        self.point = point
+        self.format = FORMAT_DELTA if delta else FORMAT_RAW
+        self._last = None  # (time_msc, bid_pts, ask_pts, last_pts) of the last written tick
+
+        if self.path.exists() and self.path.stat().st_size >= HEADER_DTYPE.itemsize:
+            header = np.fromfile(self.path, dtype=HEADER_DTYPE, count=1)[0]
+            if header['magic'] != TICK_MAGIC:
+                raise ValueError(f"{self.path} is not a tick file")
+            _truncate_torn_tail(self.path, (DELTA_DTYPE if header['format'] == FORMAT_DELTA else RAW_DTYPE).itemsize)
+            self.format = int(header['format'])
+            self.point = float(header['point'])
+            ticks = read_tick_file(self.path)
+            if len(ticks):
+                last = ticks[-1]
+                self._last = (int(last['time_msc']),) + tuple(
+                    int(round(float(last[f]) / self.point)) for f in ('bid', 'ask', 'last'))
+            else:
+                self._last = tuple(int(header[f]) for f in ('time_msc', 'bid', 'ask', 'last'))
+        elif self.path.exists():
+            os.truncate(self.path, 0)  # a torn header: start the file over
+
+    def write(self, ticks: np.ndarray):
+        """Append RAW_DTYPE records (time-ordered)."""
+        if len(ticks) == 0:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        times = ticks['time_msc'].astype(np.int64)
+        prices = {f: _to_points(ticks[f].astype(float), self.point) for f in ('bid', 'ask', 'last')}
+
+        with open(self.path, "ab") as f:
+            if self._last is None:
+                header = np.zeros(1, dtype=HEADER_DTYPE)
+                header[0] = (TICK_MAGIC, TICK_FILE_VERSION, self.format, self.point,
+                             times[0], prices['bid'][0], prices['ask'][0], prices['last'][0])
+                header.tofile(f)
+                self._last = (int(times[0]), int(prices['bid'][0]), int(prices['ask'][0]), int(prices['last'][0]))
+
+            if self.format == FORMAT_RAW:
+                ticks.astype(RAW_DTYPE).tofile(f)
+            else:
+                records = np.empty(len(ticks), dtype=DELTA_DTYPE)
+                records['dt'] = np.diff(times, prepend=self._last[0])
+                records['bid'] = np.diff(prices['bid'], prepend=self._last[1])
+                records['ask'] = np.diff(prices['ask'], prepend=self._last[2])
+                records['last'] = np.diff(prices['last'], prepend=self._last[3])
+                records['volume'] = ticks['volume']
+                records['flags'] = ticks['flags']
+                records.tofile(f)
+            self._last = (int(times[-1]), int(prices['bid'][-1]), int(prices['ask'][-1]), int(prices['last'][-1]))
+
+
+# ------------------ Rolling Spread Statistics ------------------ #
+class SpreadStats:
+    """
+    Percentiles of the last `window` spreads (in points). A ring of samples plus a histogram of
+    their values: O(1) per update, percentile queries scan the histogram only.
+    """
+
+    def __init__(self, window: int = SPREAD_WINDOW, max_points: int = 10_000):
+        self.window = window
+        self.samples = np.zeros(window, dtype=np.int32)
+        self.histogram = np.zeros(max_points + 1, dtype=np.int32)
+        self.count = 0
+
+    def push(self, spread_points: int):
+        spread_points = min(max(int(spread_points), 0), len(self.histogram) - 1)
+        slot = self.count % self.window
+        if self.count >= self.window:
+            self.histogram[self.samples[slot]] -= 1
+        self.samples[slot] = spread_points
+        self.histogram[spread_points] += 1
+        self.count += 1
+
+    def size(self) -> int:
+        return min(self.count, self.window)
+
+    def percentile(self, q: float) -> int | None:
+        n = self.size()
+        if n == 0:
+            return None
+        rank = max(1, int(np.ceil(q / 100 * n)))
+        return int(np.searchsorted(np.cumsum(self.histogram), rank))
+
+
+# ------------------ Recorder ------------------ #
+class TickRecorder:
+    """
+    Buffers ticks per symbol in numpy arrays and appends them to the day's file every
+    `flush_every` ticks; updates the spread statistics of the tick's session on every tick.
+    """
+
+    def __init__(self, directory=TICK_DATA_DIR, delta: bool = TICK_DELTA_COMPRESSION, flush_every: int = TICK_FLUSH_EVERY,
+                 window: int = SPREAD_WINDOW, record: bool = True):
+        self.directory = directory
+        self.delta = delta
+        self.flush_every = flush_every
+        self.window = window
+        self.record = record
+        self.stats = {}          # (symbol, session) -> SpreadStats
+        self._buffers = {}       # symbol -> (RAW_DTYPE array, used)
+        self._writers = {}       # (symbol, day) -> TickFileWriter
+        self._last_msc = {}      # symbol -> time_msc of the last tick seen
+        self._sessions = {}      # minute -> session name
+
+    def session_of(self, tick_time: int) -> str:
+        """Kill zone of a tick time (server epoch seconds), SESSION_OFF outside them."""
+        minute = tick_time // 60
+        name = self._sessions.get(minute)
+        if name is None:
+            window = kill_zone_at(pd.Timestamp(minute * 60, unit='s'))
+            name = window[0] if window else SESSION_OFF
+            if len(self._sessions) > 1440:
+                self._sessions.clear()
+            self._sessions[minute] = name
+        return name
+
+    def _stats(self, symbol: str, session: str) -> SpreadStats:
+        key = (symbol, session)
+        if key not in self.stats:
+            self.stats[key] = SpreadStats(self.window)
+        return self.stats[key]
+
+    def on_tick(self, symbol: str, tick) -> bool:
+        """Record one MT5 tick (or BusTick). Returns False for a tick already seen."""
+        if tick.time_msc <= self._last_msc.get(symbol, 0):
+            return False
+        self._last_msc[symbol] = tick.time_msc
+
+        point = symbol_point(symbol)
+        self._stats(symbol, self.session_of(tick.time)).push(round((tick.ask - tick.bid) / point))
+
+        if self.record:
+            buffer, used = self._buffers.get(symbol, (None, 0))
+            if buffer is None:
+                buffer = np.zeros(self.flush_every, dtype=RAW_DTYPE)
+            elif used and buffer['time_msc'][used - 1] // 86_400_000 != tick.time_msc // 86_400_000:
+                self._flush_symbol(symbol, buffer, used)  # new day, new file
+                used = 0
+            buffer[used] = (tick.time_msc, tick.bid, tick.ask, tick.last, tick.volume, tick.flags)
+            used += 1
+            if used == self.flush_every:
+                self._flush_symbol(symbol, buffer, used)
+                used = 0
+            self._buffers[symbol] = (buffer, used)
+        return True
+
+    def _flush_symbol(self, symbol, buffer, used):
+        if used == 0:
+            return
+        day = datetime.fromtimestamp(int(buffer['time_msc'][0]) // 1000, tz=timezone.utc).date()
+        key = (symbol, day)
+        if key not in self._writers:
+            self._writers = {k: w for k, w in self._writers.items() if k[0] != symbol}  # previous day is done
+            self._writers[key] = TickFileWriter(tick_file_path(symbol, day, self.directory), symbol_point(symbol), self.delta)
+        self._writers[key].write(buffer[:used])
+
+    def flush(self):
+        for symbol, (buffer, used) in self._buffers.items():
+            self._flush_symbol(symbol, buffer, used)
+            self._buffers[symbol] = (buffer, 0)
+
+    # ---- spread gate ----
+    def spread_threshold(self, symbol: str, tick_time: int = None) -> float:
+        """
+        Largest acceptable spread (price units) right now: SPREAD_GATE_MULTIPLIER x the session's
+        SPREAD_GATE_PERCENTILE spread, capped at MAX_SPREAD. Falls back to MAX_SPREAD until the
+        session has SPREAD_MIN_SAMPLES ticks.
+        """
+        max_spread = MAX_SPREAD[symbol] if isinstance(MAX_SPREAD, dict) else MAX_SPREAD
+        session = self.session_of(int(tick_time if tick_time is not None else time.time()))
+        stats = self.stats.get((symbol, session))
+        if stats is None or stats.size() < SPREAD_MIN_SAMPLES:
+            return max_spread
+        typical = stats.percentile(SPREAD_GATE_PERCENTILE) * symbol_point(symbol)
+        return min(max_spread, typical * SPREAD_GATE_MULTIPLIER)
+
+    def spread_ok(self, symbol: str, tick) -> tuple[bool, float]:
+        """(spread acceptable, threshold) for a tick."""
+        threshold = self.spread_threshold(symbol, tick.time)
+        return tick.ask - tick.bid <= threshold, threshold
+
+    # ---- snapshot ----
+    def get_state(self) -> dict:
+        return {"stats": self.stats}
+
+    def set_state(self, state: dict):
+        self.stats.update(state["stats"])
+
+
+# The bot's instance only keeps spread statistics; files are written by the recorder process
+# (run_recorder or the market bus feeder), so two processes never append to the same file.
+TICKS = TickRecorder(record=False)
+register_state("spread_stats", TICKS.get_state, TICKS.set_state)
+
+
+# ------------------ Replay ------------------ #
+def load_ticks(symbol: str, start, end=None, directory=TICK_DATA_DIR) -> np.ndarray:
+    """Recorded ticks of `symbol` for the days start..end (inclusive), as RAW_DTYPE records."""
+    days = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end or start).normalize(), freq="D")
+    parts = [read_tick_file(p) for p in (tick_file_path(symbol, d, directory) for d in days) if p.exists()]
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=RAW_DTYPE)
+
+
+def fill_price(ticks: np.ndarray, time_msc: int, direction: str, latency_ms: int = 0):
+    """
+    Simulated market fill: the first recorded tick at or after time_msc + latency_ms,
+    at the ask for BUY and the bid for SELL. Returns (fill time_msc, price) or None.
+    """
+    i = np.searchsorted(ticks['time_msc'], time_msc + latency_ms, side='left')
+    if i >= len(ticks):
+        return None
+    tick = ticks[i]
+    return int(tick['time_msc']), float(tick['ask'] if direction == 'BUY' else tick['bid'])
+
+
+def run_recorder(symbols=SYMBOLS, poll_interval=TICK_POLL_INTERVAL, bot_mt5=None, recorder=None):
+    """Poll symbol_info_tick for every symbol and record each new tick."""
+    recorder = recorder or TickRecorder()
+    if bot_mt5 is None:
+        from mt5 import ResilientMT5
+        bot_mt5 = ResilientMT5(path=None, retry_interval=10, max_retries=5)
+    print(f"{datetime.now()} → Recording ticks for {len(symbols)} symbols to {recorder.directory}")
+    try:
+        while True:
+            for symbol in symbols:
+                try:
+                    recorder.on_tick(symbol, bot_mt5.safe_tick(symbol))
+                except Exception as e:
+                    print(f"{datetime.now()} [{symbol}] → Tick recorder error: {e}")
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("Tick recorder stopped by user")
+    finally:
+        recorder.flush()
+        bot_mt5.shutdown()
+
+
+if __name__ == "__main__":
+    run_recorder()